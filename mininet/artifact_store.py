@@ -0,0 +1,349 @@
+# This file contains the content-addressed store for the files of test runs.
+#
+# Every file is stored once under its SHA-256 in 'objects/<2 chars>/<rest>'
+# of the store. The run folders keep their files, but as hardlinks to the
+# objects, and a 'manifest.json' listing the hash and size of every file.
+# Identical captures and logs in different run folders therefore take up
+# the space only once, a changed or corrupted file is found by comparing
+# it with its hash, and a missing file can be restored from the store.
+#
+# Hardlinks require the store and the run folders to be on the same file
+# system, otherwise the files are copied into the store. As the objects
+# share their inode with the run files, the files of a run folder must not
+# be changed in place. 'verify' finds objects which were changed anyway.
+#
+# Between machines only the objects missing on the other side are
+# transferred, followed by the manifests. The run folders are then
+# recreated from the manifests:
+#
+#   python3 mininet/artifact_store.py ingest mininet_measurements/13_05/10_15
+#   python3 mininet/artifact_store.py verify
+#   python3 mininet/artifact_store.py pull user@desktop:/path/to/mininet_measurements
+#   python3 mininet/artifact_store.py checkout mininet_measurements/
+
+from datetime import datetime
+from pathlib import Path
+
+import argparse
+import errno
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+DEFAULT_STORE = "mininet_measurements/.objects"
+MANIFEST = "manifest.json"
+
+# Files which are rewritten and therefore never stored
+_excluded = [MANIFEST]
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    Returning the SHA-256 of the file, read in chunks
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as infile:
+        while True:
+            chunk = infile.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def read_manifest(directory):
+    """
+    Returning the files of the manifest of the run folder as dictionary
+    of relative path to hash and size, empty if there is no manifest
+    """
+
+    manifest = Path(directory).joinpath(MANIFEST)
+    if not manifest.exists():
+        return {}
+    with open(manifest, "r") as infile:
+        return json.load(infile)["files"]
+
+def write_manifest(directory, files):
+    """
+    Atomically writing the manifest of the run folder
+    """
+
+    manifest = Path(directory).joinpath(MANIFEST)
+    tmp = manifest.with_name(f".{MANIFEST}.tmp")
+    with open(tmp, "w") as outfile:
+        json.dump({"created": datetime.now().isoformat(), "files": files}, outfile, indent=4, sort_keys=True)
+    os.replace(tmp, manifest)
+
+class ArtifactStore:
+    """
+    Content-addressed store of files, keyed by their SHA-256.
+
+    Usage:
+        store = ArtifactStore("mininet_measurements/.objects")
+        store.ingest(test_dir)
+        problems = store.verify_run(test_dir)
+    """
+
+    def __init__(self, root=DEFAULT_STORE):
+        self.root = Path(root)
+
+    def object_path(self, digest):
+        return self.root.joinpath("objects", digest[:2], digest[2:])
+
+    def contains(self, digest):
+        return self.object_path(digest).exists()
+
+    def _link_or_copy(self, source, target):
+        """
+        Atomically placing the source at the target, as hardlink if
+        possible. Returns True if a hardlink was created
+        """
+
+        tmp = target.with_name(f".{target.name}.tmp")
+        if tmp.exists():
+            tmp.unlink()
+        linked = True
+        try:
+            os.link(source, tmp)
+        except OSError as e:
+            # Different file system or no hardlinks supported
+            if e.errno not in [errno.EXDEV, errno.EPERM, errno.EMLINK]:
+                raise
+            shutil.copy2(source, tmp)
+            linked = False
+        os.replace(tmp, target)
+        return linked
+
+    def put(self, path, digest=None):
+        """
+        Adding the file to the store and replacing it with a hardlink to
+        the stored object. Returns the hash of the file
+        """
+
+        path = Path(path)
+        if digest is None:
+            digest = hash_file(path)
+
+        stored = self.object_path(digest)
+        if not stored.exists():
+            stored.parent.mkdir(parents=True, exist_ok=True)
+            self._link_or_copy(path, stored)
+        elif not os.path.samefile(path, stored):
+            # Same content already stored, dropping the duplicate
+            self._link_or_copy(stored, path)
+
+        return digest
+
+    def ingest(self, directory):
+        """
+        Adding all files of the run folder to the store and writing its
+        manifest. Files unchanged since the last manifest are not hashed again.
+        Returns the files of the manifest
+        """
+
+        directory = Path(directory)
+        previous = read_manifest(directory)
+        files = {}
+        for path in sorted(directory.rglob("*")):
+            if not path.is_file() or path.name in _excluded or path.name.startswith("."):
+                continue
+            relative = f"{path.relative_to(directory)}"
+            size = path.stat().st_size
+            known = previous.get(relative)
+            if known is not None and known["size"] == size and self.contains(known["sha256"]) and os.path.samefile(path, self.object_path(known["sha256"])):
+                files[relative] = known
+                continue
+            files[relative] = {"sha256": self.put(path), "size": size}
+
+        write_manifest(directory, files)
+        stored = sum(entry["size"] for entry in files.values())
+        print(f"Stored {len(files)} files ({stored / 1e6:.1f}MB) of '{directory}'")
+        return files
+
+    def checkout(self, directory):
+        """
+        Recreating the files of the run folder missing compared to its manifest.
+        Returns the files which could not be restored
+        """
+
+        directory = Path(directory)
+        missing = []
+        for relative, entry in read_manifest(directory).items():
+            path = directory.joinpath(relative)
+            if path.exists():
+                continue
+            if not self.contains(entry["sha256"]):
+                missing.append(relative)
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._link_or_copy(self.object_path(entry["sha256"]), path)
+
+        return missing
+
+    def verify_run(self, directory):
+        """
+        Comparing the files of the run folder with its manifest.
+        Returns a list of (relative path, problem)
+        """
+
+        directory = Path(directory)
+        problems = []
+        for relative, entry in read_manifest(directory).items():
+            path = directory.joinpath(relative)
+            if not path.exists():
+                problems.append((relative, "missing"))
+            elif path.stat().st_size != entry["size"] or hash_file(path) != entry["sha256"]:
+                problems.append((relative, "modified"))
+        return problems
+
+    def verify(self):
+        """
+        Checking that the content of every object matches its hash.
+        Returns the hashes of the corrupted objects
+        """
+
+        corrupted = []
+        for digest in self.inventory():
+            if hash_file(self.object_path(digest)) != digest:
+                corrupted.append(digest)
+        return corrupted
+
+    def inventory(self):
+        """
+        Returning the hashes of all stored objects
+        """
+
+        objects = self.root.joinpath("objects")
+        if not objects.exists():
+            return set()
+        return {f"{path.parent.name}{path.name}" for path in objects.glob("*/*") if not path.name.startswith(".")}
+
+def _remote_inventory(remote_host, remote_store):
+    """
+    Returning the hashes of the objects stored on the remote machine
+    """
+
+    cmd = ["ssh", remote_host, f"cd '{remote_store}' 2>/dev/null && find objects -type f ! -name '.*'"]
+    output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return {"".join(Path(line).parts[-2:]) for line in output.splitlines() if line.strip() != ""}
+
+def _transfer(digests, source, target):
+    """
+    Transferring the objects of the given hashes from source to target
+    store with a single rsync call
+    """
+
+    if len(digests) == 0:
+        return
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as files:
+        files.write("".join(f"objects/{digest[:2]}/{digest[2:]}\n" for digest in sorted(digests)))
+        files.flush()
+        subprocess.run(["rsync", "-t", f"--files-from={files.name}", f"{source}/", f"{target}/"], check=True)
+
+def _sync_manifests(source, target):
+    """
+    Copying the manifests of all run folders, the only files of the run
+    folders transferred
+    """
+
+    subprocess.run(["rsync", "-rt", "--include=*/", f"--include={MANIFEST}", "--exclude=*", "--prune-empty-dirs",
+                    f"{source}/", f"{target}/"], check=True)
+
+def pull(remote, measurements="mininet_measurements", store_dir=DEFAULT_STORE):
+    """
+    Pulling the runs from the remote measurement folder ('host:/path'),
+    transferring only the objects missing locally. The remote store is
+    expected at the same position relative to the measurement folder.
+    Returns the number of transferred objects
+    """
+
+    store = ArtifactStore(store_dir)
+    remote_host, _, remote_path = remote.partition(":")
+    remote_store = f"{remote_path}/{Path(store_dir).relative_to(measurements)}"
+
+    missing = _remote_inventory(remote_host, remote_store) - store.inventory()
+    print(f"Pulling {len(missing)} missing objects from '{remote}'")
+    _transfer(missing, f"{remote_host}:{remote_store}", store.root)
+    _sync_manifests(remote, measurements)
+
+    return len(missing)
+
+def push(remote, measurements="mininet_measurements", store_dir=DEFAULT_STORE):
+    """
+    Pushing the local runs to the remote measurement folder ('host:/path'),
+    transferring only the objects missing remotely.
+    Returns the number of transferred objects
+    """
+
+    store = ArtifactStore(store_dir)
+    remote_host, _, remote_path = remote.partition(":")
+    remote_store = f"{remote_path}/{Path(store_dir).relative_to(measurements)}"
+
+    missing = store.inventory() - _remote_inventory(remote_host, remote_store)
+    print(f"Pushing {len(missing)} missing objects to '{remote}'")
+    _transfer(missing, store.root, f"{remote_host}:{remote_store}")
+    _sync_manifests(measurements, remote)
+
+    return len(missing)
+
+def _run_folders(folders):
+    """
+    Returning all run folders below the given folders, recognized by
+    their manifest or their logfile
+    """
+
+    runs = set()
+    for folder in folders:
+        for pattern in [MANIFEST, "h1.log"]:
+            runs |= {path.parent for path in Path(folder).rglob(pattern)}
+    return sorted(runs)
+
+def main():
+    """
+    Parsing the command line and executing the store command
+    """
+
+    parser = argparse.ArgumentParser(description="Content-addressed store for the files of the test runs")
+    parser.add_argument('--store', type=str, default=DEFAULT_STORE)
+    parser.add_argument('--measurements', type=str, default="mininet_measurements")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Storing the files of all run folders below the given folders")
+    ingest_parser.add_argument('folders', nargs="+")
+    checkout_parser = commands.add_parser("checkout", help="Restoring the missing files of all run folders from their manifests")
+    checkout_parser.add_argument('folders', nargs="+")
+    verify_parser = commands.add_parser("verify", help="Verifying all objects, or the given run folders against their manifests")
+    verify_parser.add_argument('folders', nargs="*")
+    pull_parser = commands.add_parser("pull", help="Pulling the missing objects and manifests from 'host:/path/to/measurements'")
+    pull_parser.add_argument('remote')
+    push_parser = commands.add_parser("push", help="Pushing the missing objects and manifests to 'host:/path/to/measurements'")
+    push_parser.add_argument('remote')
+
+    args = parser.parse_args()
+    store = ArtifactStore(args.store)
+
+    match args.command:
+        case "ingest":
+            for directory in _run_folders(args.folders):
+                store.ingest(directory)
+        case "checkout":
+            for directory in _run_folders(args.folders):
+                missing = store.checkout(directory)
+                if len(missing) > 0:
+                    print(f"'{directory}': {len(missing)} files not in the store: {missing}")
+        case "verify":
+            if len(args.folders) == 0:
+                corrupted = store.verify()
+                print(f"{len(corrupted)} corrupted objects: {corrupted}" if len(corrupted) > 0 else "All objects are intact")
+            for directory in _run_folders(args.folders):
+                for relative, problem in store.verify_run(directory):
+                    print(f"'{directory}/{relative}': {problem}")
+        case "pull":
+            pull(args.remote, args.measurements, args.store)
+        case "push":
+            push(args.remote, args.measurements, args.store)
+
+if __name__ == "__main__":
+    main()
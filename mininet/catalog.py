@@ -0,0 +1,376 @@
+# This file contains the catalog of all measurement runs.
+#
+# Every finished run is recorded in a SQLite database, by default
+# 'mininet_measurements/catalog.sqlite', with its resolved configuration
+# (the 'spec.json' of the run, see spec.py), the files it produced and
+# metrics extracted from its logs. Runs are recorded as the last
+# post-processing step, so the merged captures are included. Older run
+# folders can be added with the 'import' command.
+#
+# Usage:
+#   python3 mininet/catalog.py import mininet_measurements/
+#   python3 mininet/catalog.py query --scenario FULL_NETWORK --where enable_snat=true --metric "migration_ms>500"
+#   python3 mininet/catalog.py metrics
+#
+# Metrics per run:
+#   nominations          Number of nominated pairs logged by h1
+#   first_nomination_ms  Time from the first log line of h1 to the first nominated pair
+#   migration_ms         Time from the first path failure of the schedule to the next nominated pair
+#   crashed_processes    Processes which exited early (see supervisor.py)
+#   capture_bytes        Size of all captures of the run
+
+from pathlib import Path
+
+from spec import SPEC_FILE, SPEC_SECTIONS
+from artifact_store import read_manifest
+from compression import is_capture
+from logfile import parse_log_timestamp
+
+import argparse
+import csv
+import json
+import re
+import sqlite3
+import sys
+
+DEFAULT_CATALOG = "mininet_measurements/catalog.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    directory TEXT NOT NULL UNIQUE,
+    spec_id TEXT,
+    name TEXT,
+    scenario TEXT,
+    test TEXT,
+    binary TEXT,
+    build_target TEXT,
+    snat INTEGER,
+    started REAL,
+    finished REAL,
+    duration REAL,
+    status TEXT,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    kind TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    PRIMARY KEY (run_id, path)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS runs_scenario_test ON runs(scenario, test, snat);
+CREATE INDEX IF NOT EXISTS runs_spec_id ON runs(spec_id);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+CREATE INDEX IF NOT EXISTS metrics_name_value ON metrics(name, value, run_id);
+CREATE INDEX IF NOT EXISTS artifacts_sha256 ON artifacts(sha256);
+"""
+
+# Schedule actions after which a new path has to be nominated
+FAILURE_ACTIONS = ["apply_impairments", "impairments", "iface_down", "path_loss", "stop_path"]
+
+# The default output of the env_logger used by quicheperf:
+# [2024-05-06T10:11:12.123456Z DEBUG quiche::path] message
+_log_timestamp = re.compile(r"^\[(\S+)\s")
+
+def connect(catalog=DEFAULT_CATALOG):
+    """
+    Opening the catalog, creating it if needed. Multiple tests running in
+    parallel write into the same catalog, hence the WAL and the timeout
+    """
+
+    Path(catalog).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(catalog, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+def _log_epoch(line):
+    """
+    Returning the timestamp of a log line in seconds since epoch, None
+    if the line has no timestamp
+    """
+
+    found = _log_timestamp.match(line)
+    if found is None:
+        return None
+    return parse_log_timestamp(found.group(1))
+
+def _nominations(logfile):
+    """
+    Returning the epoch of the first log line and of every nominated pair
+    """
+
+    first = None
+    nominations = []
+    with open(logfile, "r", errors="replace") as infile:
+        for line in infile:
+            epoch = _log_epoch(line)
+            if epoch is None:
+                continue
+            if first is None:
+                first = epoch
+            if "NominatedPair" in line:
+                nominations.append(epoch)
+    return first, nominations
+
+def _first_failure(schedule_log):
+    """
+    Returning the epoch of the first path failure in the schedule, None if
+    there is none or the schedule was written without the epoch column
+    """
+
+    with open(schedule_log, "r", newline="") as infile:
+        for row in csv.DictReader(infile):
+            if row["action"] in FAILURE_ACTIONS and row.get("epoch"):
+                return float(row["epoch"])
+    return None
+
+def extract_metrics(directory):
+    """
+    Extracting the metrics of a run from the files in its folder.
+    Metrics which cannot be determined are left out
+    """
+
+    directory = Path(directory)
+    metrics = {}
+
+    logfile = directory.joinpath("h1.log")
+    if logfile.exists():
+        first, nominations = _nominations(logfile)
+        metrics["nominations"] = len(nominations)
+        if first is not None and len(nominations) > 0:
+            metrics["first_nomination_ms"] = (nominations[0] - first) * 1000
+
+        schedule_log = directory.joinpath("schedule.log")
+        if schedule_log.exists():
+            failure = _first_failure(schedule_log)
+            after = [epoch for epoch in nominations if failure is not None and epoch >= failure]
+            if len(after) > 0:
+                metrics["migration_ms"] = (after[0] - failure) * 1000
+
+    processes_log = directory.joinpath("processes.log")
+    if processes_log.exists():
+        with open(processes_log, "r", newline="") as infile:
+            metrics["crashed_processes"] = sum(1 for row in csv.DictReader(infile) if row["crashed"] == "True")
+
+    metrics["capture_bytes"] = sum(path.stat().st_size for path in directory.iterdir() if path.is_file() and is_capture(path))
+
+    return metrics
+
+def _artifact_kind(path):
+    if is_capture(path):
+        return "capture"
+    if path.suffix == ".log":
+        return "log"
+    if path.suffix in [".csv", ".json"]:
+        return "data"
+    return "other"
+
+def list_artifacts(directory):
+    """
+    Returning (relative path, kind, size, hash) of every file of the run
+    folder, the hash is taken from the manifest of the artifact store
+    """
+
+    directory = Path(directory)
+    manifest = read_manifest(directory)
+    artifacts = []
+    for path in sorted(directory.rglob("*")):
+        if path.is_file():
+            relative = f"{path.relative_to(directory)}"
+            digest = manifest[relative]["sha256"] if relative in manifest else None
+            artifacts.append((relative, _artifact_kind(path), path.stat().st_size, digest))
+    return artifacts
+
+def record_run(directory, catalog=DEFAULT_CATALOG, started=None, finished=None, status="completed"):
+    """
+    Recording the run folder in the catalog, replacing an earlier record
+    of the same folder. Without the start and end of the run, the times
+    are taken from the files of the folder.
+    Returns the id of the run in the catalog
+    """
+
+    directory = Path(directory).resolve()
+    spec = {}
+    spec_file = directory.joinpath(SPEC_FILE)
+    if spec_file.exists():
+        with open(spec_file, "r") as infile:
+            spec = json.load(infile)
+
+    artifacts = list_artifacts(directory)
+    if started is None or finished is None:
+        times = [path.stat().st_mtime for path in directory.iterdir() if path.is_file()]
+        started = started if started is not None else min(times, default=None)
+        finished = finished if finished is not None else max(times, default=None)
+    duration = finished - started if started is not None and finished is not None else None
+
+    topology = spec.get("topology", {})
+    test = spec.get("test", {})
+    binary = spec.get("binary", {})
+    snat = topology.get("enable_snat")
+
+    connection = connect(catalog)
+    try:
+        with connection:
+            connection.execute("DELETE FROM runs WHERE directory = ?", (f"{directory}",))
+            cursor = connection.execute(
+                "INSERT INTO runs (directory, spec_id, name, scenario, test, binary, build_target, snat, started, finished, duration, status, config) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (f"{directory}", spec.get("id"), spec.get("name"), topology.get("scenario"), test.get("test"),
+                 binary.get("quicheperf_dir"), binary.get("build_target"), None if snat is None else int(snat),
+                 started, finished, duration, status, json.dumps(spec) if len(spec) > 0 else None),
+            )
+            run_id = cursor.lastrowid
+            connection.executemany("INSERT INTO artifacts (run_id, path, kind, size, sha256) VALUES (?, ?, ?, ?, ?)",
+                                   [(run_id, path, kind, size, digest) for path, kind, size, digest in artifacts])
+            connection.executemany("INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)",
+                                   [(run_id, name, value) for name, value in extract_metrics(directory).items()])
+    finally:
+        connection.close()
+
+    print(f"Recorded run '{directory}' in the catalog '{catalog}'")
+    return run_id
+
+def import_runs(root, catalog=DEFAULT_CATALOG):
+    """
+    Recording every run folder below the given folder, recognized by
+    the logfile or the spec of the run.
+    Returns the number of recorded runs
+    """
+
+    runs = {path.parent for pattern in ["h1.log", SPEC_FILE] for path in Path(root).rglob(pattern)}
+    for directory in sorted(runs):
+        record_run(directory, catalog)
+    return len(runs)
+
+_comparison = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)\s*(<=|>=|!=|=|<|>)\s*(.+)$")
+
+def _parse_condition(condition):
+    """
+    Parsing 'name<op>value', the value is read as JSON if possible
+    """
+
+    found = _comparison.match(condition.strip())
+    if found is None:
+        raise ValueError(f"'{condition}' is no condition of the form 'name<op>value'")
+    name, operator, value = found.groups()
+    try:
+        value = json.loads(value)
+    except json.JSONDecodeError:
+        pass
+    return name, operator, value
+
+def _config_path(field):
+    """
+    Returning the JSON path of a configuration field in the stored spec
+    """
+
+    for section, section_fields in SPEC_SECTIONS.items():
+        if field in section_fields:
+            return f"$.{section}.{field}"
+    raise ValueError(f"'{field}' is no field of the experiment spec")
+
+def query_runs(catalog=DEFAULT_CATALOG, scenario=None, test=None, spec_id=None, where=None, metrics=None, columns=None):
+    """
+    Querying the runs with the given scenario, test, spec id (prefix),
+    configuration conditions ('enable_snat=true') and metric conditions
+    ('migration_ms>500'). Returns the column names and the rows, holding
+    the run, its directory and the requested metrics
+    """
+
+    clauses = []
+    params = []
+    if scenario is not None:
+        clauses.append("runs.scenario = ?")
+        params.append(scenario)
+    if test is not None:
+        clauses.append("runs.test = ?")
+        params.append(test)
+    if spec_id is not None:
+        clauses.append("runs.spec_id LIKE ?")
+        params.append(f"{spec_id}%")
+    for condition in where or []:
+        field, operator, value = _parse_condition(condition)
+        clauses.append(f"json_extract(runs.config, ?) {operator} ?")
+        params += [_config_path(field), value]
+
+    metric_names = []
+    for condition in metrics or []:
+        name, operator, value = _parse_condition(condition)
+        clauses.append(f"EXISTS (SELECT 1 FROM metrics m WHERE m.run_id = runs.id AND m.name = ? AND m.value {operator} ?)")
+        params += [name, value]
+        metric_names.append(name)
+    for name in columns or []:
+        if name not in metric_names:
+            metric_names.append(name)
+
+    selected = ["runs.id", "runs.directory", "runs.spec_id", "runs.scenario", "runs.test", "runs.started", "runs.status"]
+    select_params = []
+    for name in metric_names:
+        selected.append("(SELECT value FROM metrics m WHERE m.run_id = runs.id AND m.name = ?)")
+        select_params.append(name)
+
+    sql = f"SELECT {', '.join(selected)} FROM runs"
+    if len(clauses) > 0:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY runs.started"
+
+    connection = connect(catalog)
+    try:
+        rows = connection.execute(sql, select_params + params).fetchall()
+    finally:
+        connection.close()
+
+    header = ["id", "directory", "spec_id", "scenario", "test", "started", "status"] + metric_names
+    return header, rows
+
+def main():
+    """
+    Parsing the command line and importing or querying runs
+    """
+
+    parser = argparse.ArgumentParser(description="Recording and querying the catalog of measurement runs")
+    parser.add_argument('--catalog', type=str, default=DEFAULT_CATALOG)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Recording all run folders below the given folders")
+    import_parser.add_argument('folders', nargs="+")
+
+    query_parser = commands.add_parser("query", help="Printing the matching runs as csv")
+    query_parser.add_argument('--scenario', type=str, default=None)
+    query_parser.add_argument('--test', type=str, default=None)
+    query_parser.add_argument('--spec-id', type=str, default=None)
+    query_parser.add_argument('--where', action='append', default=None, help="FIELD<op>VALUE of the configuration")
+    query_parser.add_argument('--metric', action='append', default=None, help="METRIC<op>VALUE")
+    query_parser.add_argument('--column', action='append', default=None, help="Additional metric to print")
+
+    commands.add_parser("metrics", help="Listing the recorded metrics")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "import":
+            count = sum(import_runs(folder, args.catalog) for folder in args.folders)
+            print(f"Imported {count} runs")
+        case "query":
+            header, rows = query_runs(args.catalog, args.scenario, args.test, args.spec_id, args.where, args.metric, args.column)
+            writer = csv.writer(sys.stdout)
+            writer.writerow(header)
+            writer.writerows(rows)
+        case "metrics":
+            connection = connect(args.catalog)
+            for name, count in connection.execute("SELECT name, COUNT(*) FROM metrics GROUP BY name ORDER BY name"):
+                print(f"{name}: {count} runs")
+            connection.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# This file contains the compression of the captures of finished test runs.
+#
+# Captures are written uncompressed while a test is running, compressing
+# them on the fly would cost CPU time on the capturing hosts. Once a run is
+# finished, the post-processing compresses every capture of the run folder
+# with a pool of threads (zlib and zstd release the GIL while compressing)
+# and replaces it atomically by '<capture>.gz' or '<capture>.zst'.
+#
+# Wireshark, tshark, mergecap and editcap read gzip compressed captures
+# directly. Newer versions also read zstd, for older versions the plotting
+# scripts stream the capture through 'zstd -dc' into tshark, see
+# plotting/compressedCapture.py. 'is_capture' recognizes the captures
+# independent of their compression.
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import gzip
+import os
+import shutil
+import subprocess
+import time
+
+# Compression method and the suffix of the compressed files
+COMPRESSORS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+# The default levels favour speed, captures compress well already
+DEFAULT_LEVELS = {
+    "gzip": 6,
+    "zstd": 3,
+}
+
+CAPTURE_SUFFIXES = [".pcap", ".pcapng"]
+
+def compression_suffix(path):
+    """
+    Returning the compression suffix of the file, empty if not compressed
+    """
+
+    suffix = Path(path).suffix
+    return suffix if suffix in COMPRESSORS.values() else ""
+
+def is_capture(path):
+    """
+    Checking if the file is a capture, compressed or not
+    """
+
+    path = Path(path)
+    if compression_suffix(path) != "":
+        path = path.with_suffix("")
+    return path.suffix in CAPTURE_SUFFIXES
+
+def check_method(method):
+    """
+    Raising a ValueError if the compression method is unknown or its tool missing
+    """
+
+    if method not in COMPRESSORS:
+        raise ValueError(f"Unknown compression '{method}', expected one of {list(COMPRESSORS)}")
+    if method == "zstd" and shutil.which("zstd") is None:
+        raise ValueError("Compressing with zstd requires the 'zstd' command, please install it or use gzip")
+
+def compress_file(path, method="gzip", level=None, chunk_size=1024 * 1024):
+    """
+    Compressing the file into '<file>.gz' or '<file>.zst' and removing the
+    original. The compressed file is written into a temporary file first
+    and renamed once complete. Returns the path of the compressed file
+    """
+
+    path = Path(path)
+    if level is None:
+        level = DEFAULT_LEVELS[method]
+    outfile = path.with_name(f"{path.name}{COMPRESSORS[method]}")
+    tmp = path.with_name(f".{outfile.name}.tmp")
+
+    if method == "gzip":
+        with open(path, "rb") as infile, gzip.open(tmp, "wb", compresslevel=level) as out:
+            shutil.copyfileobj(infile, out, chunk_size)
+    else:
+        subprocess.run(["zstd", "-q", "-f", f"-{level}", "-o", f"{tmp}", f"{path}"], check=True)
+
+    shutil.copymode(path, tmp)
+    os.replace(tmp, outfile)
+    path.unlink()
+
+    return outfile
+
+def compress_captures(directory, method="gzip", workers=4, level=None):
+    """
+    Compressing all uncompressed captures in the run folder at the same time
+    with the given number of threads.
+    Returns the compressed files
+    """
+
+    check_method(method)
+    captures = sorted(path for path in Path(directory).iterdir()
+                      if path.is_file() and not path.name.startswith(".") and path.suffix in CAPTURE_SUFFIXES)
+    if len(captures) == 0:
+        return []
+
+    start = time.monotonic()
+    size = sum(path.stat().st_size for path in captures)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="compress") as executor:
+        compressed = list(executor.map(lambda path: compress_file(path, method, level), captures))
+
+    compressed_size = sum(path.stat().st_size for path in compressed)
+    print(f"Compressed {len(compressed)} captures of '{directory}' with {method} from {size / 1e6:.1f}MB "
+          f"to {compressed_size / 1e6:.1f}MB in {time.monotonic() - start:.1f}s")
+
+    return compressed
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 
 class Scenarios(Enum):
@@ -7,6 +7,7 @@ class Scenarios(Enum):
     SINGLE_PATH_WITH_INTERNET = 3
     FULL_NETWORK = 4
     REAL_WORLD = 5
+    MULTI_PATH = 6
 
 class Tests(Enum):
     QUICHEPERF = 1
@@ -16,6 +17,8 @@ class Tests(Enum):
     QUICHEPERF_LOSS = 5
     QUICHEPERF_IF_INIT = 6
     REAL_WORLD = 7
+    PROBING_COST = 8
+    TIMELINE = 9
 
 class Logging(Enum):
     NONE = 0
@@ -25,11 +28,84 @@ class Logging(Enum):
     DEBUG = 4
     TRACE = 5
 
+@dataclass
+class CapturePolicy:
+    """
+    Describes how the packets of every node are captured.
+    Per-node values (by node name) take precedence over the NAT and
+    the general values. A snaplen of 0 captures the full packets.
+    """
+
+    # 'tshark' or 'dumpcap', dumpcap only writes packets and does no dissection
+    tool: str = "tshark"
+    snaplen: int = 0
+    # NATs are only analyzed by their headers
+    nat_snaplen: int = 0
+    bpf_filter: str = None
+    node_snaplen: dict = field(default_factory=dict)
+    node_filter: dict = field(default_factory=dict)
+    # Ring buffer, switching files after the size (kB) and keeping the given number of files
+    ring_filesize: int = None
+    ring_files: int = None
+
+    def snaplen_for(self, node):
+        if node in self.node_snaplen:
+            return self.node_snaplen[node]
+        if node.startswith("nat"):
+            return self.nat_snaplen
+        return self.snaplen
+
+    def filter_for(self, node):
+        return self.node_filter.get(node, self.bpf_filter)
+
+    def command(self, node, interfaces, outfile):
+        """
+        Creating the capture command for the given node, capturing all
+        interfaces into the outfile. Snaplen and filter are given before
+        the interfaces, so they apply to all of them.
+        Returns the argument list, so a filter with spaces stays a single
+        argument when the command is not run in a shell
+        """
+
+        cmd = [self.tool]
+        snaplen = self.snaplen_for(node)
+        if snaplen > 0:
+            cmd += ["-s", f"{snaplen}"]
+        bpf_filter = self.filter_for(node)
+        if bpf_filter is not None:
+            cmd += ["-f", bpf_filter]
+        for iface in interfaces:
+            cmd += ["-i", f"{iface}"]
+        cmd += ["-w", f"{outfile}"]
+        if self.ring_filesize is not None:
+            cmd += ["-b", f"filesize:{self.ring_filesize}"]
+        if self.ring_files is not None:
+            cmd += ["-b", f"files:{self.ring_files}"]
+        if self.tool == "tshark":
+            cmd.append("-n")
+
+        return cmd
+
+def _parse_node_values(values, convert=str):
+    """
+    Parsing a list of 'node=value' strings from the command line into a dictionary
+    """
+
+    parsed = {}
+    for value in values or []:
+        node, _, node_value = value.partition("=")
+        parsed[node] = convert(node_value)
+    return parsed
+
 @dataclass
 class TestConfiguration:
     # General
     scenario: Scenarios
     test: Tests
+    # Name of the experiment spec the configuration was loaded from
+    spec_name: str = None
+    # Actions of the 'timeline' test, see spec.py
+    timeline: list = None
 
     # Path delays
     wifi_direct_path_delay: int = 10
@@ -45,18 +121,55 @@ class TestConfiguration:
 
     # Features
     enable_pcap: bool = True
+    capture: CapturePolicy = None
+    # Sampling the interface counters every given seconds, disabled if None
+    counter_interval: float = None
+    # CSV file with delay, jitter, loss and rate per interface over time
+    impairment_trace: str = None
+    # Recording the conntrack events of all NATs
+    record_conntrack: bool = False
     enable_turn_server: bool = True
     block_stun_on_first_path: bool = False
     enable_cli_after_test: bool = False
     enable_snat : bool = False
     log_sslkeys: bool = False
     combine_pcaps: bool = True
+    # Compressing the captures after the run ('gzip', 'zstd' or None), see compression.py
+    compress_captures: str = "gzip"
     change_file_permissions: bool = False
 
     log_level: Logging = Logging.DEBUG
     build_target: str = "debug"
+    # Location of the quicheperf repository, None for the default location
+    quicheperf_dir: str = None
     throughput: str = "1MB"
     duration: int = 100
+    # Test runs on the same network, only resetting the state in between
+    iterations: int = 1
+    # Number of runs merged and post-processed at the same time in the background
+    postprocess_workers: int = 2
+
+    # Number of host pairs h(2i-1)/h(2i), each running its own flow
+    host_pairs: int = 1
+
+    # Multi-path scenario: number of interfaces per host, the delay per
+    # path in ms (repeated if shorter) and the paths leading through a NAT
+    multi_paths: int = 4
+    multi_path_delays: list = None
+    multi_path_nat: list = None
+
+    # Recording every run in the catalog, see catalog.py
+    enable_catalog: bool = True
+    catalog: str = "mininet_measurements/catalog.sqlite"
+    # Storing the files of every run deduplicated in this store, see artifact_store.py
+    artifact_store: str = None
+    # Writing the spans of the test phases to this Chrome trace file, see tracing.py
+    trace: str = None
+
+    # Output and naming, required to run multiple tests in parallel
+    output_directory: str = None
+    switch_prefix: str = ""
+    controller_port: int = None
 
     def __init__(self, args):
         """
@@ -96,6 +209,9 @@ class TestConfiguration:
             case "single+local":
                 print(f"Starting the '{args.setup}' test scenario")
                 self.scenario = Scenarios.SINGLE_PATH_WITH_LOCAL
+            case "multi-path":
+                print(f"Starting the '{args.setup}' test scenario")
+                self.scenario = Scenarios.MULTI_PATH
             case _:
                 print(f"No exact scenario given, choosing 'default'")
                 self.scenario = Scenarios.FULL_NETWORK
@@ -116,15 +232,49 @@ class TestConfiguration:
             case "quicheperf_if":
                 print(f"Starting the '{args.test}' scenario")
                 self.test = Tests.QUICHEPERF_IF
+            case "probing_cost":
+                print(f"Starting the '{args.test}' scenario")
+                self.test = Tests.PROBING_COST
+            case "timeline":
+                print(f"Starting the '{args.test}' scenario")
+                self.test = Tests.TIMELINE
             case _:
                 print(f"No test given, starting the 'debugging' scenario")
                 self.test = Tests.DEBUG
 
         self.build_target = args.build_target
+        self.quicheperf_dir = args.quicheperf_dir
+        self.catalog = args.catalog
+        self.artifact_store = args.artifact_store
+        self.trace = args.trace
+        self.compress_captures = args.compress_captures if args.compress_captures != "none" else None
         self.duration = args.duration
         self.throughput = args.throughput
         self.enable_snat = args.snat
         self.log_sslkeys = args.log_sslkeys
+        self.output_directory = args.output_dir
+        self.switch_prefix = args.switch_prefix
+        self.controller_port = args.controller_port
+        self.iterations = args.iterations
+        self.postprocess_workers = args.postprocess_workers
+        self.counter_interval = args.counter_interval
+        self.impairment_trace = args.impairment_trace
+        self.record_conntrack = args.record_conntrack
+        self.host_pairs = args.pairs
+        self.multi_paths = args.paths
+        self.multi_path_delays = args.path_delay if args.path_delay is not None else [3]
+        # By default every second path leads through a NAT
+        self.multi_path_nat = args.nat_path if args.nat_path is not None else list(range(2, args.paths + 1, 2))
+        self.capture = CapturePolicy(
+            tool=args.capture_tool,
+            snaplen=args.snaplen,
+            nat_snaplen=args.nat_snaplen,
+            bpf_filter=args.capture_filter,
+            node_snaplen=_parse_node_values(args.node_snaplen, int),
+            node_filter=_parse_node_values(args.node_capture_filter),
+            ring_filesize=args.ring_filesize,
+            ring_files=args.ring_files,
+        )
 
         if args.debug:
             # Irrelevant what scenario was given, debug the network
@@ -145,6 +295,9 @@ class TestConfiguration:
 
         if args.disable_pcap:
             self.enable_pcap = False
+
+        if args.disable_catalog:
+            self.enable_catalog = False
             
         if args.real:
             self.test = Tests.REAL_WORLD
@@ -153,4 +306,23 @@ class TestConfiguration:
             self.combine_pcaps = False
             
             if args.debug:
-                self.enable_cli_after_test = True
\ No newline at end of file
+                self.enable_cli_after_test = True
+
+def apply_overrides(conf: TestConfiguration, overrides):
+    """
+    Overwriting the fields of the test configuration with the values
+    of the given dictionary. Enum fields are given by their name.
+    Raises a ValueError in case an unknown field is given
+    """
+
+    for field, value in overrides.items():
+        if field not in TestConfiguration.__annotations__:
+            raise ValueError(f"'{field}' is no field of the test configuration")
+        current = getattr(conf, field)
+        if isinstance(current, Enum) and isinstance(value, str):
+            value = type(current)[value]
+        if isinstance(current, CapturePolicy) and isinstance(value, dict):
+            value = CapturePolicy(**value)
+        setattr(conf, field, value)
+
+    return conf
@@ -0,0 +1,540 @@
+# This file contains a minimal ctnetlink client for the conntrack tables
+# of the NATs, without starting 'conntrack' processes.
+#
+# The NATs live in their own network namespaces. A netlink socket belongs
+# to the namespace it was created in, so the socket is created by a thread
+# which enters the namespace of the NAT (setns on /proc/<pid>/ns/net) and
+# returns to the root namespace afterwards. The socket keeps working in the
+# namespace of the NAT.
+#
+# Only the parts required by the tests are implemented: receiving the
+# NEW/UPDATE/DESTROY events of IPv4 connections, dumping the IPv4
+# connections of the table and deleting a connection by its original tuple.
+#
+# Requires the 'nf_conntrack_netlink' kernel module.
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import ctypes
+import errno
+import heapq
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+NETLINK_NETFILTER = 12
+
+# Multicast groups of the conntrack events
+NFNLGRP_CONNTRACK_NEW = 1
+NFNLGRP_CONNTRACK_UPDATE = 2
+NFNLGRP_CONNTRACK_DESTROY = 3
+
+NFNL_SUBSYS_CTNETLINK = 1
+IPCTNL_MSG_CT_NEW = 0
+IPCTNL_MSG_CT_GET = 1
+IPCTNL_MSG_CT_DELETE = 2
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_CREATE = 0x400
+NLA_F_NESTED = 0x8000
+NLA_TYPE_MASK = 0x3fff
+
+CTA_TUPLE_ORIG = 1
+CTA_TUPLE_REPLY = 2
+CTA_STATUS = 3
+CTA_TIMEOUT = 7
+CTA_ID = 12
+CTA_TUPLE_IP = 1
+CTA_TUPLE_PROTO = 2
+CTA_IP_V4_SRC = 1
+CTA_IP_V4_DST = 2
+CTA_PROTO_NUM = 1
+CTA_PROTO_SRC_PORT = 2
+CTA_PROTO_DST_PORT = 3
+
+IPS_SEEN_REPLY = 1 << 1
+
+CLONE_NEWNET = 0x40000000
+
+_NLMSGHDR = struct.Struct("=IHHII")
+_NFGENMSG = struct.Struct("=BBH")
+_NLATTR = struct.Struct("=HH")
+
+def _setns(fd):
+    """
+    Moving the calling thread into the namespace of the file descriptor.
+    'os.setns' only exists since Python 3.12
+    """
+
+    if hasattr(os, "setns"):
+        os.setns(fd, CLONE_NEWNET)
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.setns(fd, CLONE_NEWNET) != 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+
+@contextmanager
+def network_namespace(pid):
+    """
+    Executing the block of the calling thread in the network namespace
+    of the given process, e.g. the shell of a Mininet node
+    """
+
+    own = os.open(f"/proc/{os.getpid()}/task/{threading.get_native_id()}/ns/net", os.O_RDONLY)
+    target = os.open(f"/proc/{pid}/ns/net", os.O_RDONLY)
+    try:
+        _setns(target)
+        yield
+    finally:
+        _setns(own)
+        os.close(target)
+        os.close(own)
+
+@dataclass
+class ConntrackTuple:
+    src: str = None
+    dst: str = None
+    proto: int = None
+    sport: int = None
+    dport: int = None
+
+    def __str__(self):
+        return f"{self.src}:{self.sport}->{self.dst}:{self.dport}/{self.proto}"
+
+@dataclass
+class ConntrackEvent:
+    """
+    A single conntrack event. The type is 'NEW', 'UPDATE' or 'DESTROY'
+    """
+
+    type: str
+    orig: ConntrackTuple
+    reply: ConntrackTuple
+    status: int = 0
+    id: int = None
+    timeout: int = None
+    received: float = None
+
+    def replied(self):
+        return self.status & IPS_SEEN_REPLY != 0
+
+def _attributes(data):
+    """
+    Iterating the netlink attributes in data as (type, payload)
+    """
+
+    offset = 0
+    while offset + _NLATTR.size <= len(data):
+        length, attr_type = _NLATTR.unpack_from(data, offset)
+        if length < _NLATTR.size:
+            break
+        yield attr_type & NLA_TYPE_MASK, data[offset + _NLATTR.size:offset + length]
+        # Attributes are aligned to 4 bytes
+        offset += (length + 3) & ~3
+
+def _parse_tuple(data):
+    parsed = ConntrackTuple()
+    for attr_type, payload in _attributes(data):
+        if attr_type == CTA_TUPLE_IP:
+            for ip_type, ip in _attributes(payload):
+                if ip_type == CTA_IP_V4_SRC:
+                    parsed.src = socket.inet_ntoa(ip)
+                elif ip_type == CTA_IP_V4_DST:
+                    parsed.dst = socket.inet_ntoa(ip)
+        elif attr_type == CTA_TUPLE_PROTO:
+            for proto_type, value in _attributes(payload):
+                if proto_type == CTA_PROTO_NUM:
+                    parsed.proto = value[0]
+                elif proto_type == CTA_PROTO_SRC_PORT:
+                    parsed.sport = struct.unpack("!H", value[:2])[0]
+                elif proto_type == CTA_PROTO_DST_PORT:
+                    parsed.dport = struct.unpack("!H", value[:2])[0]
+    return parsed
+
+def parse_messages(data, received=None):
+    """
+    Parsing all conntrack messages in the received buffer.
+    Returns the list of events and the list of error codes of acknowledgements
+    """
+
+    events = []
+    errors = []
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, flags, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            break
+        body = data[offset + _NLMSGHDR.size:offset + length]
+        offset += (length + 3) & ~3
+
+        if msg_type == NLMSG_ERROR:
+            errors.append(-struct.unpack_from("=i", body)[0])
+            continue
+        if msg_type == NLMSG_DONE or msg_type >> 8 != NFNL_SUBSYS_CTNETLINK:
+            continue
+
+        message = msg_type & 0xff
+        if message == IPCTNL_MSG_CT_DELETE:
+            event_type = "DESTROY"
+        elif flags & NLM_F_CREATE:
+            event_type = "NEW"
+        else:
+            event_type = "UPDATE"
+
+        event = ConntrackEvent(event_type, ConntrackTuple(), ConntrackTuple(), received=received)
+        for attr_type, payload in _attributes(body[_NFGENMSG.size:]):
+            if attr_type == CTA_TUPLE_ORIG:
+                event.orig = _parse_tuple(payload)
+            elif attr_type == CTA_TUPLE_REPLY:
+                event.reply = _parse_tuple(payload)
+            elif attr_type == CTA_STATUS:
+                event.status = struct.unpack("!I", payload[:4])[0]
+            elif attr_type == CTA_ID:
+                event.id = struct.unpack("!I", payload[:4])[0]
+            elif attr_type == CTA_TIMEOUT:
+                event.timeout = struct.unpack("!I", payload[:4])[0]
+        events.append(event)
+
+    return events, errors
+
+def _attribute(attr_type, payload, nested=False):
+    if nested:
+        attr_type |= NLA_F_NESTED
+    attribute = _NLATTR.pack(_NLATTR.size + len(payload), attr_type) + payload
+    # Padding to 4 bytes
+    return attribute + b"\0" * ((4 - len(attribute) % 4) % 4)
+
+def _delete_request(orig: ConntrackTuple, seq):
+    """
+    Creating the request deleting the connection with the given original tuple
+    """
+
+    ip = _attribute(CTA_IP_V4_SRC, socket.inet_aton(orig.src)) + _attribute(CTA_IP_V4_DST, socket.inet_aton(orig.dst))
+    proto = _attribute(CTA_PROTO_NUM, struct.pack("B", orig.proto))
+    if orig.sport is not None:
+        proto += _attribute(CTA_PROTO_SRC_PORT, struct.pack("!H", orig.sport))
+        proto += _attribute(CTA_PROTO_DST_PORT, struct.pack("!H", orig.dport))
+    tuple_orig = _attribute(CTA_TUPLE_IP, ip, nested=True) + _attribute(CTA_TUPLE_PROTO, proto, nested=True)
+
+    body = _NFGENMSG.pack(socket.AF_INET, 0, 0) + _attribute(CTA_TUPLE_ORIG, tuple_orig, nested=True)
+    msg_type = (NFNL_SUBSYS_CTNETLINK << 8) | IPCTNL_MSG_CT_DELETE
+    return _NLMSGHDR.pack(_NLMSGHDR.size + len(body), msg_type, NLM_F_REQUEST | NLM_F_ACK, seq, 0) + body
+
+def _dump_request(seq):
+    """
+    Creating the request dumping all IPv4 connections
+    """
+
+    body = _NFGENMSG.pack(socket.AF_INET, 0, 0)
+    msg_type = (NFNL_SUBSYS_CTNETLINK << 8) | IPCTNL_MSG_CT_GET
+    return _NLMSGHDR.pack(_NLMSGHDR.size + len(body), msg_type, NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + body
+
+def _dump_done(data):
+    """
+    Checking if the buffer holds the last message of a dump
+    """
+
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            break
+        if msg_type in [NLMSG_DONE, NLMSG_ERROR]:
+            return True
+        offset += (length + 3) & ~3
+    return False
+
+def dump_connections(sock, seq=0):
+    """
+    Reading all IPv4 connections of the table the socket belongs to.
+    Returns the connections as events of the type 'UPDATE'
+    """
+
+    sock.send(_dump_request(seq))
+    connections = []
+    while True:
+        data = sock.recv(1 << 20)
+        events, errors = parse_messages(data)
+        connections += events
+        if len(errors) > 0 and errors[0] != 0:
+            raise OSError(errors[0], os.strerror(errors[0]))
+        if _dump_done(data):
+            return connections
+
+def open_socket(groups=None, rcvbuf=None):
+    """
+    Opening a ctnetlink socket in the namespace of the calling thread,
+    subscribed to the given multicast groups (list of NFNLGRP values)
+    """
+
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_NETFILTER)
+    if rcvbuf is not None:
+        try:
+            # Ignoring the system limit, requires CAP_NET_ADMIN
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUFFORCE, rcvbuf)
+        except OSError:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    mask = 0
+    for group in groups or []:
+        mask |= 1 << (group - 1)
+    sock.bind((0, mask))
+    return sock
+
+class ConntrackPurger:
+    """
+    Deletes UNREPLIED UDP connections whose original source is one of the
+    given addresses in the conntrack table of a NAT, as soon as they are
+    created (or after a grace period in which a reply cancels the deletion).
+
+    Replaces the loop running 'conntrack --delete' every 100ms: the NEW
+    events are received over netlink and the deletion is requested on the
+    same thread, so no process is started. Matching connections which
+    already exist when the purger starts are deleted as well.
+
+    If the purger fails while running, the error is printed at once and
+    raised by 'stop()'.
+
+    Usage:
+        purger = ConntrackPurger(nat1, ["1.20.50.20", "1.20.30.2"], grace=0.05).start()
+        ...
+        purger.stop()
+        print(purger.counters)
+    """
+
+    def __init__(self, node, sources, grace=0, proto=socket.IPPROTO_UDP, rcvbuf=4 * 1024 * 1024):
+        self.node = node
+        self.sources = set(sources)
+        self.grace = grace
+        self.proto = proto
+        self.rcvbuf = rcvbuf
+        self.counters = {"existing": 0, "events": 0, "matched": 0, "deleted": 0, "replied": 0, "failed": 0, "overruns": 0}
+        self._pending = []
+        self._pending_keys = set()
+        self._cancelled = set()
+        self._seq = 0
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+        self._error = None
+
+    def _matches(self, event):
+        return (event.orig.proto == self.proto
+                and event.orig.src in self.sources
+                and not event.replied())
+
+    def _key(self, event):
+        orig = event.orig
+        return (orig.src, orig.sport, orig.dst, orig.dport, orig.proto)
+
+    def _delete(self, request_sock, orig):
+        self._seq += 1
+        request_sock.send(_delete_request(orig, self._seq))
+        _, errors = parse_messages(request_sock.recv(65536))
+        if len(errors) > 0 and errors[0] != 0:
+            # ENOENT in case the connection already expired
+            self.counters["failed"] += 1
+        else:
+            self.counters["deleted"] += 1
+
+    def _schedule(self, event):
+        """
+        Deleting the connection of the event once the grace period is over
+        """
+
+        key = self._key(event)
+        if key in self._pending_keys:
+            # Already known from the dump of the existing connections
+            self._cancelled.discard(key)
+            return
+        self.counters["matched"] += 1
+        heapq.heappush(self._pending, (time.monotonic() + self.grace, key, event.orig))
+        self._pending_keys.add(key)
+        self._cancelled.discard(key)
+
+    def _handle(self, event):
+        self.counters["events"] += 1
+        key = self._key(event)
+        if event.type == "NEW" and self._matches(event):
+            self._schedule(event)
+        elif key in self._pending_keys and (event.replied() or event.type == "DESTROY"):
+            # Answered or expired within the grace period, nothing to delete
+            if event.replied():
+                self.counters["replied"] += 1
+            self._cancelled.add(key)
+
+    def _run(self):
+        try:
+            with network_namespace(self.node.pid):
+                groups = [NFNLGRP_CONNTRACK_NEW]
+                if self.grace > 0:
+                    groups += [NFNLGRP_CONNTRACK_UPDATE, NFNLGRP_CONNTRACK_DESTROY]
+                event_sock = open_socket(groups, self.rcvbuf)
+                request_sock = open_socket()
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        try:
+            # The events are subscribed already, so no connection created
+            # in between is missed
+            self._seq += 1
+            for connection in dump_connections(request_sock, self._seq):
+                if self._matches(connection):
+                    self.counters["existing"] += 1
+                    self._schedule(connection)
+
+            while not self._stop.is_set():
+                timeout = 0.05
+                if len(self._pending) > 0:
+                    timeout = min(timeout, max(self._pending[0][0] - time.monotonic(), 0))
+
+                readable, _, _ = select.select([event_sock], [], [], timeout)
+                if readable:
+                    try:
+                        data = event_sock.recv(1 << 20)
+                    except OSError as e:
+                        if e.errno != errno.ENOBUFS:
+                            raise
+                        # Events were lost, the socket buffer was too small
+                        self.counters["overruns"] += 1
+                        continue
+                    events, _ = parse_messages(data)
+                    for event in events:
+                        self._handle(event)
+
+                now = time.monotonic()
+                while len(self._pending) > 0 and self._pending[0][0] <= now:
+                    _, key, orig = heapq.heappop(self._pending)
+                    self._pending_keys.discard(key)
+                    if key in self._cancelled:
+                        self._cancelled.discard(key)
+                        continue
+                    self._delete(request_sock, orig)
+        except Exception as e:
+            self._error = e
+            print(f"Conntrack purger on {self.node} failed: {e!r}")
+        finally:
+            event_sock.close()
+            request_sock.close()
+
+    def start(self):
+        """
+        Starting the purger. Returns once the purger listens for events
+        """
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            print(f"Cannot listen to the conntrack events of {self.node}: {self._error}")
+        return self
+
+    def stop(self):
+        """
+        Stopping the purger. Pending deletions are dropped.
+        Raises the error in case the purger failed
+        """
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        print(f"Conntrack purger on {self.node}: {self.counters}")
+        if self._error is not None:
+            raise self._error
+        return self.counters
+
+RECORD_COLUMNS = ["Time", "Node", "Event", "Proto", "OrigSrc", "OrigSport", "OrigDst", "OrigDport",
+                  "ReplySrc", "ReplySport", "ReplyDst", "ReplyDport", "Status", "Id"]
+
+class ConntrackRecorder:
+    """
+    Records all conntrack events (NEW, UPDATE, DESTROY) of a NAT into a
+    csv file, timestamped when they were received.
+
+    The socket buffer is large enough for the bursts of bindings created
+    during the ICE probing and the events are written buffered. Lost
+    events (buffer overruns) are counted and reported.
+
+    Usage:
+        recorder = ConntrackRecorder(nat1, f"{directory}/nat1_conntrack.csv").start()
+        ...
+        recorder.stop()
+    """
+
+    def __init__(self, node, outfile, rcvbuf=32 * 1024 * 1024):
+        self.node = node
+        self.outfile = outfile
+        self.rcvbuf = rcvbuf
+        self.counters = {"events": 0, "overruns": 0}
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+        self._error = None
+
+    def _write(self, out, event):
+        orig = event.orig
+        reply = event.reply
+        out.write(f"{event.received:.6f},{self.node},{event.type},{orig.proto},{orig.src},{orig.sport},{orig.dst},{orig.dport},"
+                  f"{reply.src},{reply.sport},{reply.dst},{reply.dport},{event.status},{event.id}\n")
+
+    def _run(self):
+        try:
+            with network_namespace(self.node.pid):
+                groups = [NFNLGRP_CONNTRACK_NEW, NFNLGRP_CONNTRACK_UPDATE, NFNLGRP_CONNTRACK_DESTROY]
+                sock = open_socket(groups, self.rcvbuf)
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        with sock, open(self.outfile, "w", buffering=1 << 20) as out:
+            out.write(",".join(RECORD_COLUMNS) + "\n")
+            while not self._stop.is_set():
+                readable, _, _ = select.select([sock], [], [], 0.05)
+                if not readable:
+                    continue
+                try:
+                    data = sock.recv(1 << 20)
+                except OSError as e:
+                    if e.errno != errno.ENOBUFS:
+                        raise
+                    self.counters["overruns"] += 1
+                    continue
+                events, _ = parse_messages(data, time.time())
+                for event in events:
+                    self._write(out, event)
+                self.counters["events"] += len(events)
+
+    def start(self):
+        """
+        Starting the recording. Returns once the recorder listens for events
+        """
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            print(f"Cannot record the conntrack events of {self.node}: {self._error}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is None:
+            print(f"Wrote {self.counters['events']} conntrack events ({self.counters['overruns']} overruns) to '{self.outfile}'")
+        return self.counters
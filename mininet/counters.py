@@ -0,0 +1,116 @@
+# This file contains the sampling of the interface counters of all hosts.
+#
+# For the throughput over time no packet capture is needed. The kernel
+# already counts the packets and bytes of every interface. The sampler
+# reads these counters for all nodes at a fixed interval and writes them
+# into 'counters.csv', which can be plotted with 'plotting/parseCounters.py'.
+#
+# The counters are read from '/proc/<pid>/net/dev' of the shell of every
+# node. It shows the interfaces of the network namespace of the process,
+# so all namespaces are read from a single thread in the root namespace
+# without entering them or starting processes.
+
+from pathlib import Path
+
+import os
+import threading
+import time
+
+COUNTER_COLUMNS = ["Time", "Node", "Interface", "RxPackets", "RxBytes", "TxPackets", "TxBytes"]
+
+def parse_net_dev(content):
+    """
+    Parsing the content of a 'net/dev' file.
+    Returns a list of tuples (interface, rx_packets, rx_bytes, tx_packets, tx_bytes)
+    """
+
+    counters = []
+    # The first two lines are the header
+    for line in content.splitlines()[2:]:
+        iface, _, values = line.partition(":")
+        fields = values.split()
+        if len(fields) < 10:
+            continue
+        counters.append((iface.strip(), fields[1], fields[0], fields[9], fields[8]))
+
+    return counters
+
+class CounterSampler:
+    """
+    Samples the packet and byte counters of all interfaces of the given
+    nodes in a background thread.
+
+    Usage:
+        sampler = CounterSampler(net.hosts, directory, interval=0.01)
+        sampler.start()
+        ...
+        sampler.stop()
+    """
+
+    def __init__(self, nodes, directory, interval=0.01, outfile="counters.csv"):
+        self.nodes = nodes
+        self.interval = interval
+        self.outfile = Path(directory).joinpath(outfile)
+        self.samples = 0
+        self.missed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _open(self):
+        """
+        Opening the counter file of every node once, they are re-read
+        from the start for every sample
+        """
+
+        files = {}
+        for node in self.nodes:
+            try:
+                files[f"{node}"] = os.open(f"/proc/{node.pid}/net/dev", os.O_RDONLY)
+            except OSError as e:
+                print(f"Cannot read the counters of {node}: {e}")
+        return files
+
+    def _sample(self):
+        files = self._open()
+        with open(self.outfile, "w") as out:
+            out.write(",".join(COUNTER_COLUMNS) + "\n")
+
+            next_sample = time.monotonic()
+            while not self._stop.is_set():
+                for node, fd in files.items():
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    content = os.read(fd, 65536).decode("utf-8", errors="replace")
+                    now = time.time()
+                    for iface, rx_packets, rx_bytes, tx_packets, tx_bytes in parse_net_dev(content):
+                        out.write(f"{now:.6f},{node},{iface},{rx_packets},{rx_bytes},{tx_packets},{tx_bytes}\n")
+                self.samples += 1
+
+                # Keeping the absolute interval, skipping samples if reading took too long
+                next_sample += self.interval
+                remaining = next_sample - time.monotonic()
+                if remaining < 0:
+                    skipped = int(-remaining // self.interval) + 1
+                    self.missed += skipped
+                    next_sample += skipped * self.interval
+                    remaining = next_sample - time.monotonic()
+                self._stop.wait(max(remaining, 0))
+
+        for fd in files.values():
+            os.close(fd)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stopping the sampling and closing the output file
+        """
+
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        print(f"Wrote {self.samples} counter samples ({self.missed} missed) to '{self.outfile}'")
@@ -1,13 +1,25 @@
 # This class contains the helper functionality to start and perform different
 # tests to measure the performance of the current implementation
 
-from config import Tests, Scenarios, Logging, TestConfiguration
-from measurement_util import create_new_test_folder, change_rights_test_folder, print_nat_table, print_routing_table, terminate, path_loss, combineHostPcaps, injectSSLKeysPcap
-from testing import quicheperf, quicheperf_if_test, quicheperf_if_init_test, quicheperf_path_loss_test, start_ping_pong, start_debug, quicheperf_real_world
+from config import Tests, Scenarios, Logging, TestConfiguration, CapturePolicy
+from measurement_util import create_new_test_folder, change_rights_test_folder, print_nat_table, print_routing_table, terminate, path_loss, combineHostPcaps, injectSSLKeysPcap, capture_files, snapshot_network_state, reset_network_state, discard_network_state
+from testing import quicheperf, quicheperf_if_test, quicheperf_if_init_test, quicheperf_path_loss_test, start_ping_pong, start_debug, quicheperf_real_world, quicheperf_probing_cost, quicheperf_timeline
+from gates import ProcessGate, wait_for_gates, CAPTURE_STARTED
+from scheduler import RunAborted, reset_abort
+from supervisor import ProcessSupervisor
+from postprocess import PostProcessor
+from spec import write_spec
+from catalog import record_run
+from artifact_store import ArtifactStore
+from compression import compress_captures
+from tracing import span, traced
+from counters import CounterSampler
+from impairment_trace import ImpairmentEngine, load_trace
+from conntrack import ConntrackRecorder
 from mininet.cli import CLI
 from pathlib import Path
 
-import re, time, os, subprocess
+import re, time, os, subprocess, threading, shlex
 
 # Some useful information for testing
 username = "justus"
@@ -15,7 +27,7 @@ code_dir = f"/home/{username}/Documents/Code"
 quicheperf_dir = f"{code_dir}/quicheperf-stun"
 testing_dir = f"{code_dir}/2024-justus-von-der-beek-supplementary-material"
 
-def start_test(net, conf: TestConfiguration):
+def start_test(net, conf: TestConfiguration, postprocessor: PostProcessor = None):
     """
     Performing the given test on the given network.
     Configuration:
@@ -23,6 +35,9 @@ def start_test(net, conf: TestConfiguration):
     - Configure and start the network with a CLI, no tests will be performed
     - Disabling or modifying the level of log output
     - Changing the file permissions after testing to 666
+    - Repeating the test on the same network for multiple iterations
+    The captures are post-processed by the given postprocessor in the
+    background, without one they are processed before returning.
     """
 
     match conf.test:
@@ -40,32 +55,43 @@ def start_test(net, conf: TestConfiguration):
             test_function = quicheperf_path_loss_test
         case Tests.REAL_WORLD:
             test_function = quicheperf_real_world
+        case Tests.PROBING_COST:
+            test_function = quicheperf_probing_cost
+        case Tests.TIMELINE:
+            test_function = quicheperf_timeline
         case _:
             print("No correct test given, exiting...")
             return
         
-    _test_wrapper(net, test_function, conf)
+    if postprocessor is None:
+        postprocessor = PostProcessor(workers=0)
 
-def _start_turn_server(net, host):
+    if conf.iterations > 1:
+        _warm_test_wrapper(net, test_function, conf, postprocessor)
+    else:
+        _test_wrapper(net, test_function, conf, postprocessor)
+
+def _start_turn_server(net, host, supervisor):
     """
     Starting the TURN server at the dedicated host.
     Using the 'coturn' implementation.
     Current configuration:
     - no logfile
     - no authentication required
+    The server is watched by the given supervisor and aborts the
+    run if it exits.
     """
 
     h = net.get(host)
 
     # The server is correctly configured, nothing needed to answer simple STUN requests
     # And no login required; prevent creation of logfile under /var/log/turn_*
+    # The output is not needed, discarding it so the pipe never fills up
     cmd = f"{code_dir}/coturn/bin/turnserver -z --log-file stdout"
-    process = h.popen(cmd)
-
-    return [(process, None)]
+    return supervisor.start("turnserver", h, cmd, persistent=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 
-def _start_pcap_capture(net, directory, additional_ifs=None):
+def _start_pcap_capture(net, directory, supervisor, additional_ifs=None, policy: CapturePolicy = None):
     """
     Starting capturing network traffic in pcap files
     for all nodes in the network. This includes hosts and router/NATs
@@ -76,17 +102,19 @@ def _start_pcap_capture(net, directory, additional_ifs=None):
     of host names. TODO: Maybe at a later point adding specific 
     interfaces only might be possible, for now its not
 
+    All captures are started at the same time and are watched by the
+    given supervisor. The capture tool, snaplen, filter and ring buffer
+    of every node are given by the capture policy.
+
     Returns a list of tuples, holding the capture processes together 
     with the filename to which the capture takes place.
     """
 
     capture_hosts = []
-    for host in net.values():
-        # Filtering switches and other hosts out
-        found = re.search("^(s|c)[0-9]+", f"{host}")
-        if found is None:
-            # Those hosts which are not to filter
-            capture_hosts.append(f"{host}")
+    # Switches and controllers are not part of the hosts. Not relying on
+    # the name because switches might be prefixed
+    for host in net.hosts:
+        capture_hosts.append(f"{host}")
     
     # if additional_ifs is not None:
     #     for additional, ifs in additional_ifs:
@@ -95,40 +123,47 @@ def _start_pcap_capture(net, directory, additional_ifs=None):
     #     for additional, ifs in additional_ifs:
     #         capture_hosts.append(additional)
 
-    capture_list = []
+    if policy is None:
+        policy = CapturePolicy()
+
+    commands = []
+    outfiles = []
     for h in capture_hosts:
         host = net.get(h)
         ifs = host.intfNames()
         if additional_ifs is not None and "h" in f"{host}":
             ifs += additional_ifs
-        ifs_str = " -i ".join(ifs)
         outfile = f"{directory}/{h}.pcap"
         # Capturing all given interfaces but into a single pcap file
         # Allows for differentiation in the analysis
-        capture_cmd = f"tshark -i {ifs_str} -w {outfile} -n"
-        print(f"Capturing '{capture_cmd}'")
-        host_pcap = host.popen(f"{capture_cmd}")
-        capture = (host_pcap, outfile)
-        capture_list.append(capture)
+        capture_cmd = policy.command(h, ifs, outfile)
+        print(f"Capturing '{shlex.join(capture_cmd)}'")
+        commands.append({"name": f"{h}.pcap", "host": host, "cmd": capture_cmd, "persistent": True})
+        outfiles.append(outfile)
+
+    captures = supervisor.start_all(commands)
 
-    return capture_list
+    return [(capture.process, outfile) for capture, outfile in zip(captures, outfiles)]
 
 def _stop_pcap_capture(captures, modify_file_perm=False):
     """
-    Terminating the pcap packet captures.
+    Finishing the pcap packet captures, which must have been stopped
+    by the supervisor before.
     If specified, setting the file permission to allow everyone
     to read and write the file.
     """
 
     for process, outfile in captures:
-        process.terminate()
-        
         if outfile is None:
-            return
+            continue
         
-        if modify_file_perm and Path(outfile).exists():
-            os.chmod(outfile, 0o666)
-            print(f"Wrote pcap to '{outfile}'")
+        if not modify_file_perm:
+            continue
+
+        # With a ring buffer the capture consists of multiple files
+        for capture_file in capture_files(Path(outfile).parent, Path(outfile).stem):
+            os.chmod(capture_file, 0o666)
+            print(f"Wrote pcap to '{capture_file}'")
 
 def _set_log_level(logging: Logging):
     """
@@ -160,11 +195,18 @@ def _print_all_nat_tables(net, directory):
     printing the NAT table to a file 
     """
 
+    # Every NAT has its own shell, reading all tables at the same time
+    threads = []
     for host in net.values():
         # Filtering NATs
         found = re.search("^nat", f"{host}")
         if found is not None:
-            print_nat_table(net, f"{host}", directory)
+            thread = threading.Thread(target=print_nat_table, args=(net, f"{host}", directory))
+            thread.start()
+            threads.append(thread)
+
+    for thread in threads:
+        thread.join()
 
 def _print_success(directory):
     """
@@ -192,66 +234,227 @@ def _enable_log_sslkey(directory):
 
     os.environ["SSLKEYLOGFILE"] = f"{directory}/sslkey.log"
 
-def _terminate_processes(captures):
+def _terminate_processes(supervisor):
     """
-    Terminating all given processes and writing the output
-    (if given) to the included file.
-    Expecting a list of tuples holding the process and logfile
-    name in the format (process, logfile).
+    Stopping all processes of the supervisor in parallel and writing
+    the output (if given) to the logfile of each process.
     In case the logfile is 'None' no logfile is written.
     """
 
-    for process, logfile in captures:
-        terminate(process, logfile, overwrite=True)
+    for supervised in supervisor.stop_all():
+        if supervised.logfile is not None:
+            terminate(supervised.process, supervised.logfile, terminate=False, overwrite=True)
 
 
-def _test_wrapper(net, test_function, conf: TestConfiguration):
+def _create_test_dir(conf: TestConfiguration, iteration=None):
     """
-    Starting quicheperf in the given network configuration.
-    Logging with the given log level into a newly created
-    directory.
-    After the test the network is NOT stopped. 
-    Must be performed additionally
+    Creating the directory for the next test run. Either a new
+    measurement folder or the configured output directory.
+    With multiple iterations every iteration gets its own folder
+    """
+
+    if conf.output_directory is None:
+        return create_new_test_folder()
+
+    test_dir = Path(conf.output_directory)
+    if iteration is not None:
+        test_dir = test_dir.joinpath(f"iteration_{iteration:03d}")
+    test_dir.mkdir(parents=True, exist_ok=True)
+
+    return test_dir
+
+def _start_conntrack_recorders(net, directory):
+    """
+    Recording the conntrack events of all NATs for the whole run
+    into '<nat>_conntrack.csv'
     """
 
-    net.start()
+    recorders = []
+    for host in net.hosts:
+        if re.search("^nat", f"{host}") is not None:
+            recorders.append(ConntrackRecorder(host, f"{directory}/{host}_conntrack.csv").start())
+
+    return recorders
+
+def _postprocess_steps(conf: TestConfiguration, test_dir, started=None, finished=None, status="completed"):
+    """
+    Creating the post-processing steps of a finished run, which only
+    require the written files and not the network anymore.
+    The captures are compressed once merged, then all files are added to
+    the artifact store, and the run is recorded in the catalog last
+    """
+
+    steps = []
+    if conf.enable_pcap and conf.combine_pcaps:
+        combinedPcap = f"{test_dir}/h1_h2_combined.pcapng"
+        steps.append((combineHostPcaps, (test_dir,), {}))
+        if conf.log_sslkeys:
+            steps.append((injectSSLKeysPcap, (combinedPcap, f"{test_dir}/sslkey.log"), {}))
+    if conf.enable_pcap and conf.compress_captures is not None:
+        steps.append((compress_captures, (test_dir, conf.compress_captures), {}))
+    # The new files must be accessible as well
+    if len(steps) > 0:
+        steps.append((change_rights_test_folder, (test_dir,), {}))
+    if conf.artifact_store is not None:
+        steps.append((ArtifactStore(conf.artifact_store).ingest, (test_dir,), {}))
+    if conf.enable_catalog:
+        steps.append((record_run, (test_dir, conf.catalog, started, finished, status), {}))
+
+    return steps
+
+@traced
+def _run_test(net, test_function, conf: TestConfiguration, test_dir, postprocessor, turn_supervisor=None):
+    """
+    Performing a single test run on the already started network.
+    Starts the captures, executes the test and collects all logs,
+    NAT and routing tables into the test directory.
+    Merging the captures is queued at the postprocessor.
+    If the TURN server of the given supervisor already crashed, the
+    run stays aborted. Other errors are raised once all processes of the
+    run are stopped and the run is recorded as failed.
+    """
 
-    test_dir = create_new_test_folder()
     _set_log_level(conf.log_level)
+    if turn_supervisor is None or len(turn_supervisor.crashed()) == 0:
+        reset_abort()
 
-    if conf.enable_turn_server:
-        turn_server = _start_turn_server(net, "turn")
+    # The resolved configuration, identifying the experiment of this run
+    write_spec(conf, test_dir)
+    started = time.time()
+    status = "completed"
 
-    if conf.enable_pcap:
-        pcap_captures = _start_pcap_capture(net, test_dir, ["lo"])
+    supervisor = ProcessSupervisor(test_dir).activate()
 
     if conf.log_sslkeys:
         _enable_log_sslkey(test_dir)
 
-    # Allows to capture the earliest packets, otherwise some might miss
-    time.sleep(1)
+    pcap_captures = []
+    sampler = None
+    impairments = None
+    recorders = []
+    try:
+        if conf.enable_pcap:
+            with span("capture_start"):
+                pcap_captures = _start_pcap_capture(net, test_dir, supervisor, ["lo"], conf.capture)
+
+        # Allows to capture the earliest packets, otherwise some might miss
+        # Waiting until every capture reports that it is running
+        if conf.enable_pcap:
+            capture_gates = [ProcessGate(process, CAPTURE_STARTED, name=f"capture {Path(outfile).name}") for process, outfile in pcap_captures]
+            with span("capture_gates"):
+                wait_for_gates(capture_gates, timeout=5)
+
+        # The NAT bindings over time, in addition to the tables at the end
+        if conf.record_conntrack:
+            recorders = _start_conntrack_recorders(net, test_dir)
+
+        # The throughput can also be taken from the interface counters
+        if conf.counter_interval is not None:
+            sampler = CounterSampler(net.hosts, test_dir, conf.counter_interval).start()
+
+        # Replaying the impairments in the background, starting with the test
+        if conf.impairment_trace is not None:
+            impairments = ImpairmentEngine(net, load_trace(conf.impairment_trace), test_dir).start()
+
+        # Performing the actual test
+        with span("test", test=conf.test.name):
+            processes = test_function(net, test_dir, conf)
+
+        # Processes not registered by the test itself
+        for process, logfile in processes or []:
+            supervisor.add(f"pid {process.pid}", process, logfile)
+
+        if conf.enable_cli_after_test:
+            CLI(net)
+    except RunAborted as e:
+        print(f"Test aborted early: {e}")
+        status = "aborted"
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        # Stopping the test processes and the captures at the same time
+        with span("termination"):
+            _terminate_processes(supervisor)
+        if sampler is not None:
+            sampler.stop()
+        if impairments is not None:
+            impairments.stop()
+        for recorder in recorders:
+            recorder.stop()
+        supervisor.write_log()
+
+        if conf.enable_pcap:
+            _stop_pcap_capture(pcap_captures, conf.change_file_permissions)
+
+        _print_all_nat_tables(net, test_dir)
+        print_routing_table(net, test_dir)
+
+        change_rights_test_folder(test_dir)
+        finished = time.time()
+
+        postprocessor.submit(test_dir, _postprocess_steps(conf, test_dir, started, finished, status))
+
+@traced
+def _test_wrapper(net, test_function, conf: TestConfiguration, postprocessor):
+    """
+    Starting quicheperf in the given network configuration.
+    Logging with the given log level into a newly created
+    directory.
+    After the test the network is NOT stopped. 
+    Must be performed additionally
+    """
 
-    # Performing the actual test
-    processes = test_function(net, test_dir, conf)
+    with span("net.start"):
+        net.start()
 
-    if conf.enable_cli_after_test:
-        CLI(net)
+    test_dir = _create_test_dir(conf)
 
-    _terminate_processes(processes)
+    # The TURN server lives longer than a single run
+    turn_supervisor = ProcessSupervisor(test_dir, "turn_processes.log")
+    if conf.enable_turn_server:
+        with span("turn_start"):
+            _start_turn_server(net, "turn", turn_supervisor)
 
-    # Stopping all the captures
-    if conf.enable_pcap:
-        _stop_pcap_capture(pcap_captures, conf.change_file_permissions)
+    _run_test(net, test_function, conf, test_dir, postprocessor, turn_supervisor)
 
-    if conf.enable_turn_server:
-        _stop_pcap_capture(turn_server)
+    turn_supervisor.stop_all()
+    turn_supervisor.write_log()
 
-    _print_all_nat_tables(net, test_dir)
-    print_routing_table(net, test_dir)
+@traced
+def _warm_test_wrapper(net, test_function, conf: TestConfiguration, postprocessor):
+    """
+    Performing the test multiple times on the same network.
+    The network, OVS and the TURN server are only started once.
+    Between the iterations only the dynamic state (conntrack, netem,
+    addresses and routes) is reset and the captures are written to
+    a new directory.
+    If the TURN server crashes, no further iterations are started.
+    After the tests the network is NOT stopped.
+    """
 
-    change_rights_test_folder(test_dir)
+    with span("net.start"):
+        net.start()
+    state = snapshot_network_state(net)
 
-    if conf.combine_pcaps:
-        combinedPcap = combineHostPcaps(test_dir)
-    if conf.log_sslkeys and conf.combine_pcaps:
-        injectSSLKeysPcap(combinedPcap, f"{test_dir}/sslkey.log")
\ No newline at end of file
+    # The TURN server lives longer than a single run
+    turn_supervisor = ProcessSupervisor(conf.output_directory, "turn_processes.log")
+    if conf.enable_turn_server:
+        with span("turn_start"):
+            _start_turn_server(net, "turn", turn_supervisor)
+
+    for iteration in range(conf.iterations):
+        # All further runs would be aborted right away
+        if len(turn_supervisor.crashed()) > 0:
+            print(f"TURN server exited, stopping after {iteration}/{conf.iterations} iterations")
+            break
+        print(f"Starting iteration {iteration + 1}/{conf.iterations}")
+        if iteration > 0:
+            reset_network_state(net, state)
+        test_dir = _create_test_dir(conf, iteration)
+        _run_test(net, test_function, conf, test_dir, postprocessor, turn_supervisor)
+
+    turn_supervisor.stop_all()
+    turn_supervisor.write_log()
+
+    discard_network_state(state)
@@ -0,0 +1,147 @@
+# This file contains readiness gates for the test steps.
+#
+# Instead of sleeping for a fixed time, a gate follows the output of a
+# process or a logfile while it is written and opens as soon as the
+# expected line appears, e.g. tshark reporting that it is capturing or
+# quicheperf logging the first nominated pair.
+#
+# Every wait has a timeout, so a gate never blocks longer than the fixed
+# sleep it replaces.
+
+from pathlib import Path
+from scheduler import check_aborted
+
+import re
+import threading
+import time
+
+# Patterns for the most common protocol states
+CAPTURE_STARTED = r"Capturing on"
+NOMINATED_PAIR = r"NominatedPair"
+PATH_VALIDATED = r"path .*validated"
+
+# Interval in which logfiles are checked for new lines
+_poll_interval = 0.01
+
+class LogGate:
+    """
+    Opens as soon as the given pattern (case-insensitive) was written
+    'count' times to the logfile. The file does not need to exist yet.
+    """
+
+    def __init__(self, path, pattern, count=1, name=None):
+        self.path = Path(path)
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.count = count
+        self.name = name if name is not None else f"'{pattern}' in {self.path.name}"
+        self.matches = 0
+        self.opened = None
+        self._file = None
+        self._rest = ""
+
+    def _read_new_lines(self):
+        """
+        Reading all lines written since the last call. Incomplete lines
+        are kept until the rest is written
+        """
+
+        if self._file is None:
+            if not self.path.exists():
+                return
+            self._file = open(self.path, "r", errors="replace")
+
+        content = self._rest + self._file.read()
+        lines = content.split("\n")
+        self._rest = lines.pop()
+        for line in lines:
+            if self.pattern.search(line) is not None:
+                self.matches += 1
+                if self.matches >= self.count and self.opened is None:
+                    self.opened = time.monotonic()
+
+    def is_open(self):
+        """
+        Checking the logfile without blocking
+        """
+
+        if self.opened is None:
+            self._read_new_lines()
+        return self.opened is not None
+
+    def wait(self, timeout):
+        """
+        Blocking until the gate opens or the timeout (in seconds) is reached.
+        Returns True if the gate opened
+        """
+
+        deadline = time.monotonic() + timeout
+        while not self.is_open():
+            check_aborted()
+            if time.monotonic() >= deadline:
+                print(f"Gate {self.name} not reached after {timeout}s")
+                return False
+            time.sleep(_poll_interval)
+
+        return True
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class ProcessGate:
+    """
+    Opens as soon as the given pattern (case-insensitive) was printed by
+    the process. Reads the stdout or stderr pipe of the process in a
+    background thread until the process closes it, so the pipe never fills up.
+    """
+
+    def __init__(self, process, pattern, stream="stderr", name=None):
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.name = name if name is not None else f"'{pattern}' of pid {process.pid}"
+        self.opened = None
+        self._event = threading.Event()
+
+        pipe = process.stderr if stream == "stderr" else process.stdout
+        self._reader = threading.Thread(target=self._follow, args=(pipe,), daemon=True)
+        self._reader.start()
+
+    def _follow(self, pipe):
+        for line in iter(pipe.readline, b""):
+            if self._event.is_set():
+                continue
+            if self.pattern.search(line.decode("utf-8", errors="replace")) is not None:
+                self.opened = time.monotonic()
+                self._event.set()
+
+    def is_open(self):
+        return self._event.is_set()
+
+    def wait(self, timeout):
+        """
+        Blocking until the gate opens or the timeout (in seconds) is reached.
+        Returns True if the gate opened
+        """
+
+        deadline = time.monotonic() + timeout
+        while not self._event.wait(_poll_interval):
+            check_aborted()
+            if time.monotonic() >= deadline:
+                print(f"Gate {self.name} not reached after {timeout}s")
+                return False
+
+        return True
+
+def wait_for_gates(gates, timeout):
+    """
+    Waiting until all given gates are open, sharing a single timeout.
+    Returns True if all gates opened in time
+    """
+
+    deadline = time.monotonic() + timeout
+    opened = True
+    for gate in gates:
+        remaining = max(deadline - time.monotonic(), 0)
+        opened = gate.wait(remaining) and opened
+
+    return opened
@@ -0,0 +1,198 @@
+# This file contains the trace-driven impairment engine.
+#
+# Instead of static delays and losses, the engine replays a time series of
+# delay, jitter, loss and rate per interface while a test is running, e.g.
+# to measure the migration under a fading cellular or Wi-Fi path.
+#
+# The trace is either read from a csv file or created by a generator. Every
+# update is a line 'qdisc replace ... netem ...' written into a persistent
+# 'tc -force -batch -' process per node, so no process is spawned per update
+# and updates at intervals of a few milliseconds are possible.
+#
+# The csv file holds the offset in seconds from the start of the test, the
+# interface and the changed parameters. Empty values keep the current value:
+#
+#   time,interface,delay,jitter,loss,rate
+#   0.00,h1-cellular,20ms,,0,
+#   0.01,h1-cellular,22ms,2ms,0.5,
+#   0.02,nat1-ext,,,1,10mbit
+
+from itertools import groupby
+from pathlib import Path
+from subprocess import PIPE, DEVNULL
+
+from measurement_util import impairment_qdisc
+from scheduler import sleep_until, RunAborted
+from topologies.link_index import get_link_index
+
+import csv
+import math
+import threading
+import time
+
+TRACE_PARAMETERS = ["delay", "jitter", "loss", "rate"]
+
+# The last seconds before an update are waited with 'sleep_until'
+_precise_wait = 0.005
+
+def load_trace(trace_file):
+    """
+    Reading the trace from the given csv file.
+    Returns a list of tuples (offset, interface, parameters) sorted by offset
+    """
+
+    events = []
+    with open(trace_file, "r", newline="") as infile:
+        for row in csv.DictReader(infile):
+            params = {}
+            for parameter in TRACE_PARAMETERS:
+                value = row.get(parameter)
+                if value is None or value.strip() == "":
+                    continue
+                params[parameter] = float(value) if parameter == "loss" else value.strip()
+            events.append((float(row["time"]), row["interface"].strip(), params))
+
+    events.sort(key=lambda event: event[0])
+    return events
+
+def fading_trace(interface, duration, interval=0.01, delay=20, delay_amplitude=10, loss_max=5, period=10):
+    """
+    Generating a simple fading path: the delay (ms) and loss (%) follow
+    a sine wave with the given period in seconds.
+    Yields tuples (offset, interface, parameters) like 'load_trace'
+    """
+
+    steps = int(duration / interval)
+    for step in range(steps + 1):
+        offset = step * interval
+        phase = math.sin(2 * math.pi * offset / period)
+        yield (offset, interface, {
+            "delay": f"{delay + delay_amplitude * phase:.1f}ms",
+            "loss": round(loss_max * max(phase, 0), 2),
+        })
+
+class ImpairmentEngine:
+    """
+    Replays a trace of impairments on the links of the network in a
+    background thread, relative to the time the engine was started.
+
+    Usage:
+        engine = ImpairmentEngine(net, load_trace("fading.csv"), directory)
+        engine.start()
+        ...
+        engine.stop()
+    """
+
+    def __init__(self, net, trace, directory=None, logfile="impairment_trace.log"):
+        self.net = net
+        self.trace = trace
+        self.directory = directory
+        self.logfile = logfile
+        self.index = get_link_index(net)
+        self.updates = 0
+        self.start_time = None
+        self._tc = {}
+        self._log = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _batch(self, node):
+        """
+        Returning the persistent tc process of the node, starting it if needed
+        """
+
+        if node not in self._tc:
+            self._tc[node] = node.popen(["tc", "-force", "-batch", "-"], stdin=PIPE, stdout=DEVNULL, stderr=DEVNULL)
+        return self._tc[node]
+
+    def _apply(self, offset, events):
+        """
+        Writing the updates of a single point in time, one batch write per node
+        """
+
+        lines = {}
+        for _, iface, params in events:
+            if iface not in self.index:
+                print(f"Trace contains unknown interface '{iface}', skipping")
+                continue
+            entry = self.index[iface]
+            entry.current.update(params)
+            lines.setdefault(entry.node, []).append(impairment_qdisc(entry))
+
+        for node, node_lines in lines.items():
+            process = self._batch(node)
+            process.stdin.write(("\n".join(node_lines) + "\n").encode("utf-8"))
+            process.stdin.flush()
+
+        applied = time.monotonic() - self.start_time
+        self.updates += len(events)
+        self._log.append((offset, applied, len(events)))
+
+    def _wait_until(self, deadline):
+        """
+        Waiting until the deadline, returns False if stopped before.
+        The last milliseconds are left to 'sleep_until' for its precision
+        """
+
+        remaining = deadline - time.monotonic()
+        if remaining > _precise_wait and self._stop.wait(remaining - _precise_wait):
+            return False
+        sleep_until(deadline)
+        return not self._stop.is_set()
+
+    def _replay(self):
+        try:
+            for offset, events in groupby(self.trace, key=lambda event: event[0]):
+                if not self._wait_until(self.start_time + offset):
+                    break
+                self._apply(offset, list(events))
+        except RunAborted:
+            pass
+
+    def start(self, start=None):
+        """
+        Starting the replay. The offsets are relative to the given start on
+        the monotonic clock, by default the current time
+        """
+
+        self.start_time = start if start is not None else time.monotonic()
+        self._thread = threading.Thread(target=self._replay, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stopping the replay, ending the tc processes and writing the log.
+        The last applied impairments stay active
+        """
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        for process in self._tc.values():
+            process.stdin.close()
+            process.wait()
+        self._tc = {}
+
+        self.write_log()
+
+    def write_log(self):
+        """
+        Writing the intended and actual offset of every update as csv
+        """
+
+        if len(self._log) > 0:
+            late = max(applied - offset for offset, applied, _ in self._log) * 1000
+            print(f"Applied {self.updates} trace updates, at most {late:.1f}ms late")
+
+        if self.directory is None:
+            return
+
+        outfile = Path(self.directory).joinpath(self.logfile)
+        with open(outfile, "w") as log:
+            log.write("intended,applied,updates\n")
+            for offset, applied, count in self._log:
+                log.write(f"{offset:.6f},{applied:.6f},{count}\n")
+        print(f"Wrote impairment trace log to '{outfile}'")
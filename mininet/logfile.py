@@ -1,9 +1,12 @@
 # This file is meant to be shared across multiple projects
 # making use of large logfiles.
 # It allows filtering logfiles for specifc sources, both
-# positiv and negative
+# positiv and negative, and parsing the timestamps of their lines
+
+from datetime import datetime, timezone
 
 import os
+import re
 
 def filter_logfile_positiv(file, contains, outfile=None):
     """Filtering the given file for lines that are contained
@@ -52,4 +55,21 @@ def filter_logfile_negative(file, contains, outfile=None):
                     break
                 
     print(f"Filtered logfile and wrote to: '{outfile}'")
-    
\ No newline at end of file
+    
+
+def parse_log_timestamp(timestamp):
+    """Converting the RFC3339 timestamp of a log line into seconds since epoch.
+    Returns None if the timestamp cannot be parsed.
+    """
+
+    if timestamp.endswith("Z"):
+        timestamp = timestamp[:-1] + "+00:00"
+    # fromisoformat only accepts up to microseconds, the logger can print nanoseconds
+    timestamp = re.sub(r"(\.\d{6})\d+", r"\1", timestamp)
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
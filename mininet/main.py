@@ -13,9 +13,13 @@ from mininet.node import Node, Switch, OVSController
 # from topologies import TwoConnections, TwoConnectionWithInternet, DirectAndInternet, InternetTopo, DirectAndInternetAndTURN
 from measurement_util import capture_pcap, capture_ssl, terminate, stop_path, start_path, path_loss, wait, print_nat_table, create_new_test_folder, change_rights_test_folder
 from topologies.topologies import create_test_scenario
-from config import Scenarios, Logging, Tests, TestConfiguration
+from config import Scenarios, Logging, Tests, TestConfiguration, apply_overrides
 from logfile import filter_logfile_positiv
 from experiment import start_test
+from postprocess import PostProcessor
+from spec import load_spec, apply_spec
+from compression import check_method
+from tracing import enable_tracing, span, write_trace
 
 
 from mininet.net import Mininet
@@ -26,6 +30,7 @@ import time
 import os
 import subprocess
 import argparse
+import json
 
 # def start_quicheperf_server(net):
 #     """Starting the quicheperf server"""
@@ -180,17 +185,18 @@ def test_wifi_path_delay_ratio(args):
 # Predefined scenarios
 # ------------------------------------------------------------------------------------
 
-def main():
+def create_argument_parser():
     """
-    Starting the main function, parsing the command line and starting the relevant tests
+    Creating the command line parser for the tests. Shared with the
+    parameter sweep which starts this script for every grid point
     """
 
-    # Parsing the command line
     # Only options are to disable pcap or log output or debug network
     parser = argparse.ArgumentParser(description="Creating measurement environment for the master thesis and executing tests")
     parser.add_argument('-s', '--setup', type=str, default="default")
     parser.add_argument('-t', '--test', type=str, default="quicheperf")
     parser.add_argument('-l', '--duration', type=int, default=100)
+    parser.add_argument('-i', '--iterations', type=int, default=1)
     parser.add_argument('--disable-pcap', action='store_true', default=False)
     parser.add_argument('-d', '--debug', action='store_true', default=False)
     parser.add_argument('-c', '--cli', action='store_true', default=False)
@@ -203,6 +209,43 @@ def main():
     parser.add_argument('--throughput', type=str, default="1MB")
     parser.add_argument('--scenario', type=str)
     parser.add_argument('--real', action='store_true', default=False)
+    parser.add_argument('--output-dir', type=str, default=None)
+    parser.add_argument('--switch-prefix', type=str, default="")
+    parser.add_argument('--controller-port', type=int, default=None)
+    parser.add_argument('--overrides', type=str, default=None)
+    parser.add_argument('--postprocess-workers', type=int, default=2)
+    parser.add_argument('--compress-captures', type=str, choices=["gzip", "zstd", "none"], default="gzip")
+    parser.add_argument('--capture-tool', type=str, choices=["tshark", "dumpcap"], default="tshark")
+    parser.add_argument('--snaplen', type=int, default=0)
+    parser.add_argument('--nat-snaplen', type=int, default=0)
+    parser.add_argument('--capture-filter', type=str, default=None)
+    parser.add_argument('--node-snaplen', action='append', default=None, help="NODE=SNAPLEN")
+    parser.add_argument('--node-capture-filter', action='append', default=None, help="NODE=FILTER")
+    parser.add_argument('--ring-filesize', type=int, default=None)
+    parser.add_argument('--ring-files', type=int, default=None)
+    parser.add_argument('--counter-interval', type=float, default=None)
+    parser.add_argument('--impairment-trace', type=str, default=None)
+    parser.add_argument('--record-conntrack', action='store_true', default=False)
+    parser.add_argument('--pairs', type=int, default=1)
+    parser.add_argument('--paths', type=int, default=4)
+    parser.add_argument('--path-delay', action='append', type=int, default=None, help="Delay in ms per path, repeated for further paths")
+    parser.add_argument('--nat-path', action='append', type=int, default=None, help="Number of a path leading through a NAT")
+    parser.add_argument('--quicheperf-dir', type=str, default=None)
+    parser.add_argument('--catalog', type=str, default="mininet_measurements/catalog.sqlite")
+    parser.add_argument('--disable-catalog', action='store_true', default=False)
+    parser.add_argument('--artifact-store', type=str, default=None, help="e.g. mininet_measurements/.objects")
+    parser.add_argument('--trace', type=str, default=None, help="Chrome trace file of the test phases, e.g. trace.json")
+    parser.add_argument('--spec', type=str, default=None, help="JSON or YAML experiment spec, see spec.py")
+
+    return parser
+
+def main():
+    """
+    Starting the main function, parsing the command line and starting the relevant tests
+    """
+
+    # Parsing the command line
+    parser = create_argument_parser()
     args = parser.parse_args()
 
     if args.scenario is None:
@@ -218,12 +261,42 @@ def main():
             case _:
                 print(f"Incorrect scenario '{args.scenario}' given")
                 exit(1)
+
+    if args.spec is not None:
+        # The spec takes precedence over the flags, but not over the sweep
+        apply_spec(test_conf, load_spec(args.spec))
+
+    if args.overrides is not None:
+        # Used by the parameter sweep to set the values of a grid point
+        with open(args.overrides, "r") as overrides_file:
+            apply_overrides(test_conf, json.load(overrides_file))
+
+    if test_conf.compress_captures is not None:
+        # Failing now instead of in the post-processing of every run
+        check_method(test_conf.compress_captures)
                           
+    if test_conf.trace is not None:
+        # Each grid point of the sweep writes its own trace
+        if test_conf.output_directory is not None and not Path(test_conf.trace).is_absolute():
+            test_conf.trace = f"{Path(test_conf.output_directory).joinpath(test_conf.trace)}"
+        enable_tracing(test_conf.trace)
+
+    # Merging captures etc. in the background while the next test runs
+    postprocessor = PostProcessor(test_conf.postprocess_workers)
+
     net = create_test_scenario(test_conf)
-    start_test(net, test_conf)
+    start_test(net, test_conf, postprocessor)
 
     # Try to avoid halve closed networks or other problems
-    net.stop()
+    with span("net.stop"):
+        net.stop()
+
+    failed = postprocessor.shutdown()
+    if len(failed) > 0:
+        print(f"Post-processing failed for {failed}")
+
+    if test_conf.trace is not None:
+        write_trace()
 
     print("All tests completed...")
 
@@ -6,6 +6,11 @@
 from pathlib import Path
 from datetime import datetime
 
+from scheduler import sleep_until
+from topologies.link_index import get_link_index
+from conntrack import ConntrackPurger
+from tracing import traced
+
 import mininet.net as net
 import subprocess, select
 import os
@@ -13,7 +18,12 @@ import time
 import re
 import pwd
 import grp
+import shutil
+import tempfile
+import threading
+import json
 
+@traced
 def create_new_test_folder(path=None):
     """Creating a testfolder where all logfiles and pcap are stored in."""
 
@@ -48,6 +58,7 @@ def create_new_test_folder(path=None):
     
     return folder_name
 
+@traced
 def change_rights_test_folder(path):
     """Setting the rights of the test folder so that everyone can delete the folder."""
     
@@ -57,6 +68,7 @@ def change_rights_test_folder(path):
     # Change the file access write
     os.chmod(path, 0o777)
 
+@traced
 def capture_ssl(net, host, outpath=None, outfile=None):
     """Exporting the session SSL keys"""
 
@@ -74,6 +86,7 @@ def capture_ssl(net, host, outpath=None, outfile=None):
     outfile = Path(outpath).joinpath(outfile)
     os.environ["SSLKEYLOGFILE"] = f"{outfile}"
 
+@traced
 def capture_pcap(net, host, interfaces=None, outpath=None, outfile=None):
     """Capturing packets on the specified host. 
     Interfaces can be specified in a list of strings.: ["eth0", "eth1"]
@@ -105,13 +118,96 @@ def capture_pcap(net, host, interfaces=None, outpath=None, outfile=None):
 
     return host_pcap, outfile
 
+class OutputDrainer:
+    """
+    Streams the stdout and stderr of a running process into its logfile
+    while the process is running. Both pipes are read in background threads
+    in fixed size chunks, so the pipes never fill up and block the process
+    and the output is never held in memory.
+
+    The 'live' stream (stderr by default, where the env_logger of quicheperf
+    writes to) is written directly to the logfile and can be followed during
+    the test. The other stream is spooled to a temporary file and appended
+    after the separator once the process ended.
+    """
+
+    def __init__(self, process, outfile, live="stderr", chunk_size=65536):
+        self.process = process
+        self.outfile = outfile
+        self.chunk_size = chunk_size
+        self._live_file = open(outfile, "wb")
+        self._spool_file = tempfile.TemporaryFile()
+
+        if live == "stderr":
+            pipes = [(process.stderr, self._live_file), (process.stdout, self._spool_file)]
+        else:
+            pipes = [(process.stdout, self._live_file), (process.stderr, self._spool_file)]
+
+        self._threads = []
+        for pipe, target in pipes:
+            if pipe is None:
+                continue
+            thread = threading.Thread(target=self._drain, args=(pipe, target), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _drain(self, pipe, target):
+        """
+        Copying the pipe into the target file until the process closes it
+        """
+
+        fd = pipe.fileno()
+        while True:
+            chunk = os.read(fd, self.chunk_size)
+            if not chunk:
+                break
+            target.write(chunk)
+            target.flush()
+        pipe.close()
+
+    def close(self, timeout=10):
+        """
+        Waiting until both pipes are drained, appending the spooled stream
+        to the logfile and closing all files. The process must have ended before.
+        """
+
+        for thread in self._threads:
+            thread.join(timeout)
+
+        self._live_file.write(b"\n---------------------\n\n")
+        self._spool_file.seek(0)
+        shutil.copyfileobj(self._spool_file, self._live_file, self.chunk_size)
+        self._spool_file.close()
+        self._live_file.close()
+
+# The drainers of all running processes, closed by 'terminate'
+_drainers = {}
+
+def stream_output(process, outfile, live="stderr"):
+    """
+    Starting to stream the output of the process into the outfile.
+    The process must have been started with stdout and/or stderr as pipes.
+    Returns the process
+    """
+
+    _drainers[process] = OutputDrainer(process, outfile, live)
+    return process
+
+@traced
 def terminate(process, outfile=None, file_perm=None, terminate=True, overwrite=False):
     """Ending the running 'pcap capturing' process"""
 
     if terminate:
         process.terminate()
 
-    if outfile is not None:
+    drainer = _drainers.pop(process, None)
+    if drainer is not None:
+        # The output was already written while running, only flushing
+        process.wait()
+        drainer.close()
+        os.chmod(drainer.outfile, 0o666)
+        print("Wrote logfile to: '{}'".format(drainer.outfile))
+    elif outfile is not None:
         text, err = process.communicate()
         if overwrite:
             with open(outfile, "w") as proc_out:
@@ -132,6 +228,7 @@ def terminate(process, outfile=None, file_perm=None, terminate=True, overwrite=F
         os.chmod(file_perm, 0o666)
 
 
+@traced
 def stop_path(net, host, switch):
     """Disabling the routing / traffic via the given path"""
 
@@ -139,6 +236,7 @@ def stop_path(net, host, switch):
     net.configLinkStatus(host, switch, 'down')
     # net.cmd(f"link {host} {switch} down")
 
+@traced
 def start_path(net, host, switch):
     """Enabling the routing / traffic via the given path"""
 
@@ -146,38 +244,105 @@ def start_path(net, host, switch):
     net.configLinkStatus(host, switch, 'up')
     # net.cmd(f"link {host} {switch} up")
 
+@traced
 def path_loss(net, host, iface, loss=100):
     """Applying the given loss rate to the given interface on the host specified"""
 
-    # Get all links in the network
-    links = net.links
-    # Filter the correct link
-    for link in links:
-        # Every link has two interfaces, intf1 and intf2
-        if iface in f"{link.intf1}":
-            # print("Found link: {}: {}".format(link, link.intf1))
-            # Doesn't make a difference if we apply loss to the
-            # first or second interface
-            if loss > 0:
-                link.intf1.config(loss=loss)
-            else:
-                h = net.get(host)
-                h.cmd("tc qdisc change dev {} root netem loss {}%".format(iface, loss))
-            print("Set loss of link {} to {}%".format(link, loss))
-        elif iface in f"{link.intf2}":
-            if loss > 0:
-                link.intf2.config(loss=loss)
-            else:
-                h = net.get(host)
-                h.cmd("tc qdisc change dev {} root netem loss {}%".format(iface, loss))
-
-            print("Set loss of link {} to {}%".format(link, loss))
-
-    # h = net.get(host)
-    # cmd = "tc qdisc add dev {} root netem loss {}%".format(iface, loss)
-    # print("Executing: {}% loss on link {}<->{}".format(loss, host, iface))
-    # h.cmd(cmd)
+    apply_impairments(net, {iface: {"loss": loss}})
+
+def impairment_qdisc(entry):
+    """
+    Creating the tc arguments (without 'tc') for the interface with the full
+    netem configuration: the creation parameters of the link overwritten
+    by the currently applied impairments. Also used in 'tc -batch' mode
+    """
+
+    params = {
+        "delay": entry.intf.params.get("delay"),
+        "jitter": entry.intf.params.get("jitter"),
+        "loss": entry.intf.params.get("loss"),
+        "rate": None,
+    }
+    params.update(entry.current)
+
+    options = netem_options(params["delay"], params["jitter"], params["loss"], params["rate"])
+    if options == "":
+        return f"qdisc del dev {entry.intf} root"
+    # Matches the qdisc as created by the TCLink
+    return f"qdisc replace dev {entry.intf} root handle 10: netem {options}"
+
+def _impairment_cmd(entry):
+    """
+    Creating the shell command applying the impairments of the interface
+    """
+
+    qdisc = impairment_qdisc(entry)
+    if qdisc.startswith("qdisc del"):
+        # Fails if the link had no qdisc before
+        return f"tc {qdisc} 2> /dev/null"
+    return f"tc {qdisc}"
 
+@traced
+def apply_impairments(net, impairments, directory=None):
+    """
+    Applying impairments to several links at the same moment.
+    Expecting a dictionary of the exact interface name to the changed
+    netem parameters (delay, jitter, loss, rate), e.g.
+    {"nat3-local": {"loss": 100}, "nat3-ext": {"loss": 100}}.
+    Parameters not given keep their current value, so the delay of a link
+    is kept when only the loss is changed.
+
+    All changes of a node are executed in a single shell command and all
+    nodes are changed in parallel. Returns the time (epoch) each change took
+    effect per interface and appends them to 'impairments.log' if a
+    directory is given.
+    When scheduled, all involved nodes must not execute other actions at
+    the same time.
+    """
+
+    index = get_link_index(net)
+
+    per_node = {}
+    for iface, params in impairments.items():
+        if iface not in index:
+            raise ValueError(f"Unknown interface '{iface}'")
+        entry = index[iface]
+        entry.current.update(params)
+        per_node.setdefault(entry.node, []).append(entry)
+
+    applied = {}
+    if len(per_node) == 0:
+        return applied
+
+    # All threads start their command at the same time
+    barrier = threading.Barrier(len(per_node))
+
+    def _apply(node, entries):
+        cmd = " ; ".join(_impairment_cmd(entry) for entry in entries)
+        barrier.wait()
+        node.cmd(cmd)
+        now = time.time()
+        for entry in entries:
+            applied[entry.intf.name] = now
+
+    threads = [threading.Thread(target=_apply, args=(node, entries)) for node, entries in per_node.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for iface, params in impairments.items():
+        print(f"Set {params} on {iface} (link {index[iface].link})")
+
+    if directory is not None:
+        with open(Path(directory).joinpath("impairments.log"), "a") as logfile:
+            for iface, params in impairments.items():
+                options = " ".join(f"{key}={value}" for key, value in params.items())
+                logfile.write(f"{applied[iface]:.6f},{index[iface].node},{iface},{options}\n")
+
+    return applied
+
+@traced
 def set_conntrack_timeout(net, host, timeout):
     """
     Allowing to set the timeout in seconds after which connections will be forgotten and
@@ -189,6 +354,7 @@ def set_conntrack_timeout(net, host, timeout):
     # Defaults to 120 for stream (established), 30s not established
     h.cmd("sysctl -w net.netfilter.nf_conntrack_udp_timeout_stream={}".format(timeout))
 
+@traced
 def remove_conntrack_entry(net, host, filter):
     """
     Removing conntrack entries that match the given filter
@@ -203,6 +369,7 @@ def parse_ip(cmd_output):
     ipv4_addresses = re.findall(r'inet (\d+\.\d+\.\d+\.\d+/\d+)', cmd_output)
     return ipv4_addresses
 
+@traced
 def store_routes_for_interface(net, host, dir):
     """
     Storing all routes for a given interface which might get lost during the
@@ -213,6 +380,7 @@ def store_routes_for_interface(net, host, dir):
     h = net.get(host)
     h.cmd(f"ip route save > {dir}/{host}-ip-routes.log")
 
+@traced
 def restore_routes_for_interface(net, host, dir):
     """
     Expecting a dictionary of (host,iface):routes()
@@ -227,6 +395,7 @@ def restore_routes_for_interface(net, host, dir):
         os.remove(router_storage)
 
 
+@traced
 def iface_down(net, host, iface, directory, ip_storage=None):
     """Disabling the specified interface on the given host.
     Also removes the IP from the interface and stores it in dictionary
@@ -241,14 +410,15 @@ def iface_down(net, host, iface, directory, ip_storage=None):
     h.cmd(f"ip addr flush dev {iface}")
     
     if ip_storage is None:
-        ip_storage = {(host, iface): list()}
+        ip_storage = {}
         
     for ip in ips:
-        ip_storage[(host,iface)].append(ip)
+        ip_storage.setdefault((host, iface), list()).append(ip)
 
     # print(ip_storage)
     return ip_storage
 
+@traced
 def iface_up(net, host, iface, directory, ip_storage=None):
     """Enabling the specified interface on the given host"""
 
@@ -257,7 +427,7 @@ def iface_up(net, host, iface, directory, ip_storage=None):
     h.cmd(f"ip link set dev {iface} up")
     
     if ip_storage is not None:
-        ips = ip_storage[(host, iface)]
+        ips = ip_storage.get((host, iface), list())
         for ip in ips:
             # print(f"Executing: ip addr add {ip} dev {iface}")
             h.cmd(f"ip addr add {ip} dev {iface}")
@@ -268,6 +438,7 @@ def iface_up(net, host, iface, directory, ip_storage=None):
 
     return ip_storage
 
+@traced
 def set_default_route(net, host, gateway, iface):
     """Setting the default route of a host via a specific gateway."""
 
@@ -293,12 +464,15 @@ def write_new_ice_cand_file(local_addr):
     with open("mininet/ice_addrs.txt", "w") as addr_file:
         addr_file.write(local_addr + "\n")
         
+@traced
 def wait(sleep=5):
-    """Pausing the executing thread for *time* seconds"""
+    """Pausing the executing thread for *time* seconds.
+    Raises RunAborted if the run is aborted while waiting"""
     
     print(f"Waiting for {sleep}s...")
-    time.sleep(sleep)
+    sleep_until(time.monotonic() + sleep)
     
+@traced
 def print_nat_table(net, host, outpath=None, outfile=None):
     """Printing the current state of connection tracking"""
     
@@ -323,39 +497,229 @@ def print_nat_table(net, host, outpath=None, outfile=None):
         
     print(f"Wrote NAT table state of host {host} to '{outfile}'")
     
+@traced
 def print_routing_table(net, directory):
     """
     Printing the routing current routing table of all hosts in the network.
     """
     
     with open(f"{directory}/routing-tables.log", "w") as logfile:
-        for host in net.values():
-            found = re.search("^(s|c)[0-9]+", f"{host}")
-            if found is None:
-                output = host.cmd("route")
-                logfile.write(f"Host: {host}\n")
-                logfile.write(output)
-                logfile.write("------------------\n")
+        for host in net.hosts:
+            output = host.cmd("route")
+            logfile.write(f"Host: {host}\n")
+            logfile.write(output)
+            logfile.write("------------------\n")
 
 
-def delete_ext_conntrack_entry(net, host, ext, itn, repetition=0.1):
+def netem_options(delay=None, jitter=None, loss=None, rate=None):
     """
-    Executing a task in a loop which scans and deletes all external
-    NAT table entries to enable connections on the internet path.
+    Creating the options of a 'tc qdisc ... netem' command for the given
+    impairments. Delay and jitter are given as strings ("10ms"), the loss
+    in percent and the rate as string ("10mbit").
     """
-    
+
+    options = ""
+    if delay is not None:
+        options += f" delay {delay}"
+        if jitter is not None:
+            options += f" {jitter}"
+    if loss is not None:
+        options += f" loss {loss}%"
+    if rate is not None:
+        options += f" rate {rate}"
+
+    return options.strip()
+
+# Root qdiscs of an interface without any configuration
+_default_qdiscs = ["noqueue", "pfifo_fast", "fq_codel", "mq", "noop"]
+
+def _snapshot_interfaces(node, intfs):
+    """
+    Reading the addresses ('ip -j addr') and qdiscs ('tc qdisc') of the
+    given interfaces of the node.
+    Returns a dictionary of the interface name to its 'addresses' (list of
+    'ip addr add' arguments) and its 'qdiscs' (list of 'tc qdisc show' lines)
+    """
+
+    names = [f"{intf}" for intf in intfs]
+    snapshot = {name: {"addresses": [], "qdiscs": []} for name in names}
+
+    for link in json.loads(node.cmd("ip -j addr show").strip() or "[]"):
+        if link.get("ifname") not in snapshot:
+            continue
+        for info in link.get("addr_info", []):
+            if info.get("family") != "inet":
+                continue
+            address = f"{info['local']}/{info['prefixlen']}"
+            if "broadcast" in info:
+                address += f" brd {info['broadcast']}"
+            snapshot[link["ifname"]]["addresses"].append(address)
+
+    # 'qdisc <kind> <handle> dev <interface> root|parent ...'
+    for line in node.cmd("tc qdisc show").splitlines():
+        fields = line.split()
+        if len(fields) > 4 and fields[3] == "dev" and fields[4] in snapshot:
+            snapshot[fields[4]]["qdiscs"].append(line.strip())
+
+    return snapshot
+
+def _restore_qdisc_cmds(intf, qdiscs):
+    """
+    Creating the shell commands to restore the root qdisc of the interface
+    from its snapshot. A netem root (as created by the TCLink) is replaced
+    with its options at the time of the snapshot, a default root removes
+    the qdisc. Returns None for other qdiscs (e.g. htb for a bandwidth),
+    which cannot be recreated from the 'tc qdisc' output alone
+    """
+
+    roots = [line.split() for line in qdiscs if " root " in f"{line} "]
+    if len(roots) == 0:
+        return [f"tc qdisc del dev {intf} root 2> /dev/null"]
+
+    fields = roots[0]
+    kind, handle = fields[1], fields[2]
+    if kind == "netem":
+        options = fields[fields.index("root") + 1:]
+        if len(options) > 1 and options[0] == "refcnt":
+            options = options[2:]
+        return [f"tc qdisc replace dev {intf} root handle {handle} netem {' '.join(options)}"]
+    if kind in _default_qdiscs:
+        return [f"tc qdisc del dev {intf} root 2> /dev/null"]
+    return None
+
+def _reset_interface_cmds(intf, snapshot):
+    """
+    Creating the shell commands to restore the state, addresses and root
+    qdisc of an interface to the snapshot.
+    Returns the commands and if the qdiscs must be reconfigured by the link
+    """
+
+    cmds = [f"ip link set dev {intf} up"]
+
+    # Only IPv4, the IPv6 link-local addresses are kept
+    cmds.append(f"ip -4 addr flush dev {intf}")
+    for address in snapshot["addresses"]:
+        cmds.append(f"ip addr add {address} dev {intf}")
+
+    qdisc_cmds = _restore_qdisc_cmds(intf, snapshot["qdiscs"])
+    if qdisc_cmds is None:
+        return cmds, True
+    return cmds + qdisc_cmds, False
+
+@traced
+def snapshot_network_state(net, directory=None):
+    """
+    Storing the dynamic state of a started network which is modified during
+    a test: routes per host, the conntrack timeouts of the NATs and the
+    addresses and qdiscs of all interfaces.
+    Returns the state, required by reset_network_state.
+    """
+
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="mininet_state_")
+
+    state = {"directory": directory, "conntrack_timeouts": {}, "interfaces": {}}
+    for host in net.hosts:
+        host.cmd(f"ip route save > {directory}/{host}-routes.bin")
+        if f"{host}".startswith("nat"):
+            timeout = host.cmd("sysctl -n net.netfilter.nf_conntrack_udp_timeout_stream").strip()
+            state["conntrack_timeouts"][f"{host}"] = timeout
+        state["interfaces"][f"{host}"] = _snapshot_interfaces(host, _reset_interfaces(host))
+
+    for switch in net.switches:
+        state["interfaces"][f"{switch}"] = _snapshot_interfaces(switch, _reset_interfaces(switch))
+
+    return state
+
+def _reset_interfaces(node):
+    """
+    Returning the interfaces of the node which are reset between runs
+    """
+
+    return [intf for intf in node.intfList() if f"{intf}" != "lo" and intf.link is not None]
+
+@traced
+def reset_network_state(net, state):
+    """
+    Resetting the dynamic state of the network to the given snapshot.
+    Flushes the conntrack tables, restores interface addresses, qdiscs
+    and routes. A single shell command per node is executed, only links
+    with qdiscs beyond netem (e.g. a bandwidth) are configured again
+    by their interface.
+    """
+
+    start = time.monotonic()
+    directory = state["directory"]
+
+    for node in net.hosts + net.switches:
+        snapshot = state["interfaces"].get(f"{node}", {})
+        is_host = node in net.hosts
+        cmds = []
+        if is_host:
+            cmds.append("conntrack -F 2> /dev/null")
+            timeout = state["conntrack_timeouts"].get(f"{node}")
+            if timeout is not None and timeout != "":
+                cmds.append(f"sysctl -q -w net.netfilter.nf_conntrack_udp_timeout_stream={timeout}")
+        for intf in _reset_interfaces(node):
+            if f"{intf}" not in snapshot:
+                continue
+            intf_cmds, reconfigure = _reset_interface_cmds(intf, snapshot[f"{intf}"])
+            if reconfigure:
+                # Recreating the qdiscs the same way as the link did
+                intf.config(**intf.params)
+            cmds += intf_cmds
+        if is_host:
+            # The routes must be restored after the addresses are set again
+            cmds.append("ip route flush table main")
+            cmds.append(f"ip route restore < {directory}/{node}-routes.bin")
+        if len(cmds) > 0:
+            node.cmd(" ; ".join(cmds))
+
+    # All links are back to their creation parameters
+    get_link_index(net).reset()
+
+    print(f"Reset network state in {time.monotonic() - start:.2f}s")
+
+@traced
+def discard_network_state(state):
+    """
+    Removing the stored network state
+    """
+
+    shutil.rmtree(state["directory"], ignore_errors=True)
+
+@traced
+def delete_ext_conntrack_entry(net, host, ext, itn, grace=0):
+    """
+    Deleting all UNREPLIED UDP NAT table entries from the external
+    and internal address as soon as they are created (and those existing
+    already), to enable connections on the internet path.
+    A reply within the grace period (seconds) keeps the entry, so
+    correct connections that are still being built are not deleted.
+    Returns the running purger, which must be stopped with 'stop()'
+    """
+
     h = net.get(host)
-    
-    while True:
-        # This might help, but we still have the problem that then internal connection
-        # is mapped to the incorrect external port and will eventually fail, therefore
-        # this mapping must be deleted as well
-        h.cmd(f"conntrack --delete --orig-src {ext} --proto udp --status UNREPLIED")
-        # This will also delete correct connection that are trying to build
-        # so we need a more clever method here
-        h.cmd(f"conntrack --delete --orig-src {itn} --proto udp --status UNREPLIED")
-        time.sleep(repetition)
+    return ConntrackPurger(h, [ext, itn], grace=grace).start()
+
+def capture_files(directory, node):
+    """
+    Returning all capture files of the node in the test directory.
+    Either the single '<node>.pcap' or the files of the ring buffer
+    named '<node>_<number>_<timestamp>.pcap' in the order they were written.
+    Compressed captures ('.pcap.gz', '.pcap.zst') are found as well
+    """
+
+    suffix = r"\.pcap(\.gz|\.zst)?"
+    single = re.compile(rf"^{re.escape(node)}{suffix}$")
+    singles = [f for f in Path(directory).glob(f"{node}.pcap*") if single.match(f.name)]
+    if len(singles) > 0:
+        return singles[:1]
 
+    ring = re.compile(rf"^{re.escape(node)}_\d+_\d+{suffix}$")
+    return sorted(f for f in Path(directory).glob(f"{node}_*.pcap*") if ring.match(f.name))
+
+@traced
 def combineHostPcaps(directory):
     """
     Expecting the test directory.
@@ -364,21 +728,29 @@ def combineHostPcaps(directory):
     """
 
     outfile = f"{directory}/h1_h2_combined.pcapng"
-    subprocess.run(f"mergecap -w {outfile} {directory}/h1.pcap {directory}/h2.pcap", shell=True)
+    infiles = " ".join(f"{f}" for f in capture_files(directory, "h1") + capture_files(directory, "h2"))
+    # Merging into a temporary file first, so the combined file is never half-written
+    tmpfile = f"{directory}/.h1_h2_combined.pcapng.tmp"
+    subprocess.run(f"mergecap -w {tmpfile} {infiles}", shell=True, check=True)
+    os.replace(tmpfile, outfile)
     return outfile
 
+@traced
 def injectSSLKeysPcap(filename, keyfile, outfile=None):
     """
     Injecting the ssl keylog into the pcap file for easier decryption afterwards
+    Without an outfile the given file is replaced atomically
     """
 
+    rename = False
     if outfile is None:
         path = os.path.dirname(filename)
-        outfile = os.path.join(path, "tmp.pcap")
+        outfile = os.path.join(path, f".{os.path.basename(filename)}.tmp")
         rename = True
 
-    subprocess.run(f"editcap --inject-secrets tls,{keyfile} {filename} {outfile}", shell=True)
+    subprocess.run(f"editcap --inject-secrets tls,{keyfile} {filename} {outfile}", shell=True, check=True)
 
     if rename:
-        os.remove(filename)
-        os.rename(outfile, filename)
\ No newline at end of file
+        os.replace(outfile, filename)
+
+    return filename
\ No newline at end of file
@@ -0,0 +1,124 @@
+# This file contains the background post-processing of finished test runs.
+#
+# Merging the captures and injecting the TLS keys only needs the files of
+# a run, not the network. Instead of blocking the next run, these steps are
+# queued and executed by a limited number of workers while the next test
+# is already running.
+#
+# Every step writes its result into a temporary file which is renamed once
+# complete, and the run folder is marked with 'postprocess.complete' after
+# all steps succeeded. Analysis scripts should only pick up runs with this
+# marker.
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tracing import span
+
+import os
+import time
+
+# Written into the run folder after all post-processing steps succeeded
+COMPLETE_MARKER = "postprocess.complete"
+
+def mark_complete(directory, content=""):
+    """
+    Atomically creating the marker file in the given directory
+    """
+
+    marker = Path(directory).joinpath(COMPLETE_MARKER)
+    tmp = marker.with_name(f".{COMPLETE_MARKER}.tmp")
+    with open(tmp, "w") as outfile:
+        outfile.write(content)
+    os.replace(tmp, marker)
+
+def is_complete(directory):
+    """
+    Checking whether the post-processing of the run folder has finished
+    """
+
+    return Path(directory).joinpath(COMPLETE_MARKER).exists()
+
+class PostProcessor:
+    """
+    Queue for the post-processing steps of test runs.
+    The steps of a single run are executed in their given order by one worker,
+    multiple runs are processed at the same time by at most 'workers' workers.
+    With zero workers all steps are executed directly in the calling thread.
+
+    Usage:
+        postprocessor = PostProcessor(workers=2)
+        postprocessor.submit(test_dir, [(combineHostPcaps, (test_dir,), {})])
+        ...
+        postprocessor.shutdown()
+    """
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.jobs = {}
+        self._executor = None
+        if workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="postprocess")
+
+    def _run(self, directory, steps):
+        """
+        Executing all steps of a run one after another and marking the
+        run folder as complete. Stops at the first failing step
+        """
+
+        start = time.monotonic()
+        result = None
+        for function, args, kwargs in steps:
+            try:
+                with span(function.__name__, "postprocess", directory=directory):
+                    result = function(*args, **kwargs)
+            except Exception as e:
+                print(f"Post-processing of '{directory}' failed in '{function.__name__}': {e}")
+                return False
+
+        duration = time.monotonic() - start
+        mark_complete(directory, f"{duration:.3f}\n")
+        print(f"Post-processing of '{directory}' completed after {duration:.1f}s")
+        return result
+
+    def submit(self, directory, steps):
+        """
+        Queueing the steps for the given run folder. Expecting a list of
+        tuples (function, args, kwargs). Returns the future of the job,
+        or the result if executed directly
+        """
+
+        if self._executor is None:
+            return self._run(directory, steps)
+
+        job = self._executor.submit(self._run, directory, steps)
+        self.jobs[f"{directory}"] = job
+        return job
+
+    def wait(self):
+        """
+        Waiting until all queued jobs are finished.
+        Returns the folders for which the post-processing failed
+        """
+
+        failed = []
+        for directory, job in self.jobs.items():
+            if job.result() is False:
+                failed.append(directory)
+        self.jobs = {}
+
+        return failed
+
+    def shutdown(self):
+        """
+        Waiting for all jobs and stopping the workers
+        """
+
+        pending = len([job for job in self.jobs.values() if not job.done()])
+        if pending > 0:
+            print(f"Waiting for the post-processing of {pending} runs...")
+        failed = self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+        return failed
@@ -0,0 +1,214 @@
+# This file contains the scheduler for the actions performed during a test.
+#
+# Instead of chaining wait() calls, where every action adds its own
+# execution time to all following actions, every action is given by its
+# absolute offset in seconds from the start of the test. Actions are fired
+# on the monotonic clock, so delays of earlier actions do not shift later ones.
+#
+# Actions on different nodes run concurrently. Actions on the same node are
+# executed in their given order, because the shell of a Mininet node can only
+# execute a single command at a time.
+#
+# Usage:
+#   schedule = Schedule(directory)
+#   schedule.at(7, path_loss, net, "nat3", "nat3-local", loss=100, node="nat3")
+#   schedule.at(12, iface_down, net, "h1", "h1-wifi", directory, node="h1")
+#   schedule.run(end=30)
+#
+# An action can additionally wait on a readiness gate (see gates.py). It is then
+# fired as soon as the gate opened, but not before its offset and not later
+# than its offset plus the gate timeout.
+
+from pathlib import Path
+from queue import Queue
+
+import threading
+import time
+
+# Below this remaining time we stop sleeping and spin until the deadline
+_spin_threshold = 0.002
+
+# Set if the current run has to be aborted, e.g. because a process crashed
+_abort = threading.Event()
+_abort_reason = None
+
+class RunAborted(Exception):
+    """
+    Raised by all waits of a test once the run was aborted
+    """
+
+def abort_run(reason):
+    """
+    Aborting the current run. All running and future waits raise RunAborted
+    """
+
+    global _abort_reason
+    if not _abort.is_set():
+        _abort_reason = reason
+        print(f"Aborting the run: {reason}")
+    _abort.set()
+
+def reset_abort():
+    """
+    Allowing waits again, required before the next run starts
+    """
+
+    global _abort_reason
+    _abort_reason = None
+    _abort.clear()
+
+def check_aborted():
+    """
+    Raising RunAborted if the run was aborted
+    """
+
+    if _abort.is_set():
+        raise RunAborted(_abort_reason)
+
+def sleep_until(deadline):
+    """
+    Sleeping until the given deadline on the monotonic clock.
+    Sleeps coarse first and spins for the last milliseconds.
+    Raises RunAborted as soon as the run is aborted.
+    """
+
+    while True:
+        check_aborted()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if remaining > _spin_threshold:
+            _abort.wait(remaining - _spin_threshold / 2)
+
+class ScheduledAction:
+    """
+    A single action of the schedule together with the intended
+    and the actual times it was executed.
+    All times are in seconds relative to the start of the schedule
+    """
+
+    def __init__(self, offset, function, args, kwargs, node=None, name=None, gate=None, gate_timeout=0):
+        self.offset = offset
+        self.gate = gate
+        self.gate_timeout = gate_timeout
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.node = node
+        self.name = name if name is not None else function.__name__
+        self.dispatched = None
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+class Schedule:
+    """
+    Executes actions at absolute offsets from the start of a test
+    and logs the intended and actual firing times of each action
+    """
+
+    def __init__(self, directory=None, logfile="schedule.log"):
+        self.directory = directory
+        self.logfile = logfile
+        self.actions = []
+        self.start = None
+        # Wall clock time of the start, allows to relate actions to log lines
+        self.start_epoch = None
+
+    def at(self, offset, function, *args, node=None, name=None, gate=None, gate_timeout=0, **kwargs):
+        """
+        Adding the function call to the schedule at offset seconds after the start.
+        Actions with the same node are executed one after another in the
+        order they were added.
+        If a gate is given, the action is delayed until the gate opened
+        for at most gate_timeout seconds.
+        """
+
+        action = ScheduledAction(offset, function, args, kwargs, node, name, gate, gate_timeout)
+        self.actions.append(action)
+        return action
+
+    def _worker(self, queue):
+        """
+        Executing the actions of a single node in order
+        """
+
+        while True:
+            action = queue.get()
+            if action is None:
+                return
+            action.started = time.monotonic() - self.start
+            try:
+                action.result = action.function(*action.args, **action.kwargs)
+            except Exception as e:
+                action.error = e
+                print(f"Scheduled action '{action.name}' failed: {e}")
+            action.finished = time.monotonic() - self.start
+
+    def run(self, start=None, end=None):
+        """
+        Running all actions of the schedule. The offsets are relative to the given
+        start on the monotonic clock, by default the current time.
+        If end is given, returns not before end seconds after the start.
+        """
+
+        self.start = start if start is not None else time.monotonic()
+        self.start_epoch = time.time() - (time.monotonic() - self.start)
+
+        queues = {}
+        workers = []
+        try:
+            # Sorting is stable, actions at the same offset keep their order
+            for action in sorted(self.actions, key=lambda a: a.offset):
+                if action.node not in queues:
+                    queues[action.node] = Queue()
+                    worker = threading.Thread(target=self._worker, args=(queues[action.node],), daemon=True)
+                    worker.start()
+                    workers.append(worker)
+                sleep_until(self.start + action.offset)
+                if action.gate is not None:
+                    remaining = self.start + action.offset + action.gate_timeout - time.monotonic()
+                    action.gate.wait(max(remaining, 0))
+                action.dispatched = time.monotonic() - self.start
+                queues[action.node].put(action)
+
+            for queue in queues.values():
+                queue.put(None)
+            for worker in workers:
+                worker.join()
+
+            if end is not None:
+                sleep_until(self.start + end)
+        finally:
+            # Stop the workers in case the run was aborted
+            for queue in queues.values():
+                queue.put(None)
+            self.write_log()
+
+        return self.actions
+
+    def write_log(self):
+        """
+        Writing the intended and actual times of all actions as csv into
+        the directory of the schedule
+        """
+
+        lines = ["action,node,intended,dispatched,started,finished,delay_ms,epoch"]
+        for action in self.actions:
+            if action.started is None:
+                continue
+            delay = (action.started - action.offset) * 1000
+            # Actions still running when the run was aborted did not finish
+            dispatched = f"{action.dispatched:.6f}" if action.dispatched is not None else ""
+            finished = f"{action.finished:.6f}" if action.finished is not None else ""
+            lines.append(f"{action.name},{action.node},{action.offset:.6f},{dispatched},{action.started:.6f},{finished},{delay:.3f},{self.start_epoch + action.started:.6f}")
+            print(f"Action '{action.name}' on {action.node}: intended {action.offset:.3f}s, started {action.started:.3f}s ({delay:+.1f}ms)")
+
+        if self.directory is None:
+            return
+
+        outfile = Path(self.directory).joinpath(self.logfile)
+        with open(outfile, "w") as log:
+            log.write("\n".join(lines) + "\n")
+        print(f"Wrote schedule to '{outfile}'")
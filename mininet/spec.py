@@ -0,0 +1,362 @@
+# This file contains the declarative experiment specification.
+#
+# Instead of command line flags and predefined scenario functions, an
+# experiment can be described by a JSON (or YAML, if PyYAML is installed)
+# file. The file is grouped into sections, each holding fields of the
+# TestConfiguration (or the CapturePolicy for 'capture'). Missing fields
+# keep the value of the command line:
+#
+# {
+#     "name": "NAT timing with lossy Ethernet",
+#     "topology": {"scenario": "FULL_NETWORK", "enable_snat": true},
+#     "delays": {"internet_path_local_delay": 35, "wifi_direct_path_delay": 3},
+#     "test": {"test": "TIMELINE", "duration": 46, "throughput": "1MB"},
+#     "measurement": {"counter_interval": 0.01},
+#     "capture": {"nat_snaplen": 96},
+#     "binary": {"build_target": "release"},
+#     "timeline": [
+#         {"at": 5, "action": "impairments", "node": "nat3",
+#          "args": {"impairments": {"nat3-local": {"loss": 100}}},
+#          "gate": {"log": "h1.log", "pattern": "NominatedPair", "count": 2, "timeout": 2}},
+#         {"at": 26, "action": "nat_table", "args": {"host": "nat3"}}
+#     ]
+# }
+#
+# Every run resolves the final configuration (after the command line, the
+# spec file and the sweep overrides) into a normalized spec with all values
+# set, and writes it as 'spec.json' into the run folder. The id of an
+# experiment is the SHA-256 of the normalized spec, so identical experiments
+# get the same id no matter how they were configured. The name and the run
+# specific values (output folder, switch prefix, controller port and the
+# post-processing workers) are not part of the id.
+
+from dataclasses import fields, asdict
+from enum import Enum
+from pathlib import Path
+
+from config import TestConfiguration, CapturePolicy, Tests, apply_overrides
+
+import argparse
+import copy
+import hashlib
+import json
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+SPEC_FILE = "spec.json"
+
+# Fields of the TestConfiguration per section of the spec
+SPEC_SECTIONS = {
+    "topology": [
+        "scenario",
+        "host_pairs",
+        "multi_paths",
+        "multi_path_delays",
+        "multi_path_nat",
+        "enable_turn_server",
+        "block_stun_on_first_path",
+        "enable_snat",
+    ],
+    "delays": [
+        "wifi_direct_path_delay",
+        "local_network_path_delay",
+        "local_network_path_ext_delay",
+        "internet_path_local_delay",
+        "internet_path_local_2_delay",
+        "internet_path_ext_delay",
+        "internet_path_ext_2_delay",
+        "internet_path_turn_delay",
+    ],
+    "test": [
+        "test",
+        "duration",
+        "throughput",
+        "iterations",
+        "log_level",
+        "log_sslkeys",
+    ],
+    "measurement": [
+        "enable_pcap",
+        "combine_pcaps",
+        "counter_interval",
+        "impairment_trace",
+        "record_conntrack",
+    ],
+    "binary": [
+        "quicheperf_dir",
+        "build_target",
+    ],
+}
+
+# Fields which may be null in the spec, all others require a value.
+# The required 'scenario' and 'test' are never null
+NULLABLE_FIELDS = [
+    "multi_path_delays",
+    "multi_path_nat",
+    "counter_interval",
+    "impairment_trace",
+    "quicheperf_dir",
+]
+
+# Fields of the capture policy which may be null
+NULLABLE_CAPTURE_FIELDS = [
+    "bpf_filter",
+    "ring_filesize",
+    "ring_files",
+]
+
+# Keys not describing the experiment itself
+DESCRIPTIVE_KEYS = ["name", "description"]
+
+# The timeline actions and their required arguments, executed by the
+# 'timeline' test (see testing.py)
+TIMELINE_ACTIONS = {
+    "impairments": ["impairments"],
+    "iface_down": ["host", "iface"],
+    "iface_up": ["host", "iface"],
+    "nat_table": ["host"],
+    "remove_conntrack": ["host", "filter"],
+    "conntrack_timeout": ["host", "timeout"],
+}
+
+def load_spec(spec_file):
+    """
+    Reading the spec from the given JSON or YAML file.
+    Raises a ValueError if YAML is given but PyYAML is not installed
+    """
+
+    with open(spec_file, "r") as infile:
+        if Path(spec_file).suffix in [".yaml", ".yml"]:
+            if yaml is None:
+                raise ValueError(f"Reading '{spec_file}' requires PyYAML, please install it or use JSON")
+            spec = yaml.safe_load(infile)
+        else:
+            spec = json.load(infile)
+
+    if not isinstance(spec, dict):
+        raise ValueError(f"'{spec_file}' does not contain a spec object")
+    return spec
+
+def _check_value(path, value, expected, nullable):
+    """
+    Checking that the value matches the annotated type of its field.
+    Returns the value converted to the type where this is lossless
+    """
+
+    if value is None:
+        if not nullable:
+            raise ValueError(f"{path}: must not be empty")
+        return None
+
+    if isinstance(expected, type) and issubclass(expected, Enum):
+        if isinstance(value, expected):
+            return value
+        if not isinstance(value, str) or value not in expected.__members__:
+            raise ValueError(f"{path}: expected one of {list(expected.__members__)}, got '{value}'")
+        return expected[value]
+
+    # bool is a subclass of int but never a valid number here
+    if expected is float and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if expected is int and isinstance(value, bool):
+        raise ValueError(f"{path}: expected int, got bool")
+    if not isinstance(value, expected):
+        raise ValueError(f"{path}: expected {expected.__name__}, got {type(value).__name__}")
+    return value
+
+def _field_types(cls):
+    return {f.name: f.type for f in fields(cls)}
+
+def _validate_timeline(timeline):
+    """
+    Checking the actions of the timeline and returning them normalized:
+    every key set, the node defaulting to the host of the action
+    """
+
+    if not isinstance(timeline, list):
+        raise ValueError("timeline: expected a list of actions")
+
+    actions = []
+    for index, action in enumerate(timeline):
+        path = f"timeline[{index}]"
+        if not isinstance(action, dict):
+            raise ValueError(f"{path}: expected an object")
+        unknown = set(action) - {"at", "action", "node", "args", "gate"}
+        if len(unknown) > 0:
+            raise ValueError(f"{path}: unknown keys {sorted(unknown)}")
+
+        at = _check_value(f"{path}.at", action.get("at"), float, False)
+        name = _check_value(f"{path}.action", action.get("action"), str, False)
+        if name not in TIMELINE_ACTIONS:
+            raise ValueError(f"{path}.action: expected one of {list(TIMELINE_ACTIONS)}, got '{name}'")
+        args = _check_value(f"{path}.args", action.get("args", {}), dict, False)
+        missing = [arg for arg in TIMELINE_ACTIONS[name] if arg not in args]
+        if len(missing) > 0:
+            raise ValueError(f"{path}.args: missing {missing}")
+        node = _check_value(f"{path}.node", action.get("node", args.get("host")), str, True)
+
+        gate = action.get("gate")
+        if gate is not None:
+            gate = _check_value(f"{path}.gate", gate, dict, False)
+            gate = {
+                "log": _check_value(f"{path}.gate.log", gate.get("log"), str, False),
+                "pattern": _check_value(f"{path}.gate.pattern", gate.get("pattern"), str, False),
+                "count": _check_value(f"{path}.gate.count", gate.get("count", 1), int, False),
+                "timeout": _check_value(f"{path}.gate.timeout", gate.get("timeout", 0), float, False),
+            }
+
+        actions.append({"at": at, "action": name, "node": node, "args": args, "gate": gate})
+
+    # Sorting is stable, actions at the same offset keep their order
+    return sorted(actions, key=lambda action: action["at"])
+
+def validate_spec(spec):
+    """
+    Checking the sections, fields and types of the given spec.
+    Returns the overrides of the TestConfiguration (with enum values),
+    the capture policy values and the normalized timeline.
+    Raises a ValueError describing the first problem found
+    """
+
+    unknown = set(spec) - set(SPEC_SECTIONS) - {"capture", "timeline"} - set(DESCRIPTIVE_KEYS)
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown sections {sorted(unknown)}, expected {list(SPEC_SECTIONS) + ['capture', 'timeline']}")
+
+    types = _field_types(TestConfiguration)
+    overrides = {}
+    for section, section_fields in SPEC_SECTIONS.items():
+        values = spec.get(section, {})
+        if not isinstance(values, dict):
+            raise ValueError(f"{section}: expected an object")
+        for field, value in values.items():
+            if field not in section_fields:
+                raise ValueError(f"{section}.{field}: unknown field, expected one of {section_fields}")
+            overrides[field] = _check_value(f"{section}.{field}", value, types[field], field in NULLABLE_FIELDS)
+
+    capture_types = _field_types(CapturePolicy)
+    if not isinstance(spec.get("capture", {}), dict):
+        raise ValueError("capture: expected an object")
+    capture = dict(spec.get("capture", {}))
+    for field, value in capture.items():
+        if field not in capture_types:
+            raise ValueError(f"capture.{field}: unknown field, expected one of {list(capture_types)}")
+        capture[field] = _check_value(f"capture.{field}", value, capture_types[field], field in NULLABLE_CAPTURE_FIELDS)
+
+    timeline = _validate_timeline(spec.get("timeline", []))
+    if len(timeline) > 0 and overrides.get("test", Tests.TIMELINE) != Tests.TIMELINE:
+        raise ValueError("timeline: the actions are only executed by the 'TIMELINE' test")
+
+    return overrides, capture, timeline
+
+def apply_spec(conf: TestConfiguration, spec):
+    """
+    Validating the spec and setting its values on the test configuration.
+    A timeline without a given test selects the 'timeline' test
+    """
+
+    overrides, capture, timeline = validate_spec(spec)
+
+    if len(capture) > 0:
+        policy = copy.deepcopy(conf.capture) if conf.capture is not None else CapturePolicy()
+        for field, value in capture.items():
+            setattr(policy, field, value)
+        overrides["capture"] = policy
+
+    if len(timeline) > 0:
+        overrides["timeline"] = timeline
+        overrides.setdefault("test", Tests.TIMELINE)
+
+    apply_overrides(conf, overrides)
+    conf.spec_name = spec.get("name", conf.spec_name)
+
+    return conf
+
+def _normalize(value):
+    if isinstance(value, Enum):
+        return value.name
+    return value
+
+def resolve_spec(conf: TestConfiguration):
+    """
+    Creating the normalized spec of the given configuration with every
+    value set. Lists without order (the NAT paths) are sorted, so equal
+    experiments result in an equal spec
+    """
+
+    spec = {}
+    for section, section_fields in SPEC_SECTIONS.items():
+        spec[section] = {field: copy.deepcopy(_normalize(getattr(conf, field))) for field in section_fields}
+    if spec["topology"]["multi_path_nat"] is not None:
+        spec["topology"]["multi_path_nat"] = sorted(spec["topology"]["multi_path_nat"])
+
+    capture = conf.capture if conf.capture is not None else CapturePolicy()
+    spec["capture"] = asdict(capture)
+    spec["timeline"] = _validate_timeline(conf.timeline or [])
+
+    return spec
+
+def spec_id(spec):
+    """
+    Returning the SHA-256 of the canonical JSON of the normalized spec
+    """
+
+    hashed = {key: value for key, value in spec.items() if key not in DESCRIPTIVE_KEYS}
+    canonical = json.dumps(hashed, sort_keys=True, separators=(",", ":"), ensure_ascii=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def write_spec(conf: TestConfiguration, directory):
+    """
+    Writing the resolved spec together with its id into the run folder.
+    Returns the id
+    """
+
+    spec = resolve_spec(conf)
+    experiment_id = spec_id(spec)
+    content = {"id": experiment_id, "name": conf.spec_name, **spec}
+
+    outfile = Path(directory).joinpath(SPEC_FILE)
+    with open(outfile, "w") as out:
+        json.dump(content, out, indent=4, sort_keys=True)
+    print(f"Experiment {experiment_id[:12]}, wrote spec to '{outfile}'")
+
+    return experiment_id
+
+def read_spec_id(directory):
+    """
+    Returning the id of the experiment run in the given folder,
+    None if the folder contains no spec
+    """
+
+    spec_file = Path(directory).joinpath(SPEC_FILE)
+    if not spec_file.exists():
+        return None
+    with open(spec_file, "r") as infile:
+        return json.load(infile).get("id")
+
+def main():
+    """
+    Printing the resolved spec and the id of the given spec file, together
+    with the command line arguments of 'main.py', without running it
+    """
+
+    # The full command line parser of the tests, the spec is applied on top
+    from main import create_argument_parser
+
+    parser = argparse.ArgumentParser(description="Validating an experiment spec and printing its resolved form and id")
+    parser.add_argument('spec', type=str)
+    parser.add_argument('main_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    main_args = args.main_args
+    if len(main_args) > 0 and main_args[0] == "--":
+        main_args = main_args[1:]
+
+    conf = apply_spec(TestConfiguration(create_argument_parser().parse_args(main_args)), load_spec(args.spec))
+    spec = resolve_spec(conf)
+    print(json.dumps({"id": spec_id(spec), "name": conf.spec_name, **spec}, indent=4, sort_keys=True))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# This file contains the supervisor for all processes of a test run.
+#
+# The captures, the TURN server and the applications under test are
+# registered at a supervisor, which records when every process started
+# and exited together with its exit code into 'processes.log'.
+#
+# A background thread watches all processes. If a persistent process
+# (captures, servers) exits at all, or any process exits with an error
+# before the test is over, the run is aborted at once: all waits of the
+# test raise RunAborted (see scheduler.py) instead of running for the full
+# duration with a broken setup.
+#
+# At the end of a run all processes are stopped in parallel, escalating
+# from SIGINT to SIGTERM to SIGKILL for processes that do not exit in time.
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from scheduler import abort_run
+
+import signal
+import subprocess
+import threading
+import time
+
+# Interval in which the processes are checked for an exit
+_poll_interval = 0.05
+
+# The supervisor of the current run, used by 'supervise'
+_active = None
+
+class SupervisedProcess:
+    """
+    A single process of the run together with its start and exit times
+    (seconds since epoch) and the way it ended
+    """
+
+    def __init__(self, name, process, logfile=None, persistent=False, host=None):
+        self.name = name
+        self.process = process
+        self.logfile = logfile
+        self.persistent = persistent
+        self.host = host
+        self.started = time.time()
+        self.exited = None
+        self.returncode = None
+        self.stop_signal = None
+        self.crashed = False
+
+class ProcessSupervisor:
+    """
+    Starts, watches and stops the processes of a test run.
+
+    Usage:
+        supervisor = ProcessSupervisor(directory)
+        supervisor.start("h1.pcap", h1, "tshark -i h1-wifi -w h1.pcap", persistent=True)
+        supervisor.add("server", server, f"{directory}/h2.log", persistent=True)
+        ...
+        supervisor.stop_all()
+        supervisor.write_log()
+    """
+
+    def __init__(self, directory=None, logfile="processes.log", abort_on_crash=True):
+        self.directory = directory
+        self.logfile = logfile
+        self.abort_on_crash = abort_on_crash
+        self.processes = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._monitor = threading.Thread(target=self._watch, daemon=True)
+        self._monitor.start()
+
+    def activate(self):
+        """
+        Making this supervisor the one used by 'supervise', so the tests can
+        register their processes as soon as they are started
+        """
+
+        global _active
+        _active = self
+        return self
+
+    def deactivate(self):
+        global _active
+        if _active is self:
+            _active = None
+
+    def add(self, name, process, logfile=None, persistent=False, host=None):
+        """
+        Registering an already started process. Persistent processes are
+        expected to run until they are stopped, every exit is a crash.
+        Other processes may end on their own, but only with exit code 0.
+        """
+
+        with self._lock:
+            for supervised in self.processes:
+                if supervised.process is process:
+                    return supervised
+            supervised = SupervisedProcess(name, process, logfile, persistent, host)
+            self.processes.append(supervised)
+
+        return supervised
+
+    def start(self, name, host, cmd, logfile=None, persistent=False, **popen_kwargs):
+        """
+        Starting the command on the given Mininet node and registering it.
+        The command can be a string or an argument list, which is passed
+        to the process unchanged
+        """
+
+        process = host.popen(cmd, **popen_kwargs)
+        return self.add(name, process, logfile, persistent, f"{host}")
+
+    def start_all(self, commands):
+        """
+        Starting multiple commands at the same time. Expecting a list of
+        dictionaries with the arguments of 'start'.
+        Returns the started processes in the given order
+        """
+
+        if len(commands) == 0:
+            return []
+
+        with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+            futures = [executor.submit(self.start, **command) for command in commands]
+            return [future.result() for future in futures]
+
+    def _record_exit(self, supervised, returncode):
+        """
+        Storing the exit of the process and aborting the run in case it crashed
+        """
+
+        supervised.exited = time.time()
+        supervised.returncode = returncode
+
+        if self._stopping.is_set():
+            return
+        if supervised.persistent or returncode != 0:
+            supervised.crashed = True
+            print(f"Process '{supervised.name}' ({supervised.host}) exited early with code {returncode}")
+            if self.abort_on_crash:
+                abort_run(f"'{supervised.name}' exited with code {returncode}")
+
+    def _watch(self):
+        """
+        Checking all running processes for an exit until the supervisor is stopped
+        """
+
+        while not self._stopping.wait(_poll_interval):
+            with self._lock:
+                running = [s for s in self.processes if s.exited is None]
+            for supervised in running:
+                returncode = supervised.process.poll()
+                if returncode is not None:
+                    self._record_exit(supervised, returncode)
+
+    def _stop(self, supervised, grace):
+        """
+        Stopping a single process, escalating from SIGINT to SIGTERM to SIGKILL
+        if the process does not exit within the grace period
+        """
+
+        process = supervised.process
+        for sig in [signal.SIGINT, signal.SIGTERM, signal.SIGKILL]:
+            if process.poll() is not None:
+                break
+            supervised.stop_signal = sig.name
+            try:
+                process.send_signal(sig)
+            except ProcessLookupError:
+                break
+            try:
+                process.wait(grace)
+            except subprocess.TimeoutExpired:
+                continue
+
+        if supervised.exited is None:
+            self._record_exit(supervised, process.wait())
+
+    def stop_all(self, grace=2):
+        """
+        Stopping all processes in parallel. Every process gets 'grace' seconds
+        per signal to exit. Exits from now on are no longer crashes
+        """
+
+        self._stopping.set()
+        self._monitor.join()
+
+        with self._lock:
+            processes = list(self.processes)
+
+        threads = []
+        for supervised in processes:
+            thread = threading.Thread(target=self._stop, args=(supervised, grace), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        self.deactivate()
+        return processes
+
+    def crashed(self):
+        """
+        Returns all processes which exited unexpectedly
+        """
+
+        return [s for s in self.processes if s.crashed]
+
+    def write_log(self):
+        """
+        Writing the start and exit times and exit codes of all processes as csv
+        """
+
+        lines = ["name,host,pid,persistent,started,exited,returncode,stop_signal,crashed"]
+        for s in self.processes:
+            exited = f"{s.exited:.6f}" if s.exited is not None else ""
+            lines.append(f"{s.name},{s.host},{s.process.pid},{s.persistent},{s.started:.6f},{exited},{s.returncode},{s.stop_signal},{s.crashed}")
+
+        if self.directory is None:
+            return
+
+        outfile = Path(self.directory).joinpath(self.logfile)
+        with open(outfile, "w") as log:
+            log.write("\n".join(lines) + "\n")
+        print(f"Wrote process log to '{outfile}'")
+
+def supervise(name, process, logfile=None, persistent=False, host=None):
+    """
+    Registering the process at the supervisor of the current run, if any.
+    Returns the process
+    """
+
+    if _active is not None:
+        _active.add(name, process, logfile, persistent, host)
+    return process
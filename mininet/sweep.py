@@ -0,0 +1,155 @@
+# This file contains the parameter sweep over the test configuration.
+#
+# A sweep takes a grid of TestConfiguration fields (e.g. the path delays,
+# snat, the TURN server or the duration) and runs one test per grid point.
+# Multiple grid points are executed at the same time, each in its own
+# 'main.py' process with its own Mininet network.
+#
+# Hosts, NATs and their interfaces live in their own network namespaces
+# and therefore do not collide between networks. Switches, their interfaces
+# and the controller live in the root namespace, which is why every grid
+# point gets its own switch prefix and controller port.
+#
+# Usage: sudo python3 mininet/sweep.py --grid grid.json --parallel 5 -- --setup full -t quicheperf
+#
+# With the grid file:
+# {
+#     "internet_path_local_delay": [3, 5, 35],
+#     "enable_snat": [false, true]
+# }
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from measurement_util import create_new_test_folder, change_rights_test_folder
+from config import TestConfiguration
+
+import argparse
+import itertools
+import json
+import subprocess
+import sys
+import time
+import csv
+
+# The port used by the first controller, every grid point adds its index
+controller_base_port = 6700
+
+def load_grid(grid_file):
+    """
+    Reading the grid from the given JSON file.
+    Expecting a dictionary of TestConfiguration field to list of values.
+    Raises a ValueError for unknown fields
+    """
+
+    with open(grid_file, "r") as infile:
+        grid = json.load(infile)
+
+    for field, values in grid.items():
+        if field not in TestConfiguration.__annotations__:
+            raise ValueError(f"'{field}' is no field of the test configuration")
+        if not isinstance(values, list):
+            grid[field] = [values]
+
+    return grid
+
+def expand_grid(grid):
+    """
+    Creating all combinations of the given grid.
+    Returns a list of dictionaries, one per grid point
+    """
+
+    fields = list(grid.keys())
+    points = []
+    for values in itertools.product(*[grid[field] for field in fields]):
+        points.append(dict(zip(fields, values)))
+
+    return points
+
+def _run_point(index, point, sweep_dir, main_args):
+    """
+    Running the test of a single grid point in its own process.
+    The output of the process is written into the folder of the grid point.
+    Returns the exit code and the duration of the run
+    """
+
+    point_dir = Path(sweep_dir).joinpath(f"point_{index:03d}")
+    point_dir.mkdir(parents=True, exist_ok=True)
+
+    overrides_file = point_dir.joinpath("overrides.json")
+    with open(overrides_file, "w") as outfile:
+        json.dump(point, outfile, indent=4)
+
+    main_script = Path(__file__).parent.joinpath("main.py")
+    cmd = [sys.executable, f"{main_script}"] + main_args + [
+        "--output-dir", f"{point_dir}",
+        "--switch-prefix", f"w{index}",
+        "--controller-port", f"{controller_base_port + index}",
+        "--overrides", f"{overrides_file}",
+    ]
+
+    print(f"Starting grid point {index}: {point}")
+    start = time.monotonic()
+    with open(point_dir.joinpath("main.out"), "w") as outfile:
+        process = subprocess.run(cmd, stdout=outfile, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+    duration = time.monotonic() - start
+    print(f"Finished grid point {index} with exit code {process.returncode} after {duration:.1f}s")
+
+    return process.returncode, duration
+
+def run_sweep(grid, main_args, parallel=4, sweep_dir=None):
+    """
+    Running all points of the grid with at most 'parallel' tests at the same time.
+    Every grid point is stored in its own folder below the sweep folder.
+    An overview of all points is written to 'sweep.csv'
+    """
+
+    if sweep_dir is None:
+        sweep_dir = create_new_test_folder()
+
+    points = expand_grid(grid)
+    print(f"Running {len(points)} grid points with {parallel} in parallel into '{sweep_dir}'")
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [executor.submit(_run_point, index, point, sweep_dir, main_args) for index, point in enumerate(points)]
+        results = [future.result() for future in futures]
+
+    fields = list(grid.keys())
+    with open(Path(sweep_dir).joinpath("sweep.csv"), "w", newline="") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(["point", "directory"] + fields + ["exit_code", "duration"])
+        for index, (point, (returncode, duration)) in enumerate(zip(points, results)):
+            writer.writerow([index, f"point_{index:03d}"] + [point[field] for field in fields] + [returncode, f"{duration:.3f}"])
+
+    change_rights_test_folder(sweep_dir)
+
+    failed = [index for index, (returncode, _) in enumerate(results) if returncode != 0]
+    if len(failed) > 0:
+        print(f"Grid points {failed} failed, see the 'main.out' in their folders")
+
+    return results
+
+def main():
+    """
+    Parsing the command line and running the sweep. All arguments after '--'
+    are given to 'main.py' for every grid point
+    """
+
+    parser = argparse.ArgumentParser(description="Running a test for every point of a parameter grid in parallel")
+    parser.add_argument('-g', '--grid', type=str, required=True)
+    parser.add_argument('-j', '--parallel', type=int, default=4)
+    parser.add_argument('-o', '--output-dir', type=str, default=None)
+    parser.add_argument('main_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    main_args = args.main_args
+    if len(main_args) > 0 and main_args[0] == "--":
+        main_args = main_args[1:]
+
+    grid = load_grid(args.grid)
+    run_sweep(grid, main_args, args.parallel, args.output_dir)
+
+    print("All grid points completed...")
+
+if __name__ == "__main__":
+    main()
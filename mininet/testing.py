@@ -8,8 +8,13 @@
 # Closing the processes and writing the logfile is then done
 # by the wrapper function
 
-from config import Logging
-from measurement_util import wait, path_loss, iface_down, iface_up, set_conntrack_timeout, print_nat_table, remove_conntrack_entry
+from config import Logging, Scenarios
+from measurement_util import wait, path_loss, apply_impairments, iface_down, iface_up, set_conntrack_timeout, print_nat_table, remove_conntrack_entry, stream_output
+from scheduler import Schedule
+from gates import LogGate, NOMINATED_PAIR
+from supervisor import supervise
+from topologies.addressing import pair_hosts, wifi_addresses, multi_path_addresses
+from topologies.multi_path import MultiPath
 from mininet.net import CLI
 
 import subprocess
@@ -21,45 +26,86 @@ quicheperf_dir = f"{code_dir}/quicheperf-stun"
 testing_dir = f"{code_dir}/2024-justus-von-der-beek-supplementary-material"
 
 
-def quicheperf(net, directory, conf):
+def _quicheperf_addresses(conf, pair):
     """
-    Starting the actual application we want to test.
-    Responsible for starting the application and logging.
-    Must return a list of tuple holding (process, logfile)
-    which will be terminated by the wrapper. If the logfile
-    is 'None' then we expect the application to directly write
-    into the logfile and therefore no output is processed by
-    the wrapper.
+    Returning the addresses the client and server of the pair start on,
+    the other interfaces are found by ICE
     """
 
-    h1 = net.get("h1")
-    h2 = net.get("h2")
+    if conf.scenario == Scenarios.MULTI_PATH:
+        # Only a single pair, there is no Wi-Fi path
+        return multi_path_addresses(1, 1 in conf.multi_path_nat)
+    return wifi_addresses(pair)
+
+def _start_quicheperf(net, directory, conf):
+    """
+    Starting the quicheperf server on h2 and the client on h1, with
+    multiple host pairs one server and client per pair at the same time.
+    With a high log level the output is directly written into the
+    logfiles by the shell, otherwise it is streamed into the logfiles
+    while running.
+    Returns the list of tuples (process, logfile) for the wrapper
+    """
 
     target = conf.build_target
     tp = conf.throughput
+    binary_dir = conf.quicheperf_dir if conf.quicheperf_dir is not None else quicheperf_dir
     output_processes = []
 
-    # print("Executing: {}".format(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true"))
+    for pair in range(1, conf.host_pairs + 1):
+        client_name, server_name = pair_hosts(pair)
+        client_ip, server_ip = _quicheperf_addresses(conf, pair)
+        client_host = net.get(client_name)
+        server_host = net.get(server_name)
+        # Keeping the process names of the single pair setup
+        suffix = "" if pair == 1 else f"{pair}"
 
-    if conf.log_level.value > Logging.INFO.value:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true &> {testing_dir}/{directory}/h2.log", shell=True)
+        server_cmd = f"{binary_dir}/target/{target}/quicheperf server --cert {binary_dir}/src/cert.crt --key {binary_dir}/src/cert.key -l {server_ip}:10000 --mp true"
+        client_cmd = f"{binary_dir}/target/{target}/quicheperf client -l {client_ip}:20000 -c {server_ip}:10000 --mp true -d {conf.duration} -b {tp}"
 
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp} &> {testing_dir}/{directory}/h1.log", shell=True)
+        if conf.log_level.value > Logging.INFO.value:
+            server = server_host.popen(f"{server_cmd} &> {directory}/{server_name}.log", shell=True)
 
-        server_capture = (server, None)
-        client_capture = (client, None)
-        output_processes.append(server_capture)
-        output_processes.append(client_capture)
-    else:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
+            client = client_host.popen(f"{client_cmd} &> {directory}/{client_name}.log", shell=True)
+
+            supervise(f"server{suffix}", server, persistent=True, host=server_name)
+            supervise(f"client{suffix}", client, host=client_name)
+
+            server_capture = (server, None)
+            client_capture = (client, None)
+        else:
+            server = server_host.popen(server_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
+            stream_output(server, f"{directory}/{server_name}.log")
+
+            client = client_host.popen(client_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
+            stream_output(client, f"{directory}/{client_name}.log")
+            supervise(f"server{suffix}", server, f"{directory}/{server_name}.log", persistent=True, host=server_name)
+            supervise(f"client{suffix}", client, f"{directory}/{client_name}.log", host=client_name)
+        
+            server_capture = (server, f"{directory}/{server_name}.log")
+            client_capture = (client, f"{directory}/{client_name}.log")
 
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp}", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-    
-        server_capture = (server, f"{directory}/h2.log")
-        client_capture = (client, f"{directory}/h1.log")
         output_processes.append(server_capture)
         output_processes.append(client_capture)
 
+    return output_processes
+
+
+def quicheperf(net, directory, conf):
+    """
+    Starting the actual application we want to test.
+    Responsible for starting the application and logging.
+    Must return a list of tuple holding (process, logfile)
+    which will be terminated by the wrapper. If the logfile
+    is 'None' then we expect the application to directly write
+    into the logfile and therefore no output is processed by
+    the wrapper.
+    """
+
+    # print("Executing: {}".format(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true"))
+
+    output_processes = _start_quicheperf(net, directory, conf)
+
     # path_loss(net, "h1", "h1-wifi")
     wait(20)
     # path_loss(net, "h1", "h1-wifi", loss=0)
@@ -73,46 +119,22 @@ def quicheperf_if_test(net, directory, conf):
     Testing the behavior of the implementation in case an interface goes up or down.
     """
 
-    h1 = net.get("h1")
-    h2 = net.get("h2")
-
-    target = conf.build_target
-    tp = conf.throughput
-    output_processes = []
-
     # ip_storage = iface_down(net, "h1", "h1-eth", directory)
     # Ensure interface is down
     # wait(0.5)
 
-    if conf.log_level.value > Logging.INFO.value:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true &> {testing_dir}/{directory}/h2.log", shell=True)
-
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp} &> {testing_dir}/{directory}/h1.log", shell=True)
-
-        server_capture = (server, None)
-        client_capture = (client, None)
-        output_processes.append(server_capture)
-        output_processes.append(client_capture)
-    else:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp}", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-    
-        server_capture = (server, f"{directory}/h2.log")
-        client_capture = (client, f"{directory}/h1.log")
-        output_processes.append(server_capture)
-        output_processes.append(client_capture)
+    output_processes = _start_quicheperf(net, directory, conf)
 
+    schedule = Schedule(directory)
+    ip_storage = {}
     # Waiting long enough so that we establish some connection on both paths
-    wait(7)
+    both_paths_found = LogGate(f"{directory}/h1.log", NOMINATED_PAIR, count=2)
     # IFace down
-    ip_storage = iface_down(net, "h1", "h1-cellular", directory)
+    schedule.at(5, iface_down, net, "h1", "h1-cellular", directory, ip_storage, node="h1", gate=both_paths_found, gate_timeout=2)
     # Wait more than a single iteration before interface has connection again
-    wait(20)
-    
     # Restore interface and IP, waiting for ICE to notice
-    ip_storage = iface_up(net, "h1", "h1-cellular", directory, ip_storage)
-    wait(20)
+    schedule.at(27, iface_up, net, "h1", "h1-cellular", directory, ip_storage, node="h1")
+    schedule.run(end=47)
 
     # Finished testing
     return output_processes
@@ -122,41 +144,17 @@ def quicheperf_if_init_test(net, directory, conf):
     Testing the behavior of the implementation in case an interface goes up or down.
     """
 
-    h1 = net.get("h1")
-    h2 = net.get("h2")
-
-    target = conf.build_target
-    tp = conf.throughput
-    output_processes = []
-
     ip_storage = iface_down(net, "h1", "h1-eth", directory)
     # Ensure interface is down
     wait(0.5)
 
-    if conf.log_level.value > Logging.INFO.value:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true &> {testing_dir}/{directory}/h2.log", shell=True)
-
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp} &> {testing_dir}/{directory}/h1.log", shell=True)
-
-        server_capture = (server, None)
-        client_capture = (client, None)
-        output_processes.append(server_capture)
-        output_processes.append(client_capture)
-    else:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp}", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-    
-        server_capture = (server, f"{directory}/h2.log")
-        client_capture = (client, f"{directory}/h1.log")
-        output_processes.append(server_capture)
-        output_processes.append(client_capture)
+    output_processes = _start_quicheperf(net, directory, conf)
 
+    schedule = Schedule(directory)
     # Waiting long enough so that we don't match the re-gathering exactly
-    wait(15)
     # Restore interface and IP, waiting for ICE to notice
-    ip_storage = iface_up(net, "h1", "h1-eth", directory, ip_storage)
-    wait(20)
+    schedule.at(15, iface_up, net, "h1", "h1-eth", directory, ip_storage, node="h1")
+    schedule.run(end=35)
 
     # Finished testing
     return output_processes
@@ -170,80 +168,51 @@ def quicheperf_path_loss_test(net, directory, conf):
     exists anymore.
     """
 
-    h1 = net.get("h1")
-    h2 = net.get("h2")
-
-    target = conf.build_target
-    tp = conf.throughput
-    output_processes = []
-
     set_conntrack_timeout(net, "nat3", timeout=25)
 
-    if conf.log_level.value > Logging.INFO.value:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true &> {testing_dir}/{directory}/h2.log", shell=True)
-
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp} &> {testing_dir}/{directory}/h1.log", shell=True)
+    output_processes = _start_quicheperf(net, directory, conf)
 
-        server_capture = (server, None)
-        client_capture = (client, None)
-        output_processes.append(server_capture)
-        output_processes.append(client_capture)
-    else:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp}", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-    
-        server_capture = (server, f"{directory}/h2.log")
-        client_capture = (client, f"{directory}/h1.log")
-        output_processes.append(server_capture)
-        output_processes.append(client_capture)
+    schedule = Schedule(directory)
+    ip_storage = {}
 
     # Waiting long enough so that at least one path has been found
     # Should be done 5 seconds after start
-    wait(7)
-    
+    path_found = LogGate(f"{directory}/h1.log", NOMINATED_PAIR)
     # Now lose all packets on the Ethernet path (NAT3)
     nat_to_lose_packets="nat3"
-    path_loss(net, f"{nat_to_lose_packets}", f"{nat_to_lose_packets}-local", loss=100)
-    path_loss(net, f"{nat_to_lose_packets}", f"{nat_to_lose_packets}-ext", loss=100)
+    nat_links = [f"{nat_to_lose_packets}-local", f"{nat_to_lose_packets}-ext"]
+    schedule.at(5, apply_impairments, net, {iface: {"loss": 100} for iface in nat_links}, directory, node=nat_to_lose_packets, gate=path_found, gate_timeout=2)
 
     # Wait for all bindings to timeout
     # See: https://unix.stackexchange.com/questions/524295/how-long-does-conntrack-remember-a-connection
     # Disable the Wi-Fi path as well (but be fair to our implementation and not intervene)
     # with the sending of synchronization frames at second 11
-    wait(5)
 
     # Also lose all packets on the Wi-Fi direct link (Switch 1)
-    nat2_to_lose_packets="s1"
-    path_loss(net, f"{nat2_to_lose_packets}", f"{nat2_to_lose_packets}-wifi1", loss=100)
-    path_loss(net, f"{nat2_to_lose_packets}", f"{nat2_to_lose_packets}-wifi2", loss=100)
-    
-    # Wait for the next ICE probing    
-    wait(19) # Second 31
+    nat2_to_lose_packets=f"{conf.switch_prefix}s1"
+    wifi_links = [f"{nat2_to_lose_packets}-wifi1", f"{nat2_to_lose_packets}-wifi2"]
+    schedule.at(12, apply_impairments, net, {iface: {"loss": 100} for iface in wifi_links}, directory, node=nat2_to_lose_packets)
     
+    # Wait for the next ICE probing (second 31)
     # Helping the timeout and remove the established path (in case any was established)
-    remove_conntrack_entry(net, f"{nat_to_lose_packets}", "-u ASSURED")
-    print_nat_table(net, f"{nat_to_lose_packets}", outpath=directory, outfile=f"{nat_to_lose_packets}_temp_nat.log")
+    schedule.at(31, remove_conntrack_entry, net, f"{nat_to_lose_packets}", "-u ASSURED", node=nat_to_lose_packets)
+    schedule.at(31, print_nat_table, net, f"{nat_to_lose_packets}", outpath=directory, outfile=f"{nat_to_lose_packets}_temp_nat.log", node=nat_to_lose_packets)
     # Then, restore the Ethernet path to be rebuild
-    path_loss(net, f"{nat_to_lose_packets}", f"{nat_to_lose_packets}-local", loss=0)
-    path_loss(net, f"{nat_to_lose_packets}", f"{nat_to_lose_packets}-ext", loss=0)
+    schedule.at(31, apply_impairments, net, {iface: {"loss": 0} for iface in nat_links}, directory, node=nat_to_lose_packets)
     
     # Now, disable the Wi-Fi interface, to show that it is not considered during probing
-    # if it is down
-    wait(2) # Second 33
-    ip_storage = iface_down(net, "h1", "h1-wifi", directory)
+    # if it is down (second 33)
+    schedule.at(33, iface_down, net, "h1", "h1-wifi", directory, ip_storage, node="h1")
     
     # Wait for next probing to re-enable the Wi-Fi path and interface again
-    wait(12) # Second 45, 3s into probing
-    
+    # Second 45, 3s into probing
     # Enable Wi-Fi path
-    # path_loss(net, f"{nat2_to_lose_packets}", f"{nat2_to_lose_packets}-wifi1", loss=0)
-    # path_loss(net, f"{nat2_to_lose_packets}", f"{nat2_to_lose_packets}-wifi2", loss=0)
-    ip_storage = iface_up(net, "h1", "h1-wifi", directory, ip_storage)
+    # schedule.at(45, apply_impairments, net, {iface: {"loss": 0} for iface in wifi_links}, directory, node=nat2_to_lose_packets)
+    schedule.at(45, iface_up, net, "h1", "h1-wifi", directory, ip_storage, node="h1")
     
     # Now only wait to see that we find the path in the next iteration
-    wait(30)
-    set_conntrack_timeout(net, f"{nat_to_lose_packets}", timeout=120)
+    schedule.at(75, set_conntrack_timeout, net, f"{nat_to_lose_packets}", timeout=120, node=nat_to_lose_packets)
+    schedule.run()
 
     # Finished testing
     return output_processes
@@ -255,64 +224,108 @@ def quicheperf_loss_on_probing(net, directory, conf):
     synchronization frames exchanged via QUIC and a freeze in path probing
     """
     
-    h1 = net.get("h1")
-    h2 = net.get("h2")
-
-    target = conf.build_target
-    tp = conf.throughput
-    output_processes = []
-
     set_conntrack_timeout(net, "nat3", timeout=25)
 
-    if conf.log_level.value > Logging.INFO.value:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true &> {testing_dir}/{directory}/h2.log", shell=True)
+    output_processes = _start_quicheperf(net, directory, conf)
 
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp} &> {testing_dir}/{directory}/h1.log", shell=True)
-
-        server_capture = (server, None)
-        client_capture = (client, None)
-        output_processes.append(server_capture)
-        output_processes.append(client_capture)
-    else:
-        server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp}", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-    
-        server_capture = (server, f"{directory}/h2.log")
-        client_capture = (client, f"{directory}/h1.log")
-        output_processes.append(server_capture)
-        output_processes.append(client_capture)
+    schedule = Schedule(directory)
 
     # Waiting long enough so that both paths are found
     # Should be done 5 seconds after the start
-    wait(7)
-    
+    both_paths_found = LogGate(f"{directory}/h1.log", NOMINATED_PAIR, count=2)
     # Now lose all packets on the Ethernet path (NAT3) and enforce migration onto Wi-Fi
     nat_to_lose_packets="nat3"
-    path_loss(net, f"{nat_to_lose_packets}", f"{nat_to_lose_packets}-local", loss=100)
-    path_loss(net, f"{nat_to_lose_packets}", f"{nat_to_lose_packets}-ext", loss=100)
+    nat_links = [f"{nat_to_lose_packets}-local", f"{nat_to_lose_packets}-ext"]
+    schedule.at(5, apply_impairments, net, {iface: {"loss": 100} for iface in nat_links}, directory, node=nat_to_lose_packets, gate=both_paths_found, gate_timeout=2)
     
     # Wait until the next gathering iteration starts and kill the sending Wi-Fi interface exactly at
     # that time
-    wait(4)
-
     # Also lose all packets on the Wi-Fi direct link (Switch 1)
-    nat2_to_lose_packets="s1"
-    path_loss(net, f"{nat2_to_lose_packets}", f"{nat2_to_lose_packets}-wifi1", loss=100)
-    path_loss(net, f"{nat2_to_lose_packets}", f"{nat2_to_lose_packets}-wifi2", loss=100)
+    nat2_to_lose_packets=f"{conf.switch_prefix}s1"
+    wifi_links = [f"{nat2_to_lose_packets}-wifi1", f"{nat2_to_lose_packets}-wifi2"]
+    schedule.at(11, apply_impairments, net, {iface: {"loss": 100} for iface in wifi_links}, directory, node=nat2_to_lose_packets)
     
     # Now, all gathering should fail because we are missing an ICE synchronization
     # Wait until path becomes disabled
-    wait(15)
-    
     # Even after enabling the path, should not be found again
-    remove_conntrack_entry(net, f"{nat_to_lose_packets}", "-u ASSURED")
-    print_nat_table(net, f"{nat_to_lose_packets}", outpath=directory, outfile=f"{nat_to_lose_packets}_temp_nat.log")
+    schedule.at(26, remove_conntrack_entry, net, f"{nat_to_lose_packets}", "-u ASSURED", node=nat_to_lose_packets)
+    schedule.at(26, print_nat_table, net, f"{nat_to_lose_packets}", outpath=directory, outfile=f"{nat_to_lose_packets}_temp_nat.log", node=nat_to_lose_packets)
     # Then, restore the Ethernet path to be rebuild
-    path_loss(net, f"{nat_to_lose_packets}", f"{nat_to_lose_packets}-local", loss=0)
-    path_loss(net, f"{nat_to_lose_packets}", f"{nat_to_lose_packets}-ext", loss=0)
+    schedule.at(26, apply_impairments, net, {iface: {"loss": 0} for iface in nat_links}, directory, node=nat_to_lose_packets)
     
-    wait(20)
+    schedule.run(end=46)
+
+def quicheperf_probing_cost(net, directory, conf):
+    """
+    Measuring the cost of the ICE probing on the multi-path scenario with
+    K interfaces per host and therefore K^2 candidate pairs.
+    The conntrack tables of all NATs are dumped once the first pair was
+    nominated, showing how many pairs were probed until then. Gathering,
+    probing traffic and nomination time are evaluated afterwards with
+    'plotting/probingCost.py'
+    """
+
+    output_processes = _start_quicheperf(net, directory, conf)
+
+    schedule = Schedule(directory)
+
+    nominated = LogGate(f"{directory}/h1.log", NOMINATED_PAIR)
+    for nat in MultiPath.nats(conf.multi_paths, conf.multi_path_nat):
+        schedule.at(0, print_nat_table, net, nat, outpath=directory, outfile=f"{nat}_nominated_nat.log", node=nat, name=f"nominated_{nat}", gate=nominated, gate_timeout=conf.duration)
+
+    schedule.run(end=conf.duration)
+
+    return output_processes
+
+def _timeline_call(net, directory, ip_storage, action):
+    """
+    Returning the function and arguments of a timeline action of the spec
+    """
+
+    args = action["args"]
+    match action["action"]:
+        case "impairments":
+            return apply_impairments, (net, args["impairments"], directory), {}
+        case "iface_down":
+            return iface_down, (net, args["host"], args["iface"], directory, ip_storage), {}
+        case "iface_up":
+            return iface_up, (net, args["host"], args["iface"], directory, ip_storage), {}
+        case "nat_table":
+            return print_nat_table, (net, args["host"]), {"outpath": directory, "outfile": args.get("outfile")}
+        case "remove_conntrack":
+            return remove_conntrack_entry, (net, args["host"], args["filter"]), {}
+        case "conntrack_timeout":
+            return set_conntrack_timeout, (net, args["host"], args["timeout"]), {}
+    raise ValueError(f"'{action['action']}' is no timeline action")
+
+def quicheperf_timeline(net, directory, conf):
+    """
+    Starting quicheperf and executing the timeline of the experiment spec
+    (see spec.py) until the end of the test duration.
+    Actions waiting on the same log pattern share a single gate
+    """
+
+    output_processes = _start_quicheperf(net, directory, conf)
+
+    schedule = Schedule(directory)
+    ip_storage = {}
+    gates = {}
+    for action in conf.timeline or []:
+        function, args, kwargs = _timeline_call(net, directory, ip_storage, action)
+        gate = None
+        gate_timeout = 0
+        if action["gate"] is not None:
+            spec_gate = action["gate"]
+            key = (spec_gate["log"], spec_gate["pattern"], spec_gate["count"])
+            if key not in gates:
+                gates[key] = LogGate(f"{directory}/{spec_gate['log']}", spec_gate["pattern"], count=spec_gate["count"])
+            gate = gates[key]
+            gate_timeout = spec_gate["timeout"]
+        schedule.at(action["at"], function, *args, node=action["node"], name=action["action"], gate=gate, gate_timeout=gate_timeout, **kwargs)
+
+    schedule.run(end=conf.duration)
+
+    return output_processes
 
 def start_ping_pong(net, directory, conf):
     """
@@ -327,6 +340,10 @@ def start_ping_pong(net, directory, conf):
 
     server = h2.popen(f"{code_dir}/webrtc_unmod/target/{target}/examples/ping_pong -c 192.168.1.2 -p", stdout=subprocess.PIPE, stdin=subprocess.PIPE)
     client = h1.popen(f"{code_dir}/webrtc_unmod/target/{target}/examples/ping_pong -c 192.168.1.3 --controlling -p", stdout=subprocess.PIPE, stdin=subprocess.PIPE)
+    stream_output(server, f"{directory}/h2.log", live="stdout")
+    stream_output(client, f"{directory}/h1.log", live="stdout")
+    supervise("server", server, f"{directory}/h2.log", host="h2")
+    supervise("client", client, f"{directory}/h1.log", host="h1")
 
     wait(20)
 
@@ -367,7 +384,9 @@ def quicheperf_real_world(net, directory, conf):
     if conf.log_level.value > Logging.INFO.value:
         # server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true &> {testing_dir}/{directory}/h2.log", shell=True)
 
-        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp} &> {testing_dir}/{directory}/h1.log", shell=True)
+        client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp} &> {directory}/h1.log", shell=True)
+
+        supervise("client", client, host="h1")
 
         # server_capture = (server, None)
         client_capture = (client, None)
@@ -377,6 +396,8 @@ def quicheperf_real_world(net, directory, conf):
         # server = h2.popen(f"{quicheperf_dir}/target/{target}/quicheperf server --cert {quicheperf_dir}/src/cert.crt --key {quicheperf_dir}/src/cert.key -l 192.168.1.3:10000 --mp true", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
 
         client = h1.popen(f"{quicheperf_dir}/target/{target}/quicheperf client -l 192.168.1.2:20000 -c 192.168.1.3:10000 --mp true -d {conf.duration} -b {tp}", stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
+        stream_output(client, f"{directory}/h1.log")
+        supervise("client", client, f"{directory}/h1.log", host="h1")
     
         # server_capture = (server, f"{directory}/h2.log")
         client_capture = (client, f"{directory}/h1.log")
@@ -0,0 +1,56 @@
+# This file contains the naming and addressing of the host pairs.
+#
+# Pair i (starting at 1) consists of the left host h(2i-1) and the right
+# host h(2i). The first pair is the original h1/h2 setup, all further
+# pairs share the same switches, NATs and the TURN server:
+#
+#   Pair  Hosts    Wi-Fi                        Ethernet                     Cellular
+#   1     h1, h2   192.168.1.2, 192.168.1.3     172.16.1.10, 172.16.2.20     1.20.30.2, 2.40.60.3
+#   2     h3, h4   192.168.1.4, 192.168.1.5     172.16.1.11, 172.16.2.21     1.20.30.3, 2.40.60.4
+#   i     ...      192.168.1.(2i), .(2i+1)      172.16.1.(9+i), 172.16.2.(19+i)  1.20.30.(i+1), 2.40.60.(i+2)
+
+def pair_hosts(pair):
+    """
+    Returning the names of the left and the right host of the pair
+    """
+
+    return f"h{2 * pair - 1}", f"h{2 * pair}"
+
+def wifi_addresses(pair):
+    return f"192.168.1.{2 * pair}", f"192.168.1.{2 * pair + 1}"
+
+def ethernet_addresses(pair):
+    return f"172.16.1.{9 + pair}", f"172.16.2.{19 + pair}"
+
+def cellular_addresses(pair):
+    return f"1.20.30.{pair + 1}", f"2.40.60.{pair + 2}"
+
+def multi_path_addresses(path, nat):
+    """
+    Returning the addresses of h1 and h2 on the given path of the
+    multi-path scenario, in front of and behind the NAT if enabled
+    """
+
+    if nat:
+        return f"10.{path}.1.10", f"10.{path}.2.20"
+    return f"10.{path}.0.2", f"10.{path}.0.3"
+
+def max_pairs(cellular_prefix):
+    """
+    Returning the number of pairs fitting into the cellular subnets,
+    the limit for the Wi-Fi and Ethernet subnet is higher
+    """
+
+    # Network, broadcast and the NAT address are not usable,
+    # the Wi-Fi /24 holds two addresses per pair
+    return min(2 ** (32 - cellular_prefix) - 4, 126)
+
+def switch_dpid(number):
+    """
+    Returning the datapath id of the switch 's<number>'.
+    Mininet takes the dpid from the first number in the switch name,
+    which is the one of the switch prefix (e.g. 'w3s2') if given, so
+    the dpid is set explicitly to keep it unique within the network
+    """
+
+    return f"{number:016x}"
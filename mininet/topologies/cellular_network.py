@@ -1,5 +1,9 @@
 from mininet.net import Mininet
 
+from .ruleset import Ruleset
+from .link_config import configure_pending_links
+from .addressing import pair_hosts, cellular_addresses, switch_dpid
+
 class Cellular:
     """
     Takes the default network (or modified) and expands the network to 
@@ -38,6 +42,8 @@ class Cellular:
 
         # Creating the links
         Cellular._create_links(net, configuration)
+        # Addresses and delays are required by the routes
+        configure_pending_links()
 
         # Performing the routing table actions
         Cellular._setup_routing_table(net, configuration)
@@ -52,9 +58,10 @@ class Cellular:
         net.addHost("nat1")
         net.addHost("nat2")
 
-        net.addSwitch("s2") # H1 <-> Nat1
-        net.addSwitch("s3") # Nat1 <-> Nat2
-        net.addSwitch("s4") # Nat2 <-> H2
+        prefix = configuration.switch_prefix
+        net.addSwitch(f"{prefix}s2", dpid=switch_dpid(2)) # H1 <-> Nat1
+        net.addSwitch(f"{prefix}s3", dpid=switch_dpid(3)) # Nat1 <-> Nat2
+        net.addSwitch(f"{prefix}s4", dpid=switch_dpid(4)) # Nat2 <-> H2
 
         if configuration.enable_turn_host:
             net.addHost("turn")
@@ -65,15 +72,25 @@ class Cellular:
         Adding the required links between the hosts in the network
         """
 
-        net.addLink(node1="h1", node2="s2", intfName1="h1-cellular", params1={"ip":"1.20.30.2/28"}, delay=f"{configuration.internet_path_local_delay}ms", use_htb=True)
-        net.addLink(node1="h2", node2="s4", intfName1="h2-cellular",  params1={"ip":"2.40.60.3/28"}, delay=f"{configuration.internet_path_local_2_delay}ms", use_htb=True)
+        # Switch names are prefixed to allow multiple networks on the same machine
+        s2 = f"{configuration.switch_prefix}s2"
+        s3 = f"{configuration.switch_prefix}s3"
+        s4 = f"{configuration.switch_prefix}s4"
+
+        prefix = configuration.cellular_prefix
+        # All left hosts share NAT1, all right hosts share NAT2
+        for pair in range(1, configuration.host_pairs + 1):
+            left, right = pair_hosts(pair)
+            left_ip, right_ip = cellular_addresses(pair)
+            net.addLink(node1=left, node2=s2, intfName1=f"{left}-cellular", params1={"ip":f"{left_ip}/{prefix}"}, delay=f"{configuration.internet_path_local_delay}ms", use_htb=True)
+            net.addLink(node1=right, node2=s4, intfName1=f"{right}-cellular",  params1={"ip":f"{right_ip}/{prefix}"}, delay=f"{configuration.internet_path_local_2_delay}ms", use_htb=True)
 
-        net.addLink("s2", "nat1", intfName2="nat1-local", params2={"ip":"1.20.30.1/28"}, delay=f"{configuration.internet_path_local_delay}ms", use_htb=True)
-        net.addLink("s4", "nat2", intfName2="nat2-local", params2={"ip":"2.40.60.1/28"}, delay=f"{configuration.internet_path_local_2_delay}ms", use_htb=True)
+        net.addLink(s2, "nat1", intfName2="nat1-local", params2={"ip":f"1.20.30.1/{prefix}"}, delay=f"{configuration.internet_path_local_delay}ms", use_htb=True)
+        net.addLink(s4, "nat2", intfName2="nat2-local", params2={"ip":f"2.40.60.1/{prefix}"}, delay=f"{configuration.internet_path_local_2_delay}ms", use_htb=True)
 
-        net.addLink("nat1", "s3", intfName1="nat1-ext", params1={"ip":"1.20.50.10/24"}, delay=f"{configuration.internet_path_ext_delay}ms", use_htb=True)
-        net.addLink("nat2", "s3", intfName1="nat2-ext", params1={"ip":"1.20.50.20/24"}, delay=f"{configuration.internet_path_ext_2_delay}ms", use_htb=True)
-        net.addLink("turn", "s3", intfName1="turn-eth0", params1={"ip":"1.20.50.100/24"}, delay=f"{configuration.internet_path_turn_delay}ms", use_htb=True)
+        net.addLink("nat1", s3, intfName1="nat1-ext", params1={"ip":"1.20.50.10/24"}, delay=f"{configuration.internet_path_ext_delay}ms", use_htb=True)
+        net.addLink("nat2", s3, intfName1="nat2-ext", params1={"ip":"1.20.50.20/24"}, delay=f"{configuration.internet_path_ext_2_delay}ms", use_htb=True)
+        net.addLink("turn", s3, intfName1="turn-eth0", params1={"ip":"1.20.50.100/24"}, delay=f"{configuration.internet_path_turn_delay}ms", use_htb=True)
 
 
     @staticmethod
@@ -82,40 +99,42 @@ class Cellular:
         Performing setups for the routing table and NAT configuration
         """
 
-        h1 = net.get("h1")
-        h2 = net.get("h2")
         nat1 = net.get("nat1")
         nat2 = net.get("nat2")
         
-        h1.cmd("ip route add default via 1.20.30.1 dev h1-cellular")
-        h2.cmd("ip route add default via 2.40.60.1 dev h2-cellular")
-
-        nat1.cmd('sysctl net.ipv4.ip_forward=1')
-        nat1.cmd("iptables -F")
-        nat1.cmd("iptables -t nat -F")
+        for pair in range(1, configuration.host_pairs + 1):
+            left, right = pair_hosts(pair)
+            net.get(left).cmd(f"ip route add default via 1.20.30.1 dev {left}-cellular")
+            net.get(right).cmd(f"ip route add default via 2.40.60.1 dev {right}-cellular")
 
+        # Building the complete ruleset per NAT and loading it at once
+        nat1_rules = Ruleset()
         if configuration.snat:
-            nat1.cmd('iptables -t nat -A POSTROUTING -o {} -s 1.20.30.2 -d 1.20.50.0/24 -j SNAT --to-source 1.20.50.10'.format("nat1-ext"))
-            nat1.cmd('iptables -t nat -A PREROUTING -i {} -d 1.20.50.10 -s 1.20.50.0/24 -j DNAT --to-destination 1.20.30.2'.format("nat1-ext"))
-            # nat1.cmd('iptables -t nat -A PREROUTING -i {} -m conntrack --ctstate NEW -j REJECT'.format("nat1-ext"))
-            # nat1.cmd('iptables -A FORWARD -i {} -m conntrack --ctstate SNAT -j ACCEPT'.format("nat1-ext"))
+            # Only the hosts of the first pair can be reached via DNAT, all others are translated outgoing only
+            for pair in range(2, configuration.host_pairs + 1):
+                nat1_rules.append("nat", "-A POSTROUTING -o {} -s {} -d 1.20.50.0/24 -j SNAT --to-source 1.20.50.10".format("nat1-ext", cellular_addresses(pair)[0]))
+            nat1_rules.append("nat", "-A POSTROUTING -o {} -s 1.20.30.2 -d 1.20.50.0/24 -j SNAT --to-source 1.20.50.10".format("nat1-ext"))
+            nat1_rules.append("nat", "-A PREROUTING -i {} -d 1.20.50.10 -s 1.20.50.0/24 -j DNAT --to-destination 1.20.30.2".format("nat1-ext"))
+            # nat1_rules.append("nat", "-A PREROUTING -i {} -m conntrack --ctstate NEW -j REJECT".format("nat1-ext"))
+            # nat1_rules.append("filter", "-A FORWARD -i {} -m conntrack --ctstate SNAT -j ACCEPT".format("nat1-ext"))
         else:
-            nat1.cmd('iptables -t nat -A POSTROUTING -o {} -j MASQUERADE'.format("nat1-ext"))
-            nat1.cmd("iptables -A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT")
-            # nat1.cmd("iptables -A FORWARD -m conntrack --ctstate NEW,RELATED,ESTABLISHED -j LOG --log-prefix='[mininet] '")
-            nat1.cmd("iptables -A FORWARD -i nat1-local -j ACCEPT")
-            nat1.cmd("iptables -A FORWARD -j REJECT")
-
-        nat2.cmd('sysctl net.ipv4.ip_forward=1')
-        nat2.cmd("iptables -F")
-        nat2.cmd("iptables -t nat -F")
-
+            nat1_rules.append("nat", "-A POSTROUTING -o {} -j MASQUERADE".format("nat1-ext"))
+            nat1_rules.append("filter", "-A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT")
+            # nat1_rules.append("filter", "-A FORWARD -m conntrack --ctstate NEW,RELATED,ESTABLISHED -j LOG --log-prefix='[mininet] '")
+            nat1_rules.append("filter", "-A FORWARD -i nat1-local -j ACCEPT")
+            nat1_rules.append("filter", "-A FORWARD -j REJECT")
+        nat1_rules.load(nat1)
+
+        nat2_rules = Ruleset()
         if configuration.snat:
-            nat2.cmd('iptables -t nat -A POSTROUTING -o {} -s 2.40.60.3 -d 1.20.50.0/24 -j SNAT --to-source 1.20.50.20'.format("nat2-ext"))
-            nat2.cmd('iptables -t nat -A PREROUTING -i {} -d 1.20.50.20 -s 1.20.50.0/24 -j DNAT --to-destination 2.40.60.3'.format("nat2-ext"))
+            for pair in range(2, configuration.host_pairs + 1):
+                nat2_rules.append("nat", "-A POSTROUTING -o {} -s {} -d 1.20.50.0/24 -j SNAT --to-source 1.20.50.20".format("nat2-ext", cellular_addresses(pair)[1]))
+            nat2_rules.append("nat", "-A POSTROUTING -o {} -s 2.40.60.3 -d 1.20.50.0/24 -j SNAT --to-source 1.20.50.20".format("nat2-ext"))
+            nat2_rules.append("nat", "-A PREROUTING -i {} -d 1.20.50.20 -s 1.20.50.0/24 -j DNAT --to-destination 2.40.60.3".format("nat2-ext"))
         else:
-            nat2.cmd('iptables -t nat -A POSTROUTING -o {} -j MASQUERADE'.format("nat2-ext"))
-            nat2.cmd("iptables -A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT")
-            # nat2.cmd("iptables -A FORWARD -m conntrack --ctstate NEW,RELATED,ESTABLISHED -j LOG --log-prefix='[mininet] '")
-            nat2.cmd("iptables -A FORWARD -i nat2-local -j ACCEPT")
-            nat2.cmd("iptables -A FORWARD -j REJECT")
\ No newline at end of file
+            nat2_rules.append("nat", "-A POSTROUTING -o {} -j MASQUERADE".format("nat2-ext"))
+            nat2_rules.append("filter", "-A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT")
+            # nat2_rules.append("filter", "-A FORWARD -m conntrack --ctstate NEW,RELATED,ESTABLISHED -j LOG --log-prefix='[mininet] '")
+            nat2_rules.append("filter", "-A FORWARD -i nat2-local -j ACCEPT")
+            nat2_rules.append("filter", "-A FORWARD -j REJECT")
+        nat2_rules.load(nat2)
@@ -1,5 +1,9 @@
 from mininet.net import Mininet
 
+from .ruleset import Ruleset
+from .link_config import configure_pending_links
+from .addressing import pair_hosts, ethernet_addresses, switch_dpid
+
 class Ethernet:
     """
     Takes the default network (or modified) and expands the network to 
@@ -33,6 +37,8 @@ class Ethernet:
 
         # Creating the links
         Ethernet._create_links(net, configuration)
+        # Addresses and delays are required by the routes
+        configure_pending_links()
 
         # Performing the routing table actions
         Ethernet._setup_routing_table(net, configuration)
@@ -46,14 +52,32 @@ class Ethernet:
         # Naming convention taken from earlier iterations
         net.addHost("nat3")
 
+        if configuration.host_pairs > 1:
+            # Multiple hosts on each side of the NAT share a switch
+            net.addSwitch(f"{configuration.switch_prefix}s5", dpid=switch_dpid(5)) # Hosts <-> Nat3 local
+            net.addSwitch(f"{configuration.switch_prefix}s6", dpid=switch_dpid(6)) # Nat3 ext <-> Hosts
+
     @staticmethod
     def _create_links(net: Mininet, configuration):
         """
         Adding the required links between the hosts in the network
         """
 
-        net.addLink(node1="h1", node2="nat3", intfName1="h1-eth", intfName2="nat3-local", params1={"ip": "172.16.1.10/24"},  params2={"ip":"172.16.1.1/24"}, delay=f"{configuration.local_network_path_delay}ms")
-        net.addLink(node1="h2", node2="nat3", intfName1="h2-eth", intfName2="nat3-ext", params1={"ip": "172.16.2.20/24"}, params2={"ip":"172.16.2.1/24"}, delay=f"{configuration.local_network_path_ext_delay}ms")
+        if configuration.host_pairs == 1:
+            net.addLink(node1="h1", node2="nat3", intfName1="h1-eth", intfName2="nat3-local", params1={"ip": "172.16.1.10/24"},  params2={"ip":"172.16.1.1/24"}, delay=f"{configuration.local_network_path_delay}ms")
+            net.addLink(node1="h2", node2="nat3", intfName1="h2-eth", intfName2="nat3-ext", params1={"ip": "172.16.2.20/24"}, params2={"ip":"172.16.2.1/24"}, delay=f"{configuration.local_network_path_ext_delay}ms")
+            return
+
+        # The delay stays on the host links, so every host sees the same delay as with a single pair
+        s5 = f"{configuration.switch_prefix}s5"
+        s6 = f"{configuration.switch_prefix}s6"
+        net.addLink(node1=s5, node2="nat3", intfName2="nat3-local", params2={"ip":"172.16.1.1/24"})
+        net.addLink(node1=s6, node2="nat3", intfName2="nat3-ext", params2={"ip":"172.16.2.1/24"})
+        for pair in range(1, configuration.host_pairs + 1):
+            left, right = pair_hosts(pair)
+            left_ip, right_ip = ethernet_addresses(pair)
+            net.addLink(node1=left, node2=s5, intfName1=f"{left}-eth", params1={"ip": f"{left_ip}/24"}, delay=f"{configuration.local_network_path_delay}ms")
+            net.addLink(node1=right, node2=s6, intfName1=f"{right}-eth", params1={"ip": f"{right_ip}/24"}, delay=f"{configuration.local_network_path_ext_delay}ms")
 
 
     @staticmethod
@@ -62,20 +86,17 @@ class Ethernet:
         Performing setups for the routing table
         """
 
-        h1 = net.get("h1")
-        h2 = net.get("h2")
         nat3 = net.get("nat3")
 
-        h1.cmd("ip route add 172.16.2.0/24 via 172.16.1.1 dev h1-eth")
-        h2.cmd("ip route add 172.16.1.0/24 via 172.16.2.1 dev h2-eth")
-
-        nat3.cmd("sysctl net.ipv4.ip_forward=1")
-
-        nat3.cmd("iptables -F")
-        nat3.cmd("iptables -t nat -F")
-        
-        nat3.cmd("iptables -t nat -A POSTROUTING -o {} -j MASQUERADE".format("nat3-ext"))
-        # nat3.cmd("iptables -A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j LOG --log-prefix='[mininet-fw] '")
-        # nat3.cmd("iptables -A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT")
-        # nat3.cmd("iptables -A FORWARD -i nat3-local -j ACCEPT")
-        # nat3.cmd("iptables -A FORWARD -j REJECT")
\ No newline at end of file
+        for pair in range(1, configuration.host_pairs + 1):
+            left, right = pair_hosts(pair)
+            net.get(left).cmd(f"ip route add 172.16.2.0/24 via 172.16.1.1 dev {left}-eth")
+            net.get(right).cmd(f"ip route add 172.16.1.0/24 via 172.16.2.1 dev {right}-eth")
+
+        nat3_rules = Ruleset()
+        nat3_rules.append("nat", "-A POSTROUTING -o {} -j MASQUERADE".format("nat3-ext"))
+        # nat3_rules.append("filter", "-A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j LOG --log-prefix='[mininet-fw] '")
+        # nat3_rules.append("filter", "-A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT")
+        # nat3_rules.append("filter", "-A FORWARD -i nat3-local -j ACCEPT")
+        # nat3_rules.append("filter", "-A FORWARD -j REJECT")
+        nat3_rules.load(nat3)
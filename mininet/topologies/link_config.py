@@ -0,0 +1,160 @@
+# This file contains the batched configuration of the links of a topology.
+#
+# A TCLink configures each of its interfaces directly when it is created:
+# the address and state with 'ifconfig' and the qdiscs with several 'tc'
+# calls, every call a round-trip to the shell of the node. The interfaces
+# of the BatchedTCLink only record their configuration instead. Once all
+# links of a path are created, 'configure_pending_links' writes the
+# commands of every node into an 'ip -batch' and a 'tc -batch' file and
+# executes them with a single command per node, all nodes in parallel.
+# The offload settings of the TCIntf ('ethtool -K <intf> gro off tx on
+# rx on') are part of the same command, as ethtool has no batch mode.
+# Later configurations of an interface, e.g. the qdiscs reapplied by the
+# switches on 'net.start()', are executed directly like by the TCIntf.
+#
+# The resulting configuration is the same as the one of the TCLink
+# ('root handle 10: netem'), so resetting and impairing the links works
+# unchanged. Links with parameters not covered here (e.g. a bandwidth)
+# are configured by the TCIntf as before.
+
+from mininet.link import TCIntf, TCLink
+
+from measurement_util import netem_options
+
+import os
+import tempfile
+import threading
+
+# Parameters configured in the batch
+_batched_params = {"ip", "delay", "jitter", "loss", "use_htb", "up", "gro", "txo", "rxo"}
+
+# Interfaces created but not configured yet
+_pending = []
+_pending_lock = threading.Lock()
+
+class BatchedTCIntf(TCIntf):
+    """
+    TCIntf recording its initial configuration, applied by
+    'configure_pending_links'. Once applied, the interface is configured
+    directly like a TCIntf, e.g. when the switches reapply the qdiscs
+    of their ports on start
+    """
+
+    # Set by 'configure_pending_links'
+    batched = False
+
+    def config(self, **params):
+        given = {key for key, value in params.items() if value is not None}
+        if self.batched or len(given - _batched_params) > 0 or params.get("up", True) is not True:
+            return TCIntf.config(self, **params)
+
+        ip = params.get("ip")
+        if ip is not None:
+            if "/" not in ip:
+                # Mininet default prefix length
+                ip += "/8"
+            address, prefix = ip.split("/")
+            self.ip, self.prefixLen = address, int(prefix)
+
+        with _pending_lock:
+            _pending.append(self)
+        return {}
+
+class BatchedTCLink(TCLink):
+    """
+    TCLink with interfaces configured in batches per node
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("cls1", BatchedTCIntf)
+        kwargs.setdefault("cls2", BatchedTCIntf)
+        TCLink.__init__(self, *args, **kwargs)
+
+def _on(enabled):
+    return "on" if enabled else "off"
+
+def _interface_cmds(intf):
+    """
+    Returning the 'ip -batch' and 'tc -batch' lines and the ethtool command
+    configuring the interface like the TCIntf does
+    """
+
+    params = intf.params
+    ip_lines = []
+    if intf.ip is not None:
+        ip_lines.append(f"addr add {intf.ip}/{intf.prefixLen} dev {intf}")
+    ip_lines.append(f"link set dev {intf} up")
+
+    tc_lines = []
+    options = netem_options(params.get("delay"), params.get("jitter"), params.get("loss"))
+    if options != "":
+        tc_lines.append(f"qdisc replace dev {intf} root handle 10: netem {options}")
+
+    # Same defaults as the TCIntf
+    gro = params.get("gro", False)
+    txo = params.get("txo", True)
+    rxo = params.get("rxo", True)
+    ethtool = f"ethtool -K {intf} gro {_on(gro)} tx {_on(txo)} rx {_on(rxo)}"
+
+    return ip_lines, tc_lines, ethtool
+
+def _write_batch(lines):
+    with tempfile.NamedTemporaryFile("w", prefix="link_config_", suffix=".batch", delete=False) as outfile:
+        outfile.write("".join(f"{line}\n" for line in lines))
+    return outfile.name
+
+def _configure_node(node, intfs):
+    """
+    Configuring all given interfaces of the node with a single command
+    """
+
+    ip_lines = []
+    tc_lines = []
+    ethtool_cmds = []
+    for intf in intfs:
+        ip, tc, ethtool = _interface_cmds(intf)
+        ip_lines += ip
+        tc_lines += tc
+        ethtool_cmds.append(ethtool)
+
+    files = [_write_batch(ip_lines)]
+    cmd = f"ip -force -batch {files[0]}"
+    if len(tc_lines) > 0:
+        files.append(_write_batch(tc_lines))
+        cmd += f" ; tc -force -batch {files[1]}"
+    cmd += "".join(f" ; {ethtool}" for ethtool in ethtool_cmds)
+
+    try:
+        output = node.cmd(cmd)
+    finally:
+        for batch_file in files:
+            os.remove(batch_file)
+
+    if output.strip() != "":
+        print(f"Configuring the links of '{node}' reported: {output.strip()}")
+
+def configure_pending_links():
+    """
+    Applying the recorded configuration of all interfaces created since
+    the last call. The nodes are configured in parallel, each node in a
+    single shell command.
+    Returns the number of configured interfaces
+    """
+
+    with _pending_lock:
+        intfs = list(_pending)
+        _pending.clear()
+    for intf in intfs:
+        intf.batched = True
+
+    per_node = {}
+    for intf in intfs:
+        per_node.setdefault(intf.node, []).append(intf)
+
+    threads = [threading.Thread(target=_configure_node, args=(node, node_intfs)) for node, node_intfs in per_node.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return len(intfs)
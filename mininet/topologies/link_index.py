@@ -0,0 +1,54 @@
+class LinkIndexEntry:
+    """
+    A single interface of the network together with its link, the node
+    it belongs to and the impairments currently applied on top of the
+    parameters the link was created with.
+    """
+
+    def __init__(self, link, intf):
+        self.link = link
+        self.intf = intf
+        self.node = intf.node
+        self.peer = link.intf2 if link.intf1 is intf else link.intf1
+        self.current = {}
+
+class LinkIndex(dict):
+    """
+    Maps the exact interface name (e.g. 'nat3-local') to its index entry.
+    Built once after the topology was created, so finding the link of an
+    interface no longer scans all links and 'h1-eth' never matches 'h1-eth0'.
+
+    Usage:
+        index = LinkIndex.build(net)
+        entry = index["s1-wifi1"]
+    """
+
+    @staticmethod
+    def build(net):
+        index = LinkIndex()
+        for link in net.links:
+            for intf in [link.intf1, link.intf2]:
+                index[intf.name] = LinkIndexEntry(link, intf)
+
+        net.link_index = index
+        return index
+
+    def reset(self):
+        """
+        Forgetting all applied impairments, required after the interfaces
+        were restored to their creation parameters
+        """
+
+        for entry in self.values():
+            entry.current = {}
+
+def get_link_index(net):
+    """
+    Returning the index of the network, building it if the network was
+    not created by 'create_network'
+    """
+
+    index = getattr(net, "link_index", None)
+    if index is None:
+        index = LinkIndex.build(net)
+    return index
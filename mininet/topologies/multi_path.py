@@ -0,0 +1,139 @@
+from mininet.net import Mininet
+
+from .ruleset import Ruleset
+from .link_config import configure_pending_links
+from .addressing import multi_path_addresses, switch_dpid
+
+class MultiPath:
+    """
+    Takes the default network and gives both hosts K additional interfaces,
+    each connected over its own independent path. A path either uses a
+    single switch or a NAT between the hosts, like the Wi-Fi and Ethernet
+    paths. Meant to measure how the ICE probing scales with the number of
+    interfaces, the candidate pairs grow with K^2.
+
+    h1-p1 ------- s11 -------- h2-p1
+    h1-p2 ------- NAT12 |> --- h2-p2
+    ...
+    h1-pK ------- ...  ------- h2-pK
+
+    Path k uses the subnets 10.k.0.0/24 (switch) or 10.k.1.0/24 and
+    10.k.2.0/24 (in front of and behind the NAT).
+
+    Configuration:
+    - number of paths
+    - delay per path (on both host links)
+    - NAT per path
+
+    """
+
+    @staticmethod
+    def build(net: Mininet, configuration):
+        """
+        Adding the K paths between the first and second host.
+        Applies any relevant configuration given to these paths
+        """
+
+        if configuration.multi_path_count == 0:
+            return
+
+        # Creating the additional switches and NATs
+        MultiPath._create_hosts(net, configuration)
+
+        # Creating the links
+        MultiPath._create_links(net, configuration)
+        # Addresses and delays are required by the routes
+        configure_pending_links()
+
+        # Performing the routing table actions
+        MultiPath._setup_routing_table(net, configuration)
+
+    @staticmethod
+    def path_delay(configuration, path):
+        """
+        Returning the delay of the path in ms, the given delays are repeated
+        if there are more paths than delays
+        """
+
+        delays = configuration.multi_path_delays
+        return delays[(path - 1) % len(delays)]
+
+    @staticmethod
+    def path_nat(configuration, path):
+        """
+        Returning if the path leads through a NAT
+        """
+
+        return path in configuration.multi_path_nat
+
+    @staticmethod
+    def nats(path_count, nat_paths):
+        """
+        Returning the names of the NATs of the given paths
+        """
+
+        return [MultiPath._nat(path) for path in range(1, path_count + 1) if path in nat_paths]
+
+    @staticmethod
+    def _switch(configuration, path):
+        return f"{configuration.switch_prefix}s{10 + path}"
+
+    @staticmethod
+    def _nat(path):
+        return f"nat{10 + path}"
+
+    @staticmethod
+    def _create_hosts(net: Mininet, configuration):
+        """
+        Adding one switch or NAT per path
+        """
+
+        for path in range(1, configuration.multi_path_count + 1):
+            if MultiPath.path_nat(configuration, path):
+                net.addHost(MultiPath._nat(path))
+            else:
+                net.addSwitch(MultiPath._switch(configuration, path), dpid=switch_dpid(10 + path))
+
+    @staticmethod
+    def _create_links(net: Mininet, configuration):
+        """
+        Adding the required links between the hosts in the network
+        """
+
+        for path in range(1, configuration.multi_path_count + 1):
+            delay = f"{MultiPath.path_delay(configuration, path)}ms"
+            nat_path = MultiPath.path_nat(configuration, path)
+            h1_ip, h2_ip = multi_path_addresses(path, nat_path)
+            if nat_path:
+                nat = MultiPath._nat(path)
+                net.addLink(node1="h1", node2=nat, intfName1=f"h1-p{path}", intfName2=f"{nat}-local", params1={"ip": f"{h1_ip}/24"}, params2={"ip": f"10.{path}.1.1/24"}, delay=delay)
+                net.addLink(node1="h2", node2=nat, intfName1=f"h2-p{path}", intfName2=f"{nat}-ext", params1={"ip": f"{h2_ip}/24"}, params2={"ip": f"10.{path}.2.1/24"}, delay=delay)
+            else:
+                switch = MultiPath._switch(configuration, path)
+                net.addLink(node1="h1", node2=switch, intfName1=f"h1-p{path}", intfName2=f"{switch}-h1", params1={"ip": f"{h1_ip}/24"}, delay=delay)
+                net.addLink(node1="h2", node2=switch, intfName1=f"h2-p{path}", intfName2=f"{switch}-h2", params1={"ip": f"{h2_ip}/24"}, delay=delay)
+
+    @staticmethod
+    def _setup_routing_table(net, configuration):
+        """
+        Performing setups for the routing table of the NAT paths
+        """
+
+        h1 = net.get("h1")
+        h2 = net.get("h2")
+
+        for path in range(1, configuration.multi_path_count + 1):
+            if not MultiPath.path_nat(configuration, path):
+                continue
+
+            # Only h1 has a route through the NAT, h2 can reach h1 only
+            # via the bindings created by h1
+            h1.cmd(f"ip route add 10.{path}.2.0/24 via 10.{path}.1.1 dev h1-p{path}")
+
+            nat = MultiPath._nat(path)
+            nat_rules = Ruleset()
+            nat_rules.append("nat", f"-A POSTROUTING -o {nat}-ext -j MASQUERADE")
+            nat_rules.append("filter", "-A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT")
+            nat_rules.append("filter", f"-A FORWARD -i {nat}-local -j ACCEPT")
+            nat_rules.append("filter", "-A FORWARD -j REJECT")
+            nat_rules.load(net.get(nat))
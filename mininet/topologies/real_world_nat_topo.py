@@ -1,6 +1,9 @@
 from mininet.net import Mininet
 from mininet.nodelib import NAT
 
+from .ruleset import Ruleset
+from .link_config import configure_pending_links
+
 class RealWorld:
     """
     Creates a host behind a NAT and connect the host to the internet
@@ -29,6 +32,8 @@ class RealWorld:
 
         # Creating the links
         RealWorld._create_links(net, configuration)
+        # Addresses and delays are required by the routes
+        configure_pending_links()
 
         # Performing the routing table actions
         RealWorld._setup_routing_table(net, configuration)
@@ -70,21 +75,17 @@ class RealWorld:
         # the real internet interface
         nat.cmd("ip route add 0.0.0.0/0 via 192.168.2.10 dev nat-external")
         
-        nat.cmd("sysctl net.ipv4.ip_forward=1")
-
-        nat.cmd("iptables -F")
-        nat.cmd("iptables -t nat -F")
-        
-        
-        # nat.cmd("iptables -t nat -A POSTROUTING -o {} -j MASQUERADE".format("nat3-ext"))
-        # nat3.cmd("iptables -A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j LOG --log-prefix='[mininet-fw] '")
-        # nat.cmd("iptables -A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT")
-        # nat.cmd("iptables -A FORWARD -i nat3-local -j ACCEPT")
-        # nat.cmd("iptables -A FORWARD -j REJECT")
+        nat_rules = Ruleset()
+        # nat_rules.append("nat", "-A POSTROUTING -o {} -j MASQUERADE".format("nat3-ext"))
+        # nat_rules.append("filter", "-A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j LOG --log-prefix='[mininet-fw] '")
+        # nat_rules.append("filter", "-A FORWARD -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT")
+        # nat_rules.append("filter", "-A FORWARD -i nat3-local -j ACCEPT")
+        # nat_rules.append("filter", "-A FORWARD -j REJECT")
         
         # Source: http://www.joewein.net/info/sw-iptables-full-cone-nat.htm
         internal_iface="nat-local"
         external_iface="enX0"
-        # nat.cmd(f"iptables -t nat -A POSTROUTING -o {external_iface} -j MASQUERADE".format(external_iface))
-        nat.cmd(f"iptables -t nat -A POSTROUTING -o {external_iface} -j SNAT --to-source 172.31.25.142")
-        nat.cmd(f"iptables -t nat -A PREROUTING -i {external_iface} -j DNAT --to-destination 192.168.3.10")
\ No newline at end of file
+        # nat_rules.append("nat", f"-A POSTROUTING -o {external_iface} -j MASQUERADE")
+        nat_rules.append("nat", f"-A POSTROUTING -o {external_iface} -j SNAT --to-source 172.31.25.142")
+        nat_rules.append("nat", f"-A PREROUTING -i {external_iface} -j DNAT --to-destination 192.168.3.10")
+        nat_rules.load(nat)
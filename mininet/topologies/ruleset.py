@@ -0,0 +1,84 @@
+from subprocess import PIPE
+
+class Ruleset:
+    """
+    Collects the complete iptables configuration of a single node and
+    loads it with a single 'iptables-restore' call into the namespace
+    of the node.
+
+    Compared to one 'node.cmd()' per rule this saves the round-trips into
+    the Mininet shell and applies all rules of a table atomically, so no
+    half-configured NAT is ever visible to running captures.
+
+    Usage:
+        rules = Ruleset()
+        rules.append("nat", "-A POSTROUTING -o nat1-ext -j MASQUERADE")
+        rules.load(nat1)
+    """
+
+    # The built-in chains per table, required to reset the policies
+    chains = {
+        "filter": ["INPUT", "FORWARD", "OUTPUT"],
+        "nat": ["PREROUTING", "INPUT", "OUTPUT", "POSTROUTING"],
+    }
+
+    def __init__(self, flush=True, ip_forward=True):
+        """
+        flush: replacing the filter and nat table of the node (like 'iptables -F')
+               otherwise the rules are appended to the existing ones
+        ip_forward: enabling the forwarding of packets on the node
+        """
+
+        self.flush = flush
+        self.ip_forward = ip_forward
+        self.tables = {}
+        if flush:
+            # Flushing all tables we know even if no rules are added
+            for table in Ruleset.chains:
+                self.tables[table] = []
+
+    def append(self, table, rule):
+        """
+        Adding the rule (in 'iptables' syntax without the table, e.g.
+        '-A FORWARD -j REJECT') to the given table.
+        """
+
+        self.tables.setdefault(table, []).append(rule)
+
+    def restore_input(self):
+        """
+        Creating the input in the 'iptables-restore' format
+        """
+
+        lines = []
+        for table, rules in self.tables.items():
+            lines.append(f"*{table}")
+            if self.flush:
+                for chain in Ruleset.chains.get(table, []):
+                    lines.append(f":{chain} ACCEPT [0:0]")
+            lines += rules
+            lines.append("COMMIT")
+
+        return "\n".join(lines) + "\n"
+
+    def load(self, node):
+        """
+        Loading the ruleset into the namespace of the given node.
+        The sysctl and the restore are executed in a single process.
+        Returns True if the ruleset was applied.
+        """
+
+        restore_cmd = "iptables-restore"
+        if not self.flush:
+            restore_cmd += " --noflush"
+        if self.ip_forward:
+            restore_cmd = f"sysctl -q -w net.ipv4.ip_forward=1 && {restore_cmd}"
+
+        process = node.popen(restore_cmd, shell=True, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        _, err = process.communicate(self.restore_input().encode("utf-8"))
+
+        if process.returncode != 0:
+            print(f"Failed to load ruleset on {node}: {err.decode('utf-8').strip()}")
+            return False
+
+        return True
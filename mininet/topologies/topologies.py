@@ -12,22 +12,35 @@
 #
 # Internet: h1 -- NAT |> -- <| NAT -- h2
 #
+# Multi-path: h1 -- K paths via a switch or NAT -- h2
+#
 # Every path can be enabled or disabled resulting in the required
 # final network configuration
+#
+# With multiple host pairs, the hosts h3, h4, ... are added to every
+# path in the same way as h1 and h2, see addressing.py
 
 from config import Scenarios, Tests, TestConfiguration
-from dataclasses import dataclass
+from tracing import span, traced
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
 from .old_topologies import DirectAndInternetAndTURN
 
 from mininet.topo import Topo, MinimalTopo
 from mininet.node import OVSController
 from mininet.net import Mininet
-from mininet.link import TCLink
+
+import time
 
 from .wifi_direct import WiFiPath
 from .ethernet_network import Ethernet
 from .cellular_network import Cellular
 from .real_world_nat_topo import RealWorld
+from .multi_path import MultiPath
+from .link_index import LinkIndex
+from .link_config import BatchedTCLink, configure_pending_links
+from .addressing import pair_hosts, max_pairs
 
 @dataclass
 class NetworkConfiguration:
@@ -49,6 +62,20 @@ class NetworkConfiguration:
     block_stun_on_first_path: bool = False
     snat = False
 
+    # Naming, allows multiple networks in parallel on the same machine
+    switch_prefix: str = ""
+    controller_port: int = None
+
+    # Host pairs sharing the NATs, switches and the TURN server
+    host_pairs: int = 1
+    # Prefix length of the cellular subnets behind NAT1 and NAT2
+    cellular_prefix: int = 28
+
+    # Additional paths between h1 and h2, 0 disables them
+    multi_path_count: int = 0
+    multi_path_delays: list = field(default_factory=lambda: [3])
+    multi_path_nat: list = field(default_factory=list)
+
     # Path delays
     wifi_direct_path_delay: int = 3
     local_network_path_delay: int = 3
@@ -94,6 +121,19 @@ def create_test_scenario(test_conf: TestConfiguration):
             configuration = NetworkConfiguration(
                 enable_turn_host=True,
             )
+        case Scenarios.MULTI_PATH:
+            configuration = NetworkConfiguration(
+                enable_wifi_direct_path=False,
+                enable_local_network_path=False,
+                enable_internet_path=False,
+                enable_turn_host=False,
+                multi_path_count=test_conf.multi_paths,
+                multi_path_delays=test_conf.multi_path_delays,
+                multi_path_nat=test_conf.multi_path_nat,
+            )
+            test_conf.enable_turn_server = False
+            if test_conf.host_pairs > 1:
+                raise ValueError("The multi-path scenario only supports a single host pair")
         case Scenarios.REAL_WORLD:
             configuration = NetworkConfiguration(
                 enable_wifi_direct_path=False,
@@ -121,6 +161,15 @@ def create_test_scenario(test_conf: TestConfiguration):
     configuration.internet_path_ext_2_delay = test_conf.internet_path_ext_2_delay
 
     configuration.snat = test_conf.enable_snat
+    configuration.switch_prefix = test_conf.switch_prefix
+    configuration.controller_port = test_conf.controller_port
+
+    configuration.host_pairs = test_conf.host_pairs
+    if configuration.host_pairs > max_pairs(configuration.cellular_prefix):
+        # More hosts than fitting behind the NATs, widening the cellular subnets
+        configuration.cellular_prefix = 24
+    if configuration.host_pairs > max_pairs(configuration.cellular_prefix):
+        raise ValueError(f"At most {max_pairs(configuration.cellular_prefix)} host pairs are supported")
 
     if test_conf.test == Tests.PING_PONG:
         # If STUN not blocked this won't work since we will always
@@ -135,22 +184,68 @@ def create_test_scenario(test_conf: TestConfiguration):
     # DirectAndInternetAndTURN.enable_nat(network)
     return network
 
+@contextmanager
+def _build_step(build_times, name):
+    """
+    Measuring the duration of a step of the network creation
+    """
+
+    start = time.perf_counter()
+    with span(name, "topology"):
+        yield
+    build_times[name] = time.perf_counter() - start
+
+@traced(category="topology")
 def create_network(configuration):
     """
-    Creating the given network from from the given configuration
+    Creating the given network from from the given configuration.
+    The links are configured in batches per node, see link_config.py.
+    The duration of every build step is reported and kept in 'net.build_times'
     """
 
+    build_times = {}
     default_topo = DefaultNetwork()
-    # Requires TCLink to enable delays
-    net = Mininet(default_topo, controller=OVSController, link=TCLink, autoSetMacs=True)
+    controller = OVSController
+    if configuration.switch_prefix != "" or configuration.controller_port is not None:
+        controller = partial(_create_controller, prefix=configuration.switch_prefix, port=configuration.controller_port)
+    # Requires TCLink to enable delays, configured in batches
+    with _build_step(build_times, "Mininet"):
+        net = Mininet(default_topo, controller=controller, link=BatchedTCLink, autoSetMacs=True)
+    # The default topology only contains the first pair
+    with _build_step(build_times, "hosts"):
+        for pair in range(2, configuration.host_pairs + 1):
+            for host in pair_hosts(pair):
+                net.addHost(host)
     # Now, expand the default configuration to the desired size and configuration
-    WiFiPath.build(net, configuration)
-    Ethernet.build(net, configuration)
-    Cellular.build(net, configuration)
-    RealWorld.build(net, configuration)
-    
+    for builder in [WiFiPath, Ethernet, Cellular, RealWorld, MultiPath]:
+        with _build_step(build_times, f"{builder.__name__}.build"):
+            builder.build(net, configuration)
+
+    # Links added without a builder
+    with _build_step(build_times, "links"):
+        configure_pending_links()
+
+    # Exact lookup of the link of every interface, used to apply impairments
+    with _build_step(build_times, "LinkIndex.build"):
+        LinkIndex.build(net)
+
+    net.build_times = build_times
+    steps = ", ".join(f"{name} {duration:.2f}s" for name, duration in build_times.items())
+    print(f"Created the network in {sum(build_times.values()):.2f}s: {steps}")
+
     return net
 
+def _create_controller(name, prefix="", port=None, **params):
+    """
+    Creating the OVS controller with a prefixed name and a custom port.
+    The name is used for the controller logfile in /tmp and the port
+    must not be shared with other networks running at the same time
+    """
+
+    if port is not None:
+        params["port"] = port
+    return OVSController(f"{prefix}{name}", **params)
+
 class DefaultNetwork(Topo):
     """
     The very basic default network, including two hosts and a single
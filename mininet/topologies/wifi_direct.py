@@ -1,5 +1,9 @@
 from mininet.net import Mininet
 
+from .ruleset import Ruleset
+from .link_config import configure_pending_links
+from .addressing import pair_hosts, wifi_addresses, switch_dpid
+
 class WiFiPath:
     """
     Takes the default network and expands the network to have a single link between the
@@ -28,6 +32,8 @@ class WiFiPath:
 
         # Creating the links
         WiFiPath._create_links(net, configuration)
+        # Addresses and delays are required by the routes
+        configure_pending_links()
 
         # Performing the routing table actions
         WiFiPath._setup_routing_table(net, configuration)
@@ -38,7 +44,7 @@ class WiFiPath:
         Adding the required hosts to the network
         """
 
-        net.addSwitch("s1")
+        net.addSwitch(f"{configuration.switch_prefix}s1", dpid=switch_dpid(1))
         # pass
 
     @staticmethod
@@ -47,8 +53,13 @@ class WiFiPath:
         Adding the required links between the hosts in the network
         """
 
-        net.addLink(node1="h1", node2="s1", intfName1="h1-wifi", intfName2="s1-wifi1", params1={"ip": "192.168.1.2/24"}, delay=f"{configuration.wifi_direct_path_delay}ms")
-        net.addLink(node1="h2", node2="s1", intfName1="h2-wifi", intfName2="s1-wifi2", params1={"ip": "192.168.1.3/24"}, delay=f"{configuration.wifi_direct_path_delay}ms")
+        s1 = f"{configuration.switch_prefix}s1"
+        # Every host pair is connected to the same switch, s1-wifi<n> belongs to host h<n>
+        for pair in range(1, configuration.host_pairs + 1):
+            left, right = pair_hosts(pair)
+            left_ip, right_ip = wifi_addresses(pair)
+            net.addLink(node1=left, node2=s1, intfName1=f"{left}-wifi", intfName2=f"{s1}-wifi{2 * pair - 1}", params1={"ip": f"{left_ip}/24"}, delay=f"{configuration.wifi_direct_path_delay}ms")
+            net.addLink(node1=right, node2=s1, intfName1=f"{right}-wifi", intfName2=f"{s1}-wifi{2 * pair}", params1={"ip": f"{right_ip}/24"}, delay=f"{configuration.wifi_direct_path_delay}ms")
 
         # pass
 
@@ -59,7 +70,8 @@ class WiFiPath:
         """
 
         if configuration.block_stun_on_first_path:
-            h1 = net.get("h1")
-            h2 = net.get("h2")
-            h1.cmd("iptables -A OUTPUT -o h1-wifi -p udp -d 192.168.1.0/24 -j DROP")
-            h2.cmd("iptables -A OUTPUT -o h2-wifi -p udp -d 192.168.1.0/24 -j DROP")
\ No newline at end of file
+            for pair in range(1, configuration.host_pairs + 1):
+                for host in pair_hosts(pair):
+                    host_rules = Ruleset(flush=False, ip_forward=False)
+                    host_rules.append("filter", f"-A OUTPUT -o {host}-wifi -p udp -d 192.168.1.0/24 -j DROP")
+                    host_rules.load(net.get(host))
\ No newline at end of file
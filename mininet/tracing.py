@@ -0,0 +1,186 @@
+# This file contains the tracing of the phases of a test run.
+#
+# Spans are recorded with their start, duration, thread and arguments and
+# written in the Chrome trace format, which is shown by chrome://tracing,
+# https://ui.perfetto.dev or speedscope. Nested spans of the same thread
+# are shown below each other, e.g.:
+#
+#   _test_wrapper
+#   ├── net.start
+#   └── _run_test
+#       ├── capture_start
+#       ├── test
+#       │   └── cmd (h1: ip route add ...)
+#       └── termination
+#
+# Tracing is disabled by default and only costs a flag check per span.
+# With '--trace trace.json' all spans of the test process are recorded,
+# including every 'cmd()' executed on a Mininet node, and written once
+# the tests are finished. The timestamps are epoch based, so the traces
+# of parallel runs (e.g. of the sweep) can be shown together.
+
+from contextlib import contextmanager
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+class Tracer:
+    """
+    Collecting the spans of all threads of the process.
+
+    Usage:
+        tracer = Tracer()
+        tracer.enable("trace.json")
+        with tracer.span("net.start"):
+            net.start()
+        tracer.write()
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.events = []
+        self.written = 0
+        self._threads = {}
+        self._lock = threading.Lock()
+        # Epoch in µs at the perf counter origin, durations use the perf counter
+        self._origin = time.perf_counter_ns()
+        self._epoch = time.time_ns() // 1000
+
+    def enable(self, path):
+        self.path = path
+        self.enabled = True
+
+    def _now(self):
+        return self._epoch + (time.perf_counter_ns() - self._origin) / 1000
+
+    def add(self, name, category, start, end, args=None):
+        """
+        Adding a complete span, start and end in µs since epoch
+        """
+
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start,
+            "dur": end - start,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = {key: f"{value}" for key, value in args.items()}
+        with self._lock:
+            self.events.append(event)
+            self._threads[thread.ident] = thread.name
+
+    @contextmanager
+    def span(self, name, category="mininet", **args):
+        """
+        Recording the enclosed code as span, also if it raises
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        start = self._now()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, self._now(), args)
+
+    def write(self, path=None):
+        """
+        Writing all spans recorded so far in the Chrome trace format.
+        Returns the path of the trace
+        """
+
+        path = path if path is not None else self.path
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+
+        # Naming the threads in the viewer
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ident, "args": {"name": name}}
+                    for ident, name in threads.items()]
+
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as outfile:
+            json.dump({"traceEvents": metadata + sorted(events, key=lambda event: event["ts"]), "displayTimeUnit": "ms"}, outfile)
+        os.replace(tmp, path)
+        self.written = len(events)
+        print(f"Wrote {len(events)} spans to '{path}'")
+
+        return path
+
+# The tracer of the test process
+_tracer = Tracer()
+
+def enable_tracing(path):
+    """
+    Recording all spans of the process and writing them to the given
+    file at exit (or earlier with 'write_trace')
+    """
+
+    _tracer.enable(path)
+    trace_mininet_commands()
+    # Spans recorded after the last write, e.g. if the tests failed
+    atexit.register(lambda: _tracer.write() if len(_tracer.events) > _tracer.written else None)
+
+def span(name, category="mininet", **args):
+    """
+    Context manager recording the enclosed code as span
+    """
+
+    return _tracer.span(name, category, **args)
+
+def traced(function=None, category="mininet"):
+    """
+    Decorator recording every call of the function as span named after it.
+    Usable as '@traced' or '@traced(category="topology")'
+    """
+
+    if function is None:
+        return functools.partial(traced, category=category)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _tracer.enabled:
+            return function(*args, **kwargs)
+        with _tracer.span(function.__name__, category):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+def write_trace(path=None):
+    return _tracer.write(path)
+
+def trace_mininet_commands():
+    """
+    Recording every 'cmd()' executed on a Mininet node as span with the
+    node and the command, the shell round-trips of the topology setup
+    """
+
+    from mininet.node import Node
+
+    if getattr(Node.cmd, "_traced", False):
+        return
+
+    original = Node.cmd
+
+    @functools.wraps(original)
+    def cmd(self, *args, **kwargs):
+        if not _tracer.enabled:
+            return original(self, *args, **kwargs)
+        command = " ".join(f"{arg}" for arg in args)
+        with _tracer.span("cmd", "command", node=self.name, cmd=command[:200]):
+            return original(self, *args, **kwargs)
+
+    cmd._traced = True
+    Node.cmd = cmd
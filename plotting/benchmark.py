@@ -0,0 +1,266 @@
+import json
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from datetime import datetime
+from pathlib import Path
+
+# The logfile filter lives next to the test scripts
+sys.path.append(f"{Path(__file__).resolve().parent.parent.joinpath('mininet')}")
+
+# Stages of the analysis pipeline, each measured in its own child process
+STAGES = ["parsePcap", "convertTSharkStatsToDataFrame", "filter_logfile_positiv", "plotThroughput"]
+
+# Stages reading captures and repeated for every resolution
+CAPTURE_STAGES = ["parsePcap", "convertTSharkStatsToDataFrame", "plotThroughput"]
+
+# The interfaces and filters of 'plotThroughput'
+INTERFACES = ["h1-wifi", "h1-eth", "h1-cellular"]
+FILTER_RULES = ["udp&&!stun&&!mdns&&!icmp"] * 3
+COLUMNS = ["H1 Wi-Fi", "H1 Ethernet", "H1 Cellular"]
+
+LOG_FILTER = ["nominatedpair", "path", "stun"]
+
+def countPackets(inputFile):
+    """
+    Returning the number of packets in the capture as reported by capinfos,
+    None if capinfos is not available
+    """
+
+    try:
+        output = subprocess.run(["capinfos", "-c", "-M", f"{inputFile}"], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    found = re.search(r"Number of packets:\s*(\d+)", output)
+    return int(found.group(1)) if found is not None else None
+
+def countLines(inputFile):
+    with open(inputFile, "rb") as infile:
+        return sum(1 for _ in infile)
+
+def prepareStats(inputFile, resolution, workDir):
+    """
+    Writing the cleaned tshark stat file of the capture, the input of
+    'convertTSharkStatsToDataFrame', outside of the measurement
+    """
+
+    from parsePcap import extractStatsFromPcap, convertTsharkIntervalToIndex, replaceSeparator, removeFirstAndLastCommaAndSpaces
+
+    statsFile = f"{workDir}/stats_{Path(inputFile).name}_{resolution}.txt"
+    extractStatsFromPcap(inputFile, statsFile, resolution, INTERFACES, FILTER_RULES)
+    convertTsharkIntervalToIndex(statsFile)
+    replaceSeparator(statsFile)
+    removeFirstAndLastCommaAndSpaces(statsFile)
+    return statsFile
+
+def createSynthetic(synthetic, workDir):
+    """
+    Writing the synthetic capture given as 'DURATION:RATE' (seconds and data
+    packets per second). Returns the capture and its number of packets
+    """
+
+    from syntheticCapture import SyntheticCapture
+
+    duration, _, rate = synthetic.partition(":")
+    # The name identifies the capture in the baseline
+    capture = f"{workDir}/synthetic_{duration}s_{rate}pps.pcapng"
+    truth = SyntheticCapture(duration=float(duration), rate=float(rate)).write(capture)
+    return capture, truth["packets"]
+
+def loadStage(stage):
+    """
+    Importing the module of the stage and returning a function executing
+    the stage on an input file and resolution
+    """
+
+    match stage:
+        case "parsePcap":
+            from parsePcap import parsePcap
+            return lambda inputFile, resolution: parsePcap(inputFile, resolution, INTERFACES, FILTER_RULES, COLUMNS)
+        case "convertTSharkStatsToDataFrame":
+            from parsePcap import convertTSharkStatsToDataFrame
+            return lambda inputFile, resolution: convertTSharkStatsToDataFrame(inputFile, None, COLUMNS)
+        case "filter_logfile_positiv":
+            from logfile import filter_logfile_positiv
+            return lambda inputFile, resolution: filter_logfile_positiv(inputFile, LOG_FILTER, outfile="filtered.log")
+        case "plotThroughput":
+            from plotPcap import plotThroughput
+            return lambda inputFile, resolution: plotThroughput(Namespace(input=[inputFile], counters=None, output="plot.pdf", resolution=resolution, title=None, xaxis=None, yaxis=None))
+
+def _measure(stage, inputFile, resolution, workDir, queue):
+    """
+    Child process of a measurement. The imports are part of the peak RSS
+    but not of the wall time. Reporting the wall time and the peak RSS of this
+    process and of its children (tshark)
+    """
+
+    os.chdir(workDir)
+    # The output of the stages is not part of the benchmark
+    sys.stdout = open(os.devnull, "w")
+
+    # Loading the module first, so only the stage itself is timed
+    runStage = loadStage(stage)
+
+    start = time.perf_counter()
+    runStage(inputFile, resolution)
+    wall = time.perf_counter() - start
+
+    # ru_maxrss is given in KiB on Linux
+    queue.put({
+        "wall": wall,
+        "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "childRss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    })
+
+def measure(stage, inputFile, resolution, repeat):
+    """
+    Measuring the stage 'repeat' times, each time in a new child process
+    with a clean working directory. Returns the single measurements
+    """
+
+    context = multiprocessing.get_context("spawn")
+    measurements = []
+    for _ in range(repeat):
+        workDir = tempfile.mkdtemp(prefix="benchmark_")
+        try:
+            queue = context.Queue()
+            process = context.Process(target=_measure, args=(stage, f"{Path(inputFile).resolve()}", resolution, workDir, queue))
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise RuntimeError(f"Stage '{stage}' failed on '{inputFile}' with exit code {process.exitcode}")
+            measurements.append(queue.get())
+        finally:
+            shutil.rmtree(workDir, ignore_errors=True)
+    return measurements
+
+def summarize(stage, inputFile, resolution, measurements, packets=None, lines=None):
+    """
+    Combining the repeated measurements into a single result: median wall
+    time, the largest peak RSS and the throughput based on the median
+    """
+
+    size = Path(inputFile).stat().st_size / 1e6
+    wall = statistics.median(m["wall"] for m in measurements)
+    result = {
+        "stage": stage,
+        "input": Path(inputFile).name,
+        "resolution": resolution,
+        "sizeMB": round(size, 3),
+        "repeat": len(measurements),
+        "wallSeconds": round(wall, 4),
+        "minWallSeconds": round(min(m["wall"] for m in measurements), 4),
+        "peakRssMB": round(max(m["rss"] for m in measurements), 1),
+        "peakChildRssMB": round(max(m["childRss"] for m in measurements), 1),
+        "MBPerSecond": round(size / wall, 3) if wall > 0 else None,
+        "packetsPerSecond": round(packets / wall, 1) if packets is not None and wall > 0 else None,
+        "linesPerSecond": round(lines / wall, 1) if lines is not None and wall > 0 else None,
+    }
+    return result
+
+def resultKey(result):
+    return (result["stage"], result["input"], result["resolution"])
+
+def compareBaseline(results, baselineFile, tolerance):
+    """
+    Comparing the wall time and peak RSS with the baseline.
+    Returns the results slower or larger than the baseline by more than
+    the tolerance (0.2 = 20%) as list of (result, metric, baseline value)
+    """
+
+    with open(baselineFile, "r") as infile:
+        baseline = {resultKey(result): result for result in json.load(infile)["results"]}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(resultKey(result))
+        if previous is None:
+            continue
+        for metric in ["wallSeconds", "peakRssMB"]:
+            ratio = result[metric] / previous[metric] if previous[metric] > 0 else 1
+            result[f"{metric}Ratio"] = round(ratio, 3)
+            if ratio > 1 + tolerance:
+                regressions.append((result, metric, previous[metric]))
+    return regressions
+
+def runBenchmark(args):
+    """
+    Running every stage on every given input and resolution, writing the
+    results as JSON and comparing them with the baseline if given.
+    Returns the number of regressions
+    """
+
+    stages = args.stage if len(args.stage) > 0 else STAGES
+    resolutions = args.resolution if len(args.resolution) > 0 else ["0,05"]
+
+    results = []
+    prepareDir = tempfile.mkdtemp(prefix="benchmark_stats_")
+    try:
+        captures = [(capture, countPackets(capture)) for capture in args.capture]
+        captures += [createSynthetic(synthetic, prepareDir) for synthetic in args.synthetic]
+        for capture, packets in captures:
+            for resolution in resolutions:
+                for stage in [s for s in stages if s in CAPTURE_STAGES]:
+                    inputFile = capture
+                    if stage == "convertTSharkStatsToDataFrame":
+                        inputFile = prepareStats(capture, resolution, prepareDir)
+                    measurements = measure(stage, inputFile, resolution, args.repeat)
+                    # The throughput always refers to the capture
+                    result = summarize(stage, capture, resolution, measurements, packets)
+                    results.append(result)
+                    print(f"{stage:32} {result['input']:32} {resolution:>6} {result['wallSeconds']:9.3f}s {result['peakRssMB']:8.1f}MB")
+
+        if "filter_logfile_positiv" in stages:
+            for log in args.log:
+                result = summarize("filter_logfile_positiv", log, None, measure("filter_logfile_positiv", log, None, args.repeat), lines=countLines(log))
+                results.append(result)
+                print(f"{'filter_logfile_positiv':32} {result['input']:32} {'':>6} {result['wallSeconds']:9.3f}s {result['peakRssMB']:8.1f}MB")
+    finally:
+        shutil.rmtree(prepareDir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline is not None and Path(args.baseline).exists():
+        regressions = compareBaseline(results, args.baseline, args.tolerance)
+        for result, metric, previous in regressions:
+            print(f"Regression: {result['stage']} on {result['input']} ({result['resolution']}): {metric} {previous} -> {result[metric]}")
+        if len(regressions) == 0:
+            print(f"No regressions compared to '{args.baseline}'")
+
+    content = {
+        "created": datetime.now().isoformat(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(args.output, "w") as outfile:
+        json.dump(content, outfile, indent=4)
+    print(f"Wrote results to {args.output}")
+
+    return len(regressions)
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Measure wall time, peak RSS and throughput of the analysis stages on reference captures and logs')
+    parser.add_argument('--capture', action="append", default=[], help="Reference capture, given multiple times for several sizes")
+    parser.add_argument('--synthetic', action="append", default=[], help="DURATION:RATE of a synthetic capture, see syntheticCapture.py")
+    parser.add_argument('--log', action="append", default=[], help="Reference logfile")
+    parser.add_argument('--resolution', action="append", default=[], help="Interval of the tshark stats, e.g. 0,05")
+    parser.add_argument('--stage', action="append", default=[], choices=STAGES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=str, default="benchmark.json")
+    parser.add_argument('--baseline', type=str, required=False, help="Results of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+
+    args = parser.parse_args()
+
+    exit(1 if runBenchmark(args) > 0 else 0)
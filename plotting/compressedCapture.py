@@ -0,0 +1,30 @@
+import subprocess
+
+def isZstd(inputFile):
+    return f"{inputFile}".endswith(".zst")
+
+def tsharkReadCommand(inputFile):
+    """
+    Returning the shell command reading the capture with tshark.
+    tshark reads gzip compressed captures itself, zstd compressed captures
+    are streamed through 'zstd -dc' for versions without zstd support
+    """
+
+    if isZstd(inputFile):
+        return f"zstd -dcq {inputFile} | tshark -r -"
+    return f"tshark -r {inputFile}"
+
+def openTshark(inputFile, arguments):
+    """
+    Starting tshark with the given arguments on the capture, decompressing
+    zstd captures as a stream. Returns the process with its output as text pipe
+    """
+
+    if not isZstd(inputFile):
+        return subprocess.Popen(["tshark", "-r", f"{inputFile}"] + arguments, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+    decompress = subprocess.Popen(["zstd", "-dcq", f"{inputFile}"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    process = subprocess.Popen(["tshark", "-r", "-"] + arguments, stdin=decompress.stdout, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    # Only tshark holds the pipe now, zstd stops once tshark exits
+    decompress.stdout.close()
+    return process
@@ -0,0 +1,65 @@
+from argparse import ArgumentParser
+import pandas as pd
+
+def loadCounters(inputFile, nodes=None, interfaces=None):
+    """
+    Reading the interface counters written by the counter sampler.
+    Allows to restrict the samples to the given nodes and interfaces.
+    """
+
+    data = pd.read_csv(inputFile)
+    if nodes is not None:
+        data = data[data["Node"].isin(nodes)]
+    if interfaces is not None:
+        data = data[data["Interface"].isin(interfaces)]
+    return data
+
+def parseCounters(inputFile, resolution="0,05", interfaces=None, columns=None, start=None):
+    """
+    Converting the interface counters into frames and bytes per interval.
+    Returning a dataframe in the same format as 'parsePcap': an 'Interval'
+    column followed by '<interface>' (frames) and '<interface> Bytes' per
+    interface, so both can be plotted the same way.
+    Sent and received packets are summed up like in a capture of the interface.
+    Interfaces with the same name on different nodes (e.g. 'lo') are summed up.
+    The intervals start at the given epoch or at the first sample.
+    """
+
+    resolution = float(f"{resolution}".replace(",", "."))
+    data = loadCounters(inputFile, interfaces=interfaces).sort_values("Time")
+    if start is None:
+        start = data["Time"].min()
+
+    data["Frames"] = data["RxPackets"] + data["TxPackets"]
+    data["Bytes"] = data["RxBytes"] + data["TxBytes"]
+    # The counters are cumulative, the difference between two samples of
+    # the same interface of a node are the packets of that period
+    data[["Frames", "Bytes"]] = data.groupby(["Node", "Interface"])[["Frames", "Bytes"]].diff().fillna(0)
+    data["Interval"] = ((data["Time"] - start) // resolution) * resolution
+
+    if interfaces is None:
+        interfaces = list(data["Interface"].unique())
+
+    result = None
+    for index, iface in enumerate(interfaces):
+        ifaceData = data[data["Interface"] == iface]
+        name = columns[index] if columns is not None else iface
+        grouped = ifaceData.groupby("Interval")[["Frames", "Bytes"]].sum()
+        grouped.columns = [name, f"{name} Bytes"]
+        result = grouped if result is None else result.join(grouped, how="outer")
+
+    result = result.fillna(0).reset_index()
+    return result
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Convert the sampled interface counters into frames and bytes per interval')
+    parser.add_argument('--input', type=str, required=True)
+    parser.add_argument('--output', type=str, required=True)
+    parser.add_argument('--resolution', type=str, default="0,05", required=False)
+    parser.add_argument('--interface', action="append", default=None, required=False)
+
+    args = parser.parse_args()
+
+    parseCounters(args.input, args.resolution, args.interface).to_csv(args.output, index=False)
+    print(f"Wrote csv to {args.output}")
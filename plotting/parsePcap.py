@@ -3,6 +3,7 @@ import pandas as pd
 import os
 import subprocess
 import re
+from compressedCapture import tsharkReadCommand
 
 def extractStatsFromPcap(inputFile, outputFile, resolution, interfaces=None, filterRules=None):
     """Parsing the given input file in pcap format and exporting 
@@ -18,7 +19,7 @@ def extractStatsFromPcap(inputFile, outputFile, resolution, interfaces=None, fil
     interfaceList += "\""
     
     filter=f"FRAMES,BYTES{interfaceList}"
-    tsharkCmd = f"tshark -r {inputFile} -z io,stat,{resolution},{filter} -Q > {outputFile}"
+    tsharkCmd = f"{tsharkReadCommand(inputFile)} -z io,stat,{resolution},{filter} -Q > {outputFile}"
     print(tsharkCmd)
     subprocess.run(tsharkCmd, shell=True)
 
@@ -0,0 +1,123 @@
+import sys
+from argparse import ArgumentParser
+from parsePcap import parsePcap
+from parseCounters import parseCounters
+from plotPcap import exportToPdf
+
+try:
+    import matplotlib.pyplot as plt
+    import pandas as pd
+except ImportError:
+    print('Failed to load dependencies. Please ensure that matplotlib and pandas can be loaded.', file=sys.stderr)
+    exit(-1)
+
+def loadConntrackEvents(inputFiles, protocols=None):
+    """
+    Reading the conntrack events recorded on the NATs into a single dataframe.
+    Allows to restrict the events to the given protocol numbers (17 for UDP).
+    """
+
+    data = pd.concat([pd.read_csv(inputFile) for inputFile in inputFiles], ignore_index=True)
+    if protocols is not None:
+        data = data[data["Proto"].isin(protocols)]
+    return data.sort_values("Time")
+
+def extractBindings(events, end=None):
+    """
+    Converting the events into one row per binding: the NAT, the original
+    5-tuple, the external (reply) address, when it was created, first
+    answered and destroyed. Bindings still alive end at the last event or
+    the given end (epoch).
+    """
+
+    if end is None:
+        end = events["Time"].max()
+
+    bindings = {}
+    for row in events.itertuples(index=False):
+        key = (row.Node, row.Proto, row.OrigSrc, row.OrigSport, row.OrigDst, row.OrigDport)
+        if row.Event == "NEW" or key not in bindings:
+            bindings[key] = {
+                "Node": row.Node,
+                "Binding": f"{row.Node} {row.OrigSrc}:{row.OrigSport} -> {row.OrigDst}:{row.OrigDport}",
+                "External": f"{row.ReplyDst}:{row.ReplyDport}",
+                "Created": row.Time,
+                "Replied": None,
+                "Destroyed": None,
+            }
+        binding = bindings[key]
+        # Bit 1 of the status is set once a reply was seen
+        if binding["Replied"] is None and int(row.Status) & 2:
+            binding["Replied"] = row.Time
+        if row.Event == "DESTROY":
+            binding["Destroyed"] = row.Time
+            # A new binding with the same tuple starts with the next NEW event
+            bindings[key + (row.Time,)] = bindings.pop(key)
+
+    data = pd.DataFrame(bindings.values())
+    data["Alive"] = data["Destroyed"].isna()
+    data["Destroyed"] = data["Destroyed"].fillna(end)
+    return data.sort_values("Created")
+
+def plotBindings(args):
+    """
+    Plotting the lifetime of every NAT binding, optionally below the pps
+    of the interfaces taken from a capture or the interface counters.
+    """
+
+    events = loadConntrackEvents(args.input, [17])
+    bindings = extractBindings(events)
+
+    start = args.start
+    if start is None:
+        start = events["Time"].min()
+
+    pps = None
+    if args.counters is not None:
+        pps = parseCounters(args.counters, args.resolution, args.interface, start=start)
+    elif args.pcap is not None:
+        # The capture starts at its first packet, expected to match the given start
+        pps = parsePcap(args.pcap, args.resolution, args.interface)
+
+    if pps is not None:
+        fig, (ppsAxes, axes) = plt.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [1, 2]})
+        for column in args.interface or []:
+            ppsAxes.plot(pps["Interval"], pps[column], linewidth=1, label=column)
+        ppsAxes.set(ylabel="Packets per interval")
+        ppsAxes.legend(loc="best", title="Interfaces", fancybox=True, framealpha=0.9)
+    else:
+        fig, axes = plt.subplots()
+
+    colors = {node: f"C{index}" for index, node in enumerate(sorted(bindings["Node"].unique()))}
+    for index, binding in enumerate(bindings.itertuples(index=False)):
+        created = binding.Created - start
+        duration = binding.Destroyed - binding.Created
+        # Unanswered part of the binding is drawn lighter
+        axes.broken_barh([(created, duration)], (index - 0.4, 0.8), facecolors=colors[binding.Node], alpha=0.4)
+        if binding.Replied is not None and not pd.isna(binding.Replied):
+            axes.broken_barh([(binding.Replied - start, binding.Destroyed - binding.Replied)], (index - 0.4, 0.8), facecolors=colors[binding.Node])
+
+    axes.set_yticks(range(len(bindings)))
+    axes.set_yticklabels(bindings["Binding"], fontsize=6)
+    axes.set(xlabel="Time in seconds")
+    axes.grid(True, axis="x")
+    plt.suptitle(args.title if args.title is not None else "NAT Bindings")
+
+    exportToPdf(fig, args.output)
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Plot the lifetime of the NAT bindings from the recorded conntrack events')
+    parser.add_argument('--input', action="append", default=[], required=True)
+    parser.add_argument('--output', type=str, required=True)
+    parser.add_argument('--counters', type=str, required=False)
+    parser.add_argument('--pcap', type=str, required=False)
+    parser.add_argument('--interface', action="append", default=None, required=False)
+    parser.add_argument('--resolution', type=str, default="0,05", required=False)
+    parser.add_argument('--start', type=float, required=False)
+    parser.add_argument('--title', type=str, required=False)
+
+    args = parser.parse_args()
+
+    plotBindings(args)
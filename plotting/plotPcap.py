@@ -6,6 +6,7 @@ import numpy as np
 import matplotlib.ticker as plticker
 from argparse import ArgumentParser
 from parsePcap import parsePcap
+from parseCounters import parseCounters
 from matplotlib.ticker import ScalarFormatter
 
 try:
@@ -64,7 +65,7 @@ def plotThroughput(args):
         "H1 Ethernet",
         "H1 Cellular",
     ]
-    resolution="0,05"
+    resolution=args.resolution
     # interfaces=[
     #     "h1-cellular", 
     #     "h1-cellular", 
@@ -111,7 +112,11 @@ def plotThroughput(args):
     #     # "H2 Cellular (in)"
     # ]
     # resolution="0,005"
-    data = parsePcap(args.input[0], resolution, interfaces, filterRules, columns)
+    if args.counters is not None:
+        # The counters include all packets of an interface, the filter rules do not apply
+        data = parseCounters(args.counters, resolution, interfaces, columns)
+    else:
+        data = parsePcap(args.input[0], resolution, interfaces, filterRules, columns)
 
     # --------------------
     # Plotting the pps
@@ -294,9 +299,13 @@ def plotThroughput(args):
 if __name__ == '__main__':
 
     parser = ArgumentParser(description='Generate charts for pps values from .pcap csv files')
-    parser.add_argument('--input', action="append", default=[], required=True)
+    # Either captures or the sampled interface counters are plotted
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input', action="append", default=[])
+    source.add_argument('--counters', type=str)
     parser.add_argument('--input-e', action="append", default=[], required=False)
     parser.add_argument('--output', type=str, required=True)
+    parser.add_argument('--resolution', type=str, default="0,05", required=False)
     parser.add_argument('--input-outgoing', type=str, required=False)
     parser.add_argument('--plotting', type=str, required=False)
     parser.add_argument('--xaxis', type=str, required=False)
@@ -0,0 +1,150 @@
+import re
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from timeline import streamLogEvents
+from plotPcap import exportToPdf
+from compressedCapture import openTshark
+
+try:
+    import matplotlib.pyplot as plt
+    import pandas as pd
+except ImportError:
+    print('Failed to load dependencies. Please ensure that matplotlib and pandas can be loaded.', file=sys.stderr)
+    exit(-1)
+
+COST_COLUMNS = ["Paths", "CandidatePairs", "Gathering", "Nomination", "StunPackets", "StunBytes", "StunPacketsUntilNomination", "ProbedPairs"]
+
+def streamStunPackets(inputFile):
+    """
+    Yielding the STUN packets of a capture as (epoch, length, source, destination)
+    tuples, source and destination include the port
+    """
+
+    tsharkArgs = ["-n", "-Y", "stun", "-T", "fields", "-E", "separator=/t",
+                  "-e", "frame.time_epoch", "-e", "frame.len", "-e", "ip.src", "-e", "udp.srcport", "-e", "ip.dst", "-e", "udp.dstport"]
+
+    process = openTshark(inputFile, tsharkArgs)
+    try:
+        for line in process.stdout:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 6 or fields[0] == "":
+                continue
+            yield (float(fields[0]), int(fields[1]), f"{fields[2]}:{fields[3]}", f"{fields[4]}:{fields[5]}")
+    finally:
+        process.stdout.close()
+        process.terminate()
+        process.wait()
+
+def analyzeRun(directory, paths, host="h1"):
+    """
+    Extracting the probing cost of a single run with the given number of
+    paths from the log and the captures of the host:
+    - Gathering: seconds from the first log line to the first STUN packet
+    - Nomination: seconds from the first log line to the first nominated pair
+    - STUN packets and bytes in total and until the nomination
+    - Probed pairs: distinct address pairs STUN packets were exchanged on
+    """
+
+    start = None
+    nomination = None
+    for epoch, _, _, event in streamLogEvents(Path(directory).joinpath(f"{host}.log"), host):
+        if start is None:
+            start = epoch
+        if "nominatedpair" in event.lower():
+            nomination = epoch
+            break
+
+    packets = 0
+    size = 0
+    untilNomination = 0
+    firstStun = None
+    probed = set()
+    for capture in sorted(Path(directory).glob(f"{host}*.pcap*")):
+        # Single capture or the files of a ring buffer, not the combined capture
+        if re.fullmatch(rf"{host}(_\d+_\d+)?", capture.name.split(".")[0]) is None:
+            continue
+        for epoch, length, source, destination in streamStunPackets(capture):
+            packets += 1
+            size += length
+            firstStun = epoch if firstStun is None else min(firstStun, epoch)
+            if nomination is None or epoch <= nomination:
+                untilNomination += 1
+            # Requests and responses belong to the same pair
+            probed.add(frozenset((source, destination)))
+
+    return {
+        "Paths": paths,
+        "CandidatePairs": paths * paths,
+        "Gathering": firstStun - start if firstStun is not None and start is not None else None,
+        "Nomination": nomination - start if nomination is not None else None,
+        "StunPackets": packets,
+        "StunBytes": size,
+        "StunPacketsUntilNomination": untilNomination,
+        "ProbedPairs": len(probed),
+    }
+
+def parseRuns(runs):
+    """
+    Parsing the runs given as 'K=DIRECTORY'
+    """
+
+    parsed = []
+    for run in runs:
+        paths, _, directory = run.partition("=")
+        parsed.append((int(paths), directory))
+    return parsed
+
+def plotProbingCost(args):
+    """
+    Plotting the nomination time, the STUN traffic and the probed pairs
+    over the number of paths, averaged over all runs with the same number
+    """
+
+    data = pd.DataFrame([analyzeRun(directory, paths, args.host) for paths, directory in parseRuns(args.run)], columns=COST_COLUMNS)
+    if args.csv is not None:
+        data.to_csv(args.csv, index=False)
+        print(f"Wrote csv to {args.csv}")
+
+    grouped = data.groupby("Paths")
+    mean = grouped.mean(numeric_only=True)
+    std = grouped.std(numeric_only=True).fillna(0)
+
+    fig, (timeAxes, packetAxes, pairAxes) = plt.subplots(3, 1, sharex=True)
+
+    for column in ["Gathering", "Nomination"]:
+        timeAxes.errorbar(mean.index, mean[column], yerr=std[column], marker="o", capsize=3, label=column)
+    timeAxes.set(ylabel="Seconds")
+    timeAxes.legend(loc="best", fancybox=True, framealpha=0.9)
+
+    for column in ["StunPackets", "StunPacketsUntilNomination"]:
+        packetAxes.errorbar(mean.index, mean[column], yerr=std[column], marker="o", capsize=3, label=column)
+    packetAxes.set(ylabel="STUN packets")
+    packetAxes.legend(loc="best", fancybox=True, framealpha=0.9)
+
+    pairAxes.errorbar(mean.index, mean["ProbedPairs"], yerr=std["ProbedPairs"], marker="o", capsize=3, label="Probed pairs")
+    pairAxes.plot(mean.index, mean["CandidatePairs"], linestyle="--", color="gray", label="K^2")
+    pairAxes.set(xlabel="Interfaces per host (K)", ylabel="Pairs")
+    pairAxes.set_xticks(list(mean.index))
+    pairAxes.legend(loc="best", fancybox=True, framealpha=0.9)
+
+    for axes in [timeAxes, packetAxes, pairAxes]:
+        axes.grid(True)
+
+    plt.suptitle(args.title if args.title is not None else "ICE Probing Cost")
+
+    exportToPdf(fig, args.output)
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Plot how gathering, probing traffic and nomination scale with the number of interfaces')
+    parser.add_argument('--run', action="append", default=[], required=True, help="K=DIRECTORY of a multi-path run")
+    parser.add_argument('--output', type=str, required=True)
+    parser.add_argument('--csv', type=str, required=False)
+    parser.add_argument('--host', type=str, default="h1", required=False)
+    parser.add_argument('--title', type=str, required=False)
+
+    args = parser.parse_args()
+
+    plotProbingCost(args)
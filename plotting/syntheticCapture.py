@@ -0,0 +1,420 @@
+# This file writes synthetic captures like 'tshark -i h1-wifi -i h1-eth -i h1-cellular' on h1
+# during a quicheperf test, without Mininet, quicheperf or coturn:
+# - STUN binding requests to the STUN server and responses (gathering)
+# - STUN connectivity checks between h1 and h2 on every interface, repeated
+#   as consent freshness
+# - a QUIC-like flow (long header handshake, short header data and ACKs)
+#   on the active interface, switching the interface at the given times
+# - QUIC-like keep-alives on the idle interfaces
+# - loss gaps, in which no packets of an interface are captured
+#
+# Next to the capture a JSON file holds the ground truth: the packets,
+# bytes and kinds per interface, the switches and the lost packets.
+
+import bisect
+import gzip
+import heapq
+import json
+import random
+import struct
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+# The addresses of the hosts are the ones of the Mininet topologies
+sys.path.append(f"{Path(__file__).resolve().parent.parent.joinpath('mininet')}")
+from topologies.addressing import wifi_addresses, ethernet_addresses, cellular_addresses
+
+from compressedCapture import openTshark
+
+INTERFACES = {
+    "h1-wifi": wifi_addresses,
+    "h1-eth": ethernet_addresses,
+    "h1-cellular": cellular_addresses,
+}
+
+STUN_SERVER = "1.20.50.100"
+STUN_PORT = 3478
+CLIENT_PORT = 45678
+SERVER_PORT = 4433
+STUN_MAGIC_COOKIE = 0x2112A442
+
+# One way delay between the hosts and to the STUN server in seconds
+DELAY = 0.01
+
+# Kinds of packets counted in the ground truth
+KINDS = ["stunRequests", "stunResponses", "handshake", "data", "acks", "keepalives"]
+
+def pcapngBlock(blockType, body):
+    """
+    Returning a pcapng block with the body padded to 32 bit
+    """
+
+    padded = body + b"\x00" * (-len(body) % 4)
+    length = 12 + len(padded)
+    return struct.pack("<II", blockType, length) + padded + struct.pack("<I", length)
+
+def pcapngOption(code, value):
+    return struct.pack("<HH", code, len(value)) + value + b"\x00" * (-len(value) % 4)
+
+def sectionHeaderBlock():
+    # Byte order magic, version 1.0 and an unknown section length
+    body = struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1)
+    return pcapngBlock(0x0A0D0D0A, body)
+
+def interfaceDescriptionBlock(name):
+    # Ethernet, no snaplen, the name (if_name) and microsecond resolution (if_tsresol)
+    options = pcapngOption(2, name.encode()) + pcapngOption(9, bytes([6])) + pcapngOption(0, b"")
+    body = struct.pack("<HHI", 1, 0, 0) + options
+    return pcapngBlock(0x00000001, body)
+
+def enhancedPacketBlock(interfaceId, timestamp, frame):
+    micros = int(round(timestamp * 1e6))
+    body = struct.pack("<IIIII", interfaceId, micros >> 32, micros & 0xFFFFFFFF, len(frame), len(frame)) + frame
+    return pcapngBlock(0x00000006, body)
+
+def ipv4Checksum(header):
+    total = sum(struct.unpack("!10H", header))
+    while total > 0xFFFF:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+def ipAddress(address):
+    return bytes(int(part) for part in address.split("."))
+
+def udpFrame(interfaceId, outgoing, packetId, source, sourcePort, destination, destinationPort, payload):
+    """
+    Returning the Ethernet frame of the UDP datagram. The UDP checksum is
+    left empty, which is valid for IPv4
+    """
+
+    hostMac = bytes([0x02, 0, 0, 0, 1, interfaceId])
+    peerMac = bytes([0x02, 0, 0, 0, 2, interfaceId])
+    ethernet = (peerMac + hostMac if outgoing else hostMac + peerMac) + struct.pack("!H", 0x0800)
+
+    udpLength = 8 + len(payload)
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + udpLength, packetId & 0xFFFF, 0x4000, 64, 17, 0, ipAddress(source), ipAddress(destination))
+    header = header[:10] + struct.pack("!H", ipv4Checksum(header)) + header[12:]
+    udp = struct.pack("!HHHH", sourcePort, destinationPort, udpLength, 0)
+    return ethernet + header + udp + payload
+
+def stunMessage(messageType, transactionId, attributes):
+    body = b""
+    for attributeType, value in attributes:
+        body += struct.pack("!HH", attributeType, len(value)) + value + b"\x00" * (-len(value) % 4)
+    return struct.pack("!HHI", messageType, len(body), STUN_MAGIC_COOKIE) + transactionId + body
+
+def stunBindingRequest(transactionId, username=None):
+    attributes = []
+    if username is not None:
+        # USERNAME, PRIORITY and ICE-CONTROLLING of a connectivity check
+        attributes += [(0x0006, username.encode()), (0x0024, struct.pack("!I", 1853824767)), (0x802A, transactionId[:8])]
+    return stunMessage(0x0001, transactionId, attributes)
+
+def stunBindingResponse(transactionId, address, port):
+    # XOR-MAPPED-ADDRESS of the requesting address
+    mapped = struct.pack("!BBH", 0, 0x01, port ^ (STUN_MAGIC_COOKIE >> 16))
+    mapped += struct.pack("!I", struct.unpack("!I", ipAddress(address))[0] ^ STUN_MAGIC_COOKIE)
+    return stunMessage(0x0101, transactionId, [(0x0020, mapped)])
+
+class PayloadPool:
+    """
+    Random bytes to cut the QUIC-like payloads from, instead of creating
+    new random bytes for every packet
+    """
+
+    def __init__(self, rng, size=1 << 16):
+        self.data = rng.randbytes(size)
+        self.offset = 0
+
+    def take(self, length):
+        if self.offset + length > len(self.data):
+            self.offset = 0
+        chunk = self.data[self.offset:self.offset + length]
+        self.offset += length
+        return chunk
+
+def quicShortHeader(connectionId, pool, length):
+    # Fixed bit set, the packet number and payload are random
+    return bytes([0x40 | (pool.take(1)[0] & 0x03)]) + connectionId + pool.take(max(0, length - 1 - len(connectionId)))
+
+def quicLongHeader(packetType, connectionId, pool, length):
+    header = bytes([0xC0 | (packetType << 4)]) + struct.pack("!I", 1)
+    header += bytes([len(connectionId)]) + connectionId + bytes([len(connectionId)]) + connectionId[::-1]
+    return header + pool.take(max(0, length - len(header)))
+
+class SyntheticCapture:
+    """
+    Generator of a synthetic capture of h1 with a known ground truth.
+    Packets are created per source (STUN, keep-alives, the flow) in time
+    order and merged, so the capture is written as a stream at any duration.
+
+    Usage:
+        capture = SyntheticCapture(duration=30, rate=500, switches=[(10, "h1-eth")])
+        truth = capture.write("synthetic.pcapng")
+    """
+
+    def __init__(self, duration=30, rate=500, size=1200, ackEvery=2, keepalive=1.0, stunInterval=2.5,
+                 interfaces=None, switches=None, lossGaps=None, seed=0, start=1700000000.0):
+        self.duration = duration
+        self.rate = rate
+        self.size = size
+        self.ackEvery = ackEvery
+        self.keepalive = keepalive
+        self.stunInterval = stunInterval
+        self.interfaces = interfaces if interfaces is not None else list(INTERFACES)
+        self.lossGaps = lossGaps if lossGaps is not None else []
+        self.seed = seed
+        self.start = start
+
+        if switches is None:
+            # Moving the flow to the next interface after equal shares of the duration
+            switches = [(duration * index / len(self.interfaces), interface) for index, interface in enumerate(self.interfaces)]
+        self.switches = sorted(switches)
+        if len(self.switches) == 0 or self.switches[0][0] > 0:
+            self.switches.insert(0, (0.0, self.interfaces[0]))
+        self._switchTimes = [time for time, _ in self.switches]
+
+        for _, interface in self.switches + [(0, gap[0]) for gap in self.lossGaps]:
+            if interface not in self.interfaces:
+                raise ValueError(f"Unknown interface '{interface}', expected one of {self.interfaces}")
+
+    def addresses(self, interface):
+        return INTERFACES[interface](1)
+
+    def activeInterface(self, time):
+        return self.switches[bisect.bisect_right(self._switchTimes, time) - 1][1]
+
+    def isLost(self, interface, time):
+        return any(name == interface and begin <= time < end for name, begin, end in self.lossGaps)
+
+    def stunPackets(self, interface, rng):
+        """
+        Yielding the STUN packets of the interface: one binding request to
+        the STUN server, then connectivity checks in both directions every
+        'stunInterval' seconds
+        """
+
+        h1, h2 = self.addresses(interface)
+        offset = 0.01 * self.interfaces.index(interface)
+
+        transactionId = rng.randbytes(12)
+        yield (offset, interface, "stunRequests", h1, CLIENT_PORT, STUN_SERVER, STUN_PORT, stunBindingRequest(transactionId))
+        yield (offset + 2 * DELAY, interface, "stunResponses", STUN_SERVER, STUN_PORT, h1, CLIENT_PORT, stunBindingResponse(transactionId, h1, CLIENT_PORT))
+
+        time = 0.1 + offset
+        while time < self.duration:
+            outgoing = rng.randbytes(12)
+            incoming = rng.randbytes(12)
+            cycle = [
+                (time, interface, "stunRequests", h1, CLIENT_PORT, h2, SERVER_PORT, stunBindingRequest(outgoing, "h2:h1")),
+                (time + 0.001, interface, "stunRequests", h2, SERVER_PORT, h1, CLIENT_PORT, stunBindingRequest(incoming, "h1:h2")),
+                (time + 2 * DELAY, interface, "stunResponses", h2, SERVER_PORT, h1, CLIENT_PORT, stunBindingResponse(outgoing, h1, CLIENT_PORT)),
+                (time + 0.001 + 2 * DELAY, interface, "stunResponses", h1, CLIENT_PORT, h2, SERVER_PORT, stunBindingResponse(incoming, h2, SERVER_PORT)),
+            ]
+            yield from cycle
+            time += self.stunInterval
+
+    def keepalivePackets(self, interface, pool):
+        """
+        Yielding a keep-alive and its reply every 'keepalive' seconds while
+        the interface does not carry the flow
+        """
+
+        h1, h2 = self.addresses(interface)
+        connectionId = bytes([0xCA, 0xFE, 0, 0, 0, 0, 0, self.interfaces.index(interface)])
+        time = self.keepalive
+        while time < self.duration:
+            if self.activeInterface(time) != interface:
+                yield (time, interface, "keepalives", h1, CLIENT_PORT, h2, SERVER_PORT, quicShortHeader(connectionId, pool, 32))
+                yield (time + 2 * DELAY, interface, "keepalives", h2, SERVER_PORT, h1, CLIENT_PORT, quicShortHeader(connectionId, pool, 32))
+            time += self.keepalive
+
+    def flowPackets(self, pool):
+        """
+        Yielding the handshake and the data of the flow on the active
+        interface with an ACK every 'ackEvery' data packets
+        """
+
+        connectionId = bytes([0xDA, 0x7A, 0, 0, 0, 0, 0, 0])
+        start = 0.3
+        h1, h2 = self.addresses(self.activeInterface(start))
+        interface = self.activeInterface(start)
+        yield (start, interface, "handshake", h1, CLIENT_PORT, h2, SERVER_PORT, quicLongHeader(0, connectionId, pool, 1200))
+        yield (start + 2 * DELAY, interface, "handshake", h2, SERVER_PORT, h1, CLIENT_PORT, quicLongHeader(0, connectionId, pool, 1200))
+        yield (start + 2 * DELAY + 0.001, interface, "handshake", h1, CLIENT_PORT, h2, SERVER_PORT, quicLongHeader(2, connectionId, pool, 120))
+
+        interval = 1 / self.rate
+        number = 0
+        time = start + 3 * DELAY
+        while time < self.duration:
+            interface = self.activeInterface(time)
+            h1, h2 = self.addresses(interface)
+            yield (time, interface, "data", h1, CLIENT_PORT, h2, SERVER_PORT, quicShortHeader(connectionId, pool, self.size))
+            number += 1
+            if number % self.ackEvery == 0:
+                # Within the interval, so the packets stay in time order
+                yield (time + interval / 2, interface, "acks", h2, SERVER_PORT, h1, CLIENT_PORT, quicShortHeader(connectionId, pool, 40))
+            time = start + 3 * DELAY + number * interval
+
+    def packets(self):
+        """
+        Returning all packets merged into a single time-ordered stream
+        """
+
+        rng = random.Random(self.seed)
+        pool = PayloadPool(rng)
+        streams = [self.stunPackets(interface, random.Random(f"{self.seed}-{interface}")) for interface in self.interfaces]
+        streams += [self.keepalivePackets(interface, pool) for interface in self.interfaces]
+        streams.append(self.flowPackets(pool))
+        return heapq.merge(*streams, key=lambda packet: packet[0])
+
+    def write(self, outputFile, truthFile=None):
+        """
+        Writing the capture (gzip compressed if the name ends with '.gz')
+        and the ground truth. Returns the ground truth
+        """
+
+        truth = {interface: {"packets": 0, "bytes": 0, "lost": 0, **{kind: 0 for kind in KINDS}} for interface in self.interfaces}
+
+        opener = gzip.open if f"{outputFile}".endswith(".gz") else open
+        with opener(outputFile, "wb") as outfile:
+            outfile.write(sectionHeaderBlock())
+            for interface in self.interfaces:
+                outfile.write(interfaceDescriptionBlock(interface))
+
+            packetId = 0
+            for time, interface, kind, source, sourcePort, destination, destinationPort, payload in self.packets():
+                if self.isLost(interface, time):
+                    truth[interface]["lost"] += 1
+                    continue
+                interfaceId = self.interfaces.index(interface)
+                outgoing = source == self.addresses(interface)[0]
+                frame = udpFrame(interfaceId, outgoing, packetId, source, sourcePort, destination, destinationPort, payload)
+                outfile.write(enhancedPacketBlock(interfaceId, self.start + time, frame))
+                packetId += 1
+
+                counts = truth[interface]
+                counts["packets"] += 1
+                counts["bytes"] += len(frame)
+                counts[kind] += 1
+
+        content = {
+            "capture": Path(outputFile).name,
+            "start": self.start,
+            "duration": self.duration,
+            "parameters": {"rate": self.rate, "size": self.size, "ackEvery": self.ackEvery, "keepalive": self.keepalive,
+                           "stunInterval": self.stunInterval, "seed": self.seed},
+            "switches": [{"time": time, "interface": interface} for time, interface in self.switches],
+            "lossGaps": [{"interface": interface, "start": begin, "end": end} for interface, begin, end in self.lossGaps],
+            "packets": sum(counts["packets"] for counts in truth.values()),
+            "interfaces": truth,
+        }
+        if truthFile is None:
+            truthFile = truthFileOf(outputFile)
+        with open(truthFile, "w") as out:
+            json.dump(content, out, indent=4)
+        print(f"Wrote {content['packets']} packets to {outputFile} and the ground truth to {truthFile}")
+
+        return content
+
+def truthFileOf(captureFile):
+    return f"{captureFile}.truth.json"
+
+def verifyCapture(captureFile, truthFile=None):
+    """
+    Counting the packets, bytes and STUN messages per interface with tshark
+    and comparing them with the ground truth.
+    Returns the differences as list of (interface, value, expected, found)
+    """
+
+    with open(truthFile if truthFile is not None else truthFileOf(captureFile), "r") as infile:
+        truth = json.load(infile)["interfaces"]
+
+    found = {interface: {"packets": 0, "bytes": 0, "stunRequests": 0, "stunResponses": 0} for interface in truth}
+    process = openTshark(captureFile, ["-n", "-T", "fields", "-E", "separator=/t", "-e", "frame.interface_name", "-e", "frame.len", "-e", "stun.type"])
+    try:
+        for line in process.stdout:
+            fields = line.rstrip("\n").split("\t")
+            counts = found.setdefault(fields[0], {"packets": 0, "bytes": 0, "stunRequests": 0, "stunResponses": 0})
+            counts["packets"] += 1
+            counts["bytes"] += int(fields[1])
+            if len(fields) > 2 and fields[2] in ["0x0001", "1"]:
+                counts["stunRequests"] += 1
+            elif len(fields) > 2 and fields[2] in ["0x0101", "257"]:
+                counts["stunResponses"] += 1
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    differences = []
+    for interface, counts in found.items():
+        for value, count in counts.items():
+            expected = truth.get(interface, {}).get(value, 0)
+            if expected != count:
+                differences.append((interface, value, expected, count))
+    return differences
+
+def parseSwitches(switches):
+    """
+    Parsing the switches given as 'TIME=INTERFACE'
+    """
+
+    parsed = []
+    for switch in switches:
+        time, _, interface = switch.partition("=")
+        parsed.append((float(time), interface))
+    return parsed
+
+def parseLossGaps(gaps):
+    """
+    Parsing the loss gaps given as 'INTERFACE=START-END'
+    """
+
+    parsed = []
+    for gap in gaps:
+        interface, _, span = gap.partition("=")
+        begin, _, end = span.partition("-")
+        parsed.append((interface, float(begin), float(end)))
+    return parsed
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Write a synthetic pcapng capture of h1 with STUN, a QUIC-like flow, path switches and loss gaps together with its ground truth')
+    parser.add_argument('--output', type=str, required=True, help="pcapng file, gzip compressed if ending with .gz")
+    parser.add_argument('--truth', type=str, required=False, help="Ground truth JSON, default '<output>.truth.json'")
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--rate', type=float, default=500, help="Data packets per second of the flow")
+    parser.add_argument('--size', type=int, default=1200, help="UDP payload of a data packet")
+    parser.add_argument('--ack-every', type=int, default=2)
+    parser.add_argument('--keepalive', type=float, default=1.0)
+    parser.add_argument('--stun-interval', type=float, default=2.5)
+    parser.add_argument('--interface', action="append", default=[], choices=list(INTERFACES))
+    parser.add_argument('--switch', action="append", default=[], help="TIME=INTERFACE the flow moves to")
+    parser.add_argument('--loss', action="append", default=[], help="INTERFACE=START-END without captured packets")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verify', action="store_true", default=False, help="Comparing the written capture with the ground truth using tshark")
+
+    args = parser.parse_args()
+
+    capture = SyntheticCapture(
+        duration=args.duration,
+        rate=args.rate,
+        size=args.size,
+        ackEvery=args.ack_every,
+        keepalive=args.keepalive,
+        stunInterval=args.stun_interval,
+        interfaces=args.interface if len(args.interface) > 0 else None,
+        switches=parseSwitches(args.switch) if len(args.switch) > 0 else None,
+        lossGaps=parseLossGaps(args.loss),
+        seed=args.seed,
+    )
+    capture.write(args.output, args.truth)
+
+    if args.verify:
+        differences = verifyCapture(args.output, args.truth)
+        for interface, value, expected, count in differences:
+            print(f"{interface} {value}: expected {expected}, found {count}")
+        print("Capture matches the ground truth" if len(differences) == 0 else f"{len(differences)} differences to the ground truth")
+        exit(1 if len(differences) > 0 else 0)
@@ -0,0 +1,205 @@
+from argparse import ArgumentParser
+from pathlib import Path
+import csv
+import heapq
+import os
+import re
+import sys
+
+import pandas as pd
+
+from compressedCapture import openTshark
+
+# The log timestamps are parsed like in the run catalog
+sys.path.append(f"{Path(__file__).resolve().parent.parent.joinpath('mininet')}")
+from logfile import parse_log_timestamp
+
+# The default output of the env_logger used by quicheperf:
+# [2024-05-06T10:11:12.123456Z DEBUG quiche::path] message
+LOG_LINE_PATTERN = re.compile(r"^\[(\S+)\s+([A-Z]+)\s+([^\]]*)\]\s?(.*)$")
+
+TIMELINE_COLUMNS = ["Time", "Epoch", "Source", "Kind", "Event"]
+
+# Captures of multiple interfaces and logs of multiple threads are not
+# strictly time-ordered. Events up to this many seconds out of order are sorted
+REORDER_WINDOW = 1.0
+
+def streamLogEvents(logfile, source=None, contains=None):
+    """
+    Yielding the events of a quicheperf logfile as (epoch, source, kind, event)
+    tuples in the order they are written. Lines without a timestamp are skipped.
+    If contains is given only lines including one of the strings (case-insensitive)
+    are returned.
+    """
+
+    if source is None:
+        source = Path(logfile).stem
+    filters = None
+    if contains is not None:
+        filters = [c.lower() for c in contains]
+
+    with open(logfile, "r", errors="replace") as infile:
+        for line in infile:
+            found = LOG_LINE_PATTERN.match(line.rstrip("\n"))
+            if found is None:
+                continue
+            message = found.group(4)
+            if filters is not None:
+                lower = message.lower()
+                if not any(f in lower for f in filters):
+                    continue
+            epoch = parse_log_timestamp(found.group(1))
+            if epoch is None:
+                continue
+            yield (epoch, source, f"log:{found.group(2).lower()}", f"{found.group(3)}: {message}")
+
+def streamPcapEvents(inputFile, source=None, displayFilter=None):
+    """
+    Yielding the packets of a capture as (epoch, source, kind, event) tuples.
+    Packets are read from tshark line by line, so the capture is never
+    loaded into memory at once. The display filter selects which packets
+    become events.
+    """
+
+    if source is None:
+        source = Path(inputFile).name.split(".")[0]
+
+    tsharkArgs = ["-n", "-T", "fields", "-E", "separator=/t",
+                  "-e", "frame.time_epoch", "-e", "frame.interface_name", "-e", "_ws.col.Protocol", "-e", "_ws.col.Info"]
+    if displayFilter is not None:
+        tsharkArgs += ["-Y", displayFilter]
+
+    # Compressed captures are decompressed as a stream as well
+    process = openTshark(inputFile, tsharkArgs)
+    try:
+        for line in process.stdout:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 4 or fields[0] == "":
+                continue
+            interface = fields[1] if fields[1] != "" else source
+            yield (float(fields[0]), source, f"pcap:{fields[2].lower()}", f"{interface}: {fields[3]}")
+    finally:
+        process.stdout.close()
+        process.terminate()
+        process.wait()
+
+def reorderEvents(stream, window=REORDER_WINDOW):
+    """
+    Sorting a nearly time-ordered event stream. Holds back the events of the
+    last 'window' seconds, so only these are kept in memory.
+    Raises a ValueError if an event is older than an event already yielded,
+    i.e. the stream is more than 'window' seconds out of order.
+    """
+
+    pending = []
+    newest = None
+    last = None
+    for index, event in enumerate(stream):
+        if last is not None and event[0] < last:
+            raise ValueError(f"Events of '{event[1]}' are more than {window}s out of order at {event[0]:.6f}, "
+                             f"increase the reorder window")
+        # The index keeps events with the same time in their order
+        heapq.heappush(pending, (event[0], index, event))
+        newest = event[0] if newest is None else max(newest, event[0])
+        while pending[0][0] <= newest - window:
+            last, _, ready = heapq.heappop(pending)
+            yield ready
+
+    while len(pending) > 0:
+        yield heapq.heappop(pending)[2]
+
+def mergeEvents(streams, window=REORDER_WINDOW):
+    """
+    Merging the event streams into a single time-ordered stream using a
+    k-way heap merge. Every stream must be time-ordered up to the reorder
+    window (see 'reorderEvents'), otherwise a ValueError is raised.
+    """
+
+    return heapq.merge(*[reorderEvents(stream, window) for stream in streams], key=lambda event: event[0])
+
+def collectRunStreams(directory, contains=None, displayFilter=None, captures=None):
+    """
+    Creating the event streams for a test directory.
+    Includes the logfiles of both hosts and every capture found in the
+    directory (or only the given capture names).
+    """
+
+    streams = []
+    for host in ["h1", "h2"]:
+        logfile = Path(directory).joinpath(f"{host}.log")
+        if logfile.exists():
+            streams.append(streamLogEvents(logfile, host, contains))
+
+    for capture in sorted(Path(directory).glob("*.pcap*")):
+        # Files of a ring buffer are named '<node>_<number>_<timestamp>.pcap'
+        name = re.sub(r"_\d+_\d+$", "", capture.name.split(".")[0])
+        # The combined file only repeats the host captures
+        if name == "h1_h2_combined":
+            continue
+        if captures is not None and name not in captures:
+            continue
+        streams.append(streamPcapEvents(capture, name, displayFilter))
+
+    return streams
+
+def writeTimeline(events, outputFile, start=None):
+    """
+    Writing the merged events as csv table. The time column is relative to
+    the given start (epoch) or to the first event.
+    Returns the number of written events.
+    """
+
+    written = 0
+    with open(outputFile, "w", newline="") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(TIMELINE_COLUMNS)
+        for epoch, source, kind, event in events:
+            if start is None:
+                start = epoch
+            writer.writerow([f"{epoch - start:.6f}", f"{epoch:.6f}", source, kind, event])
+            written += 1
+
+    print(f"Wrote {written} events to '{outputFile}'")
+    return written
+
+def buildTimeline(directory, outputFile=None, contains=None, displayFilter="stun||quic", captures=None, window=REORDER_WINDOW):
+    """
+    Merging the host logs and the selected packets of all captures of a
+    test directory into a single time-ordered event table.
+    Returns the path of the written table.
+    """
+
+    if outputFile is None:
+        outputFile = os.path.join(directory, "timeline.csv")
+
+    streams = collectRunStreams(directory, contains, displayFilter, captures)
+    writeTimeline(mergeEvents(streams, window), outputFile)
+
+    return outputFile
+
+def loadTimeline(inputFile, sources=None, kinds=None):
+    """
+    Reading a written timeline into a pandas dataframe.
+    Allows to restrict the events to the given sources and kinds.
+    """
+
+    data = pd.read_csv(inputFile)
+    if sources is not None:
+        data = data[data["Source"].isin(sources)]
+    if kinds is not None:
+        data = data[data["Kind"].isin(kinds)]
+    return data
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Merge logfiles and captures of a test run into a single event timeline')
+    parser.add_argument('--input', type=str, required=True)
+    parser.add_argument('--output', type=str, required=False)
+    parser.add_argument('--contains', action="append", default=None, required=False)
+    parser.add_argument('--filter', type=str, default="stun||quic", required=False)
+    parser.add_argument('--capture', action="append", default=None, required=False)
+    parser.add_argument('--reorder-window', type=float, default=REORDER_WINDOW, required=False)
+
+    args = parser.parse_args()
+
+    buildTimeline(args.input, args.output, args.contains, args.filter, args.capture, args.reorder_window)